@@ -94,7 +94,7 @@ export function BotDetailsDialog({ bot, open, onOpenChange }: BotDetailsDialogPr
     if (messageData) {
       setMessageLogs(messageData)
       const success = messageData.filter((m) => m.status === "sent").length
-      const failed = messageData.filter((m) => m.status === "error").length
+      const failed = messageData.filter((m) => m.status === "failed").length
       setStats((prev) => ({
         ...prev,
         totalMessages: messageData.length,
@@ -0,0 +1,188 @@
+"""Benchmark: memory and per-iteration cost of running bots, at 100/500/1000 bots.
+
+Starts bots through `main.launch_bot` against a fake transport, in steps up
+to each --bots count, and at every step reports the process RSS per bot and,
+over a --seconds window, the event loop's lag and CPU time per send. The fake
+client is much lighter than Telethon's, so the memory of unconnected real
+`TelegramClient`s is measured too, for an estimate of what a node holds.
+
+Also compares the per-bot record with the previous layout (a `running_bots`
+dict entry plus a `bot_stats` dict): their size, and the lookups the send
+engine does on every iteration.
+
+    python -m benchmarks.bench_bot_memory --bots 100 500 1000 --seconds 3
+"""
+import argparse
+import asyncio
+import gc
+import os
+import tempfile
+import time
+import timeit
+import tracemalloc
+from datetime import datetime
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-bot-memory-")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from telethon import TelegramClient  # noqa: E402
+from telethon.sessions import StringSession  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from benchmarks.common import fmt_ms, percentile  # noqa: E402
+from bot_state import BotState  # noqa: E402
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss() -> int:
+    gc.collect()
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def config(bot_id, groups, rate):
+    return main.StartBot(
+        bot_id=bot_id, api_id=1, api_hash="hash", phone_number="+48000000000",
+        session_string=f"session-{bot_id}", group_ids=list(range(1_000_000, 1_000_000 + groups)),
+        messages_per_minute=rate, min_group_interval=60,
+    )
+
+
+async def window(seconds):
+    """Loop lag, sends and CPU time while the running bots work for `seconds`"""
+    loop = asyncio.get_running_loop()
+    sent = sum(b.messages_sent for b in main.running_bots.values())
+    cpu = time.process_time()
+    lags = []
+    deadline = loop.time() + seconds
+    while loop.time() < deadline:
+        expected = loop.time() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append(max(0.0, loop.time() - expected))
+    sends = sum(b.messages_sent for b in main.running_bots.values()) - sent
+    return lags, sends, time.process_time() - cpu
+
+
+async def running(args):
+    fake_telethon.install(main, fake_telethon.FakeTransport(
+        connect_latency=0.01, rpc_latency=0.005, send_latency=args.send_latency,
+    ))
+    # Imports and first-use caches out of the way before the baseline
+    await main.launch_bot(config("warmup", args.groups, args.rate))
+    await main.stop_bot(main.StopBot(bot_id="warmup"), None)
+    baseline = rss()
+    started = 0
+    for target in sorted(args.bots):
+        while started < target:
+            batch = range(started, min(target, started + 100))
+            await asyncio.gather(*(main.launch_bot(config(f"bot-{i}", args.groups, args.rate)) for i in batch))
+            started = batch.stop
+        per_bot = (rss() - baseline) / target
+        lags, sends, cpu = await window(args.seconds)
+        print(f"{target:5} bots: RSS {per_bot / 1024:6.1f} KiB per bot; loop lag p50 {fmt_ms(percentile(lags, 50))}, "
+              f"p99 {fmt_ms(percentile(lags, 99))}; {sends / args.seconds:6,.0f} sends/s, "
+              f"{cpu / max(sends, 1) * 1e6:5.0f}us CPU per send, loop busy {cpu / args.seconds:4.0%}")
+    await asyncio.gather(*(main.stop_bot(main.StopBot(bot_id=bot_id), None) for bot_id in list(main.running_bots)))
+    await main.supervisor.stop()
+
+
+async def telethon_clients(count):
+    # RSS barely moves here (the stopped bots' memory is reused), so trace allocations
+    TelegramClient(StringSession(), 1, "hash")
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    clients = [TelegramClient(StringSession(), 1, "hash") for _ in range(count)]
+    per_client = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+    print(f"real TelegramClient (not connected): {per_client / 1024:.1f} KiB each over {count}")
+    del clients
+
+
+def legacy_entry(bot_id, shared):
+    entry = {
+        key: shared for key in (
+            "client", "config", "session_key", "me", "peers", "engine", "log", "logs",
+            "metrics", "reply_cooldown", "reply_handler",
+        )
+    }
+    entry["running"] = True
+    stats = {
+        "messages_sent": 0, "messages_failed": 0, "auto_replies": 0, "auto_replies_suppressed": 0,
+        "started_at": datetime.utcnow().isoformat(),
+    }
+    return entry, stats
+
+
+def record_size(count):
+    """Bytes per bot of the containers alone, everything they point to shared"""
+    shared = object()
+    sizes = {}
+    for label, make in (
+        ("dict entry + bot_stats", lambda i: legacy_entry(f"bot-{i}", shared)),
+        ("BotState", lambda i: BotState(f"bot-{i}", *[shared] * 9)),
+    ):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        records = [make(i) for i in range(count)]
+        sizes[label] = (tracemalloc.get_traced_memory()[0] - before) / count
+        tracemalloc.stop()
+        del records
+    print("record: " + ", ".join(f"{label} {size:.0f} B" for label, size in sizes.items()) + " per bot")
+
+
+def lookups(count, number=1_000_000):
+    """What one engine iteration and one send did per bot, before and after"""
+    shared = object()
+    running_bots = {}
+    bot_stats = {}
+    for i in range(count):
+        running_bots[f"bot-{i}"], bot_stats[f"bot-{i}"] = legacy_entry(f"bot-{i}", shared)
+    bot_id = f"bot-{count // 2}"
+
+    def get_running_config():
+        bot_data = running_bots.get(bot_id)
+        if bot_data is None or not bot_data["running"]:
+            return None
+        return bot_data["config"]
+
+    def count_send():
+        bot_stats[bot_id]["messages_sent"] += 1
+
+    record = BotState(bot_id, *[shared] * 9)
+    current_config = record.current_config
+
+    def count_send_record():
+        record.messages_sent += 1
+
+    results = {}
+    for label, func in (
+        ("get_running_config(bot_id)", get_running_config),
+        ("bot_data.current_config()", current_config),
+        ("bot_stats[bot_id][...] += 1", count_send),
+        ("bot_data.messages_sent += 1", count_send_record),
+    ):
+        results[label] = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"per iteration, {count} bots: " + "; ".join(f"{label} {t * 1e9:.0f}ns" for label, t in results.items()))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=30, help="messages_per_minute per bot")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--send-latency", type=float, default=0.05)
+    parser.add_argument("--clients", type=int, default=200, help="real TelegramClients to measure")
+    args = parser.parse_args()
+
+    record_size(max(args.bots))
+    lookups(max(args.bots))
+    asyncio.run(running(args))
+    asyncio.run(telethon_clients(args.clients))
+    main.log_setup.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,74 @@
+"""Benchmark: repeated /api/telegram/groups/fetch, cold clients vs. the client pool.
+
+Drives the FastAPI app in-process against a fake Telethon transport and
+reports per-request latency, handshakes and connections left open.
+
+    python -m benchmarks.bench_client_pool --requests 50 --connect-latency 0.3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="bench-pool-"))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from benchmarks.common import fmt_ms, percentile  # noqa: E402
+
+# refresh=True bypasses the dialog index so every request goes to Telegram
+BODY = {"bot_id": "bench", "api_id": 1, "api_hash": "hash", "session_string": "bench-session", "refresh": True}
+
+
+async def run(requests, pool_size, transport, start_bot=False):
+    main.client_pool.max_size = pool_size
+    latencies = []
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app") as http:
+            if start_bot:
+                response = await http.post("/api/telegram/bot/start", json={
+                    **BODY, "phone_number": "+48000000000", "group_ids": [],
+                })
+                assert response.status_code == 200, response.text
+                transport.calls.clear()
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = await http.post("/api/telegram/groups/fetch", json=BODY)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.text
+            if start_bot:
+                await http.post("/api/telegram/bot/stop", json={"bot_id": BODY["bot_id"]})
+    return latencies
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--connect-latency", type=float, default=0.3)
+    parser.add_argument("--dialogs", type=int, default=200)
+    args = parser.parse_args()
+
+    scenarios = [
+        ("cold", 0, False),
+        ("pooled", 50, False),
+        ("running bot", 50, True),
+    ]
+    for name, pool_size, start_bot in scenarios:
+        transport = fake_telethon.install(main, fake_telethon.FakeTransport(
+            connect_latency=args.connect_latency,
+            dialogs=fake_telethon.make_dialogs(args.dialogs),
+        ))
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies = asyncio.run(run(args.requests, pool_size, transport, start_bot))
+        print(f"{name:>12}: p50={fmt_ms(percentile(latencies, 50))} p99={fmt_ms(percentile(latencies, 99))} "
+              f"total={sum(latencies):.2f}s handshakes={transport.calls['connect']} "
+              f"open connections after shutdown={transport.live_connections}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,120 @@
+"""Benchmark: /api/telegram/groups/fetch for an account with many dialogs.
+
+Serves the app with uvicorn (streamed responses need a real server to
+measure time to first byte) against a fake Telethon transport and reports
+time to first byte, full response time and GetDialogs pages for: a full
+walk on every request (the old behaviour), the first streamed fetch,
+fetches answered from the index, and a delta refresh after a few new
+dialogs arrive.
+
+    python -m benchmarks.bench_dialog_index --dialogs 5000 --rpc-latency 0.05
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="bench-dialogs-"))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from benchmarks.common import BackgroundServer, fmt_ms  # noqa: E402
+
+BODY = {"bot_id": "bench", "api_id": 1, "api_hash": "hash"}
+
+
+def fetch(http, session, **options):
+    """POST a fetch; returns (first byte, total, groups, summary)"""
+    started = time.perf_counter()
+    first_byte = None
+    body = b""
+    with http.stream("POST", "/api/telegram/groups/fetch", json={**BODY, "session_string": session, **options}) as response:
+        assert response.status_code == 200, response.read()
+        for chunk in response.iter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            body += chunk
+    total = time.perf_counter() - started
+    if options.get("stream"):
+        lines = [json.loads(line) for line in body.splitlines()]
+        return first_byte, total, len(lines) - 1, lines[-1]
+    payload = json.loads(body)
+    return first_byte, total, len(payload["groups"]), payload
+
+
+def new_dialogs(count, transport):
+    """Dialogs newer than everything the transport has"""
+    newest = transport.dialogs[0].date
+    dialogs = fake_telethon.make_dialogs(count, seed=99)
+    for i, dialog in enumerate(dialogs):
+        dialog.entity.id += 5_000_000
+        dialog.id = dialog.entity.id
+        dialog.date = newest + timedelta(minutes=count - i)
+    return dialogs
+
+
+def wait_for_refresh(account, timeout=60):
+    deadline = time.monotonic() + timeout
+    while main.dialog_index.is_refreshing(account) and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dialogs", type=int, default=5000)
+    parser.add_argument("--new-dialogs", type=int, default=20)
+    parser.add_argument("--rpc-latency", type=float, default=0.05)
+    parser.add_argument("--connect-latency", type=float, default=0.3)
+    args = parser.parse_args()
+
+    transport = fake_telethon.install(main, fake_telethon.FakeTransport(
+        connect_latency=args.connect_latency,
+        rpc_latency=args.rpc_latency,
+        dialogs=fake_telethon.make_dialogs(args.dialogs),
+    ))
+
+    rows = []
+
+    def record(name, result):
+        pages = transport.calls["GetDialogs"]
+        transport.calls.clear()
+        first_byte, total, groups, _ = result
+        rows.append((name, first_byte, total, groups, pages))
+
+    with contextlib.redirect_stdout(io.StringIO()), BackgroundServer(main.app, lifespan="on") as server:
+        with httpx.Client(base_url=server.url, timeout=120) as http:
+            record("full walk (legacy)", fetch(http, "legacy", refresh=True))
+            record("full walk (legacy)", fetch(http, "legacy", refresh=True))
+            record("first fetch, stream", fetch(http, "fresh", stream=True))
+            record("cached", fetch(http, "fresh"))
+            record("cached, stream", fetch(http, "fresh", stream=True))
+            record("cached, limit=100", fetch(http, "fresh", limit=100))
+
+            transport.dialogs = new_dialogs(args.new_dialogs, transport) + transport.dialogs
+            main.dialog_index.refresh_interval = 0
+            account = main.session_key("fresh")
+            started = time.perf_counter()
+            result = fetch(http, "fresh")
+            wait_for_refresh(account)
+            refreshed = time.perf_counter() - started
+            record("cached + delta refresh", result)
+            _, _, groups, _ = fetch(http, "fresh")
+            transport.calls.clear()
+
+    expected = len(main.dialog_index.get(main.session_key("legacy")).groups)
+    print(f"{args.dialogs} dialogs, {expected} postable groups, {args.rpc_latency * 1000:.0f}ms per GetDialogs page")
+    for name, first_byte, total, count, pages in rows:
+        print(f"{name:>24}: first byte={fmt_ms(first_byte)} total={fmt_ms(total)} "
+              f"groups={count} GetDialogs={pages}")
+    print(f"{'delta refresh':>24}: +{args.new_dialogs} dialogs indexed in {refreshed:.2f}s, "
+          f"groups now {groups}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,175 @@
+"""Benchmark: time-to-first-send and peer resolution RPCs for a 500-group bot.
+
+Starts one bot whose account has --dialogs dialogs (--groups megagroups,
+the rest users) against a fake transport, where a bare group id missing
+from the client's entity cache costs one ResolvePeer RPC. Sends run one
+full cycle. Three starts of the same account:
+
+- without store: bare ids only, as before the entity store
+- cold store: nothing stored yet; one dialog walk fills the store
+- restart: a fresh client with the store filled by the previous run
+
+Then checks the store on its own: a user whose id equals a bare group id
+is never handed out for that group, marked ids find their kind, a file
+from before the kind was part of the key is migrated, and lookups of more
+ids than fit one query. Exits with status 1 if a check fails.
+
+    python -m benchmarks.bench_entity_store --groups 500 --rpc-latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-entity-store-")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from telethon.tl.types import Channel, Chat, ChatPhotoEmpty, InputPeerChannel, InputPeerChat, User  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from entity_store import QUERY_CHUNK, EntityStore  # noqa: E402
+
+SESSION = "bench-session"
+
+
+def make_account(dialogs, groups, seed=0):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    result, group_ids = [], []
+    for i in range(dialogs):
+        date = now - timedelta(minutes=i)
+        if i % max(1, dialogs // groups) == 0 and len(group_ids) < groups:
+            entity = Channel(id=1_000_000 + i, title=f"Group {i}", photo=ChatPhotoEmpty(), date=date,
+                             access_hash=rng.getrandbits(63), megagroup=True)
+            group_ids.append(entity.id)
+            title = entity.title
+        else:
+            entity = User(id=10_000 + i, access_hash=rng.getrandbits(63), first_name=f"User {i}")
+            title = entity.first_name
+        result.append(SimpleNamespace(id=entity.id, entity=entity, title=title, date=date, pinned=False))
+    return result, group_ids
+
+
+async def run_once(label, transport, group_ids, n):
+    bot_id = f"bot-{n}"
+    transport.calls.clear()
+    transport.sent.clear()
+    started = time.perf_counter()
+    await main.launch_bot(main.StartBot(
+        bot_id=bot_id,
+        api_id=1,
+        api_hash="hash",
+        phone_number="+48000000000",
+        session_string=SESSION,
+        group_ids=group_ids,
+        messages_per_minute=60_000,
+        min_group_interval=3600,
+        max_concurrent_sends=50,
+        auto_reply_enabled=False,
+    ))
+    first = None
+    while len(transport.sent[SESSION]) < len(group_ids):
+        if first is None and transport.sent[SESSION]:
+            first = time.perf_counter() - started
+        await asyncio.sleep(0.001)
+    cycle = time.perf_counter() - started
+    print(f"{label:>15}: first send {first * 1000:7.1f}ms, full cycle {cycle:6.2f}s, "
+          f"{transport.calls['ResolvePeer']:4} ResolvePeer + {transport.calls['GetDialogs']:3} GetDialogs RPCs")
+    await main.stop_bot(main.StopBot(bot_id=bot_id), None)
+
+
+async def run(args):
+    dialogs, group_ids = make_account(args.dialogs, args.groups)
+    transport = fake_telethon.install(main, fake_telethon.FakeTransport(
+        connect_latency=args.rpc_latency, rpc_latency=args.rpc_latency,
+        send_latency=args.rpc_latency, dialogs=dialogs,
+    ))
+    await main.client_pool.start()
+
+    # Previous behaviour: no preloaded peers, nothing learned or walked
+    patched = {name: getattr(main, name) for name in ("warm_peers", "learn_peer")}
+    main.warm_peers = lambda bot_id: asyncio.sleep(0)
+    main.learn_peer = lambda bot_data, group_id: asyncio.sleep(0)
+    await run_once("without store", transport, group_ids, 0)
+    for name, value in patched.items():
+        setattr(main, name, value)
+    await run_once("cold store", transport, group_ids, 1)
+    await run_once("restart", transport, group_ids, 2)
+    await main.client_pool.stop()
+
+
+def describe(peers):
+    return {peer_id: type(peer).__name__ for peer_id, peer in peers.items()}
+
+
+def check_store() -> list:
+    failures = []
+    now = datetime.now(timezone.utc)
+    directory = tempfile.mkdtemp(dir=os.environ["STATE_DIR"])
+    store = EntityStore(os.path.join(directory, "entities.db"))
+    store.remember("acct", [
+        User(id=777, access_hash=1, first_name="Same id"),
+        Channel(id=777, title="Channel", photo=ChatPhotoEmpty(), date=now, access_hash=2, megagroup=True),
+        Chat(id=888, title="Chat", photo=ChatPhotoEmpty(), participants_count=2, date=now, version=1),
+        User(id=999, access_hash=3, first_name="Only a user"),
+    ])
+    peers = store.input_peers("acct", [777, -1000000000777, -888, 888, 999, -100999])
+    expected = {777: InputPeerChannel(777, 2), -1000000000777: InputPeerChannel(777, 2),
+                -888: InputPeerChat(888), 888: InputPeerChat(888)}
+    if peers != expected:
+        failures.append(f"peers for colliding ids: {describe(peers)}")
+    store.forget("acct", -1000000000777)
+    if store.input_peers("acct", [777, 888]) != {888: InputPeerChat(888)}:
+        failures.append("forgetting a channel left it or dropped the chat")
+
+    many = [Channel(id=5_000_000 + i, title="", photo=ChatPhotoEmpty(), date=now, access_hash=i + 1)
+            for i in range(QUERY_CHUNK * 2 + 7)]
+    store.remember("acct", many)
+    wanted = [entity.id for entity in many] + [-1000000000000 - entity.id for entity in many[:10]]
+    if len(store.input_peers("acct", wanted)) != len(wanted):
+        failures.append("lookup over several queries missed peers")
+    store.close()
+
+    # A file keyed by (account, id), with user rows
+    path = os.path.join(directory, "old.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE entities (account TEXT NOT NULL, id INTEGER NOT NULL, kind TEXT NOT NULL, "
+               "access_hash INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (account, id))")
+    db.executemany("INSERT INTO entities VALUES ('acct', ?, ?, ?, 0)", [(1, "user", 5), (2, "channel", 6)])
+    db.commit()
+    db.close()
+    store = EntityStore(path)
+    peers = store.input_peers("acct", [1, 2])
+    store.remember("acct", [Chat(id=2, title="", photo=ChatPhotoEmpty(), participants_count=1, date=now, version=1)])
+    both = store.input_peers("acct", [-1000000000002, -2])
+    store.close()
+    if peers != {2: InputPeerChannel(2, 6)} or len(both) != 2:
+        failures.append(f"migrated file gave {describe(peers)}, {describe(both)}")
+    print(f"{'store checks':>15}: {'ok' if not failures else f'{len(failures)} failed'}")
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=500)
+    parser.add_argument("--dialogs", type=int, default=2000)
+    parser.add_argument("--rpc-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+    main.log_setup.stop()
+    failures = check_store()
+    for failure in failures:
+        print(f"FAIL: entity store {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,156 @@
+"""Benchmark + check: read-modify-write vs. batched atomic group counters.
+
+Concurrent senders (spread over two simulated replicas) bump the same
+bot_groups rows on a stub PostgREST. The legacy GET+PATCH path loses
+increments; the GroupStatsCounter path must account for every message.
+Then the same runs with one bot_id the RPC rejects (like a non-uuid one):
+its increments must be dropped and every other one still counted.
+
+    python -m benchmarks.bench_group_stats --senders 20 --messages 50
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.stub_postgrest import StubPostgREST
+from supabase_writer import GroupStatsCounter, SupabaseWriter
+
+KEY = "bench-key"
+HEADERS = {"apikey": KEY, "Authorization": f"Bearer {KEY}", "Content-Type": "application/json"}
+
+
+async def legacy_update_group_stats(http: httpx.AsyncClient, url: str, bot_id: str, group_id: int):
+    """The previous GET + PATCH implementation"""
+    response = await http.get(f"{url}/rest/v1/bot_groups?bot_id=eq.{bot_id}&group_id=eq.{group_id}", headers=HEADERS)
+    data = response.json()
+    if data:
+        current_count = data[0].get("messages_sent", 0) or 0
+        await http.patch(
+            f"{url}/rest/v1/bot_groups?bot_id=eq.{bot_id}&group_id=eq.{group_id}",
+            json={"messages_sent": current_count + 1, "last_message_at": datetime.utcnow().isoformat()},
+            headers=HEADERS,
+        )
+
+
+def seed(stub: StubPostgREST, bots: int, groups: int):
+    stub.reset()
+    stub.tables["bot_groups"].extend(
+        {"bot_id": f"bot-{b}", "group_id": g, "messages_sent": 0}
+        for b in range(bots) for g in range(groups)
+    )
+
+
+def plan(senders: int, messages: int, bots: int, groups: int):
+    rng = random.Random(42)
+    return [
+        [(f"bot-{rng.randrange(bots)}", rng.randrange(groups)) for _ in range(messages)]
+        for _ in range(senders)
+    ]
+
+
+async def run_legacy(stub, work):
+    async with httpx.AsyncClient() as http:
+        async def sender(items):
+            for bot_id, group_id in items:
+                await legacy_update_group_stats(http, stub.url, bot_id, group_id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender(items) for items in work))
+        return time.perf_counter() - started
+
+
+async def run_counters(stub, work, flush_interval):
+    # Two replicas, each with its own writer and counter, sharing the stub
+    replicas = []
+    for _ in range(2):
+        writer = SupabaseWriter(stub.url, KEY)
+        await writer.start()
+        counter = GroupStatsCounter(writer, flush_interval=flush_interval)
+        await counter.start()
+        replicas.append((writer, counter))
+
+    async def sender(index, items):
+        counter = replicas[index % len(replicas)][1]
+        for bot_id, group_id in items:
+            counter.add(bot_id, group_id)
+            await asyncio.sleep(0.001)  # stands in for client.send_message
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(i, items) for i, items in enumerate(work)))
+    for writer, counter in replicas:
+        await counter.stop()
+        await writer.stop()
+    return time.perf_counter() - started
+
+
+async def run_bad_key(stub, work, flush_interval):
+    """One replica; a bot_id the RPC refuses is counted along with the rest"""
+    stub.checks["rpc/increment_group_stats"] = lambda row: row["bot_id"] != "bad-bot"
+    writer = SupabaseWriter(stub.url, KEY)
+    await writer.start()
+    counter = GroupStatsCounter(writer, flush_interval=flush_interval)
+    await counter.start()
+
+    async def sender(items):
+        for bot_id, group_id in items:
+            counter.add(bot_id, group_id)
+            counter.add("bad-bot", group_id)
+            await asyncio.sleep(0.001)
+
+    await asyncio.gather(*(sender(items) for items in work))
+    await counter.stop()
+    await writer.stop()
+    del stub.checks["rpc/increment_group_stats"]
+    return counter
+
+
+def total_sent(stub):
+    return sum(row["messages_sent"] for row in stub.rows("bot_groups"))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--senders", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--bots", type=int, default=2)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    work = plan(args.senders, args.messages, args.bots, args.groups)
+    expected = args.senders * args.messages
+
+    with StubPostgREST(latency=0.001) as stub:
+        seed(stub, args.bots, args.groups)
+        elapsed = asyncio.run(run_legacy(stub, work))
+        got = total_sent(stub)
+        print(f"before: {got}/{expected} increments kept ({expected - got} lost), "
+              f"{stub.total_requests()} requests, {elapsed:.2f}s")
+
+        seed(stub, args.bots, args.groups)
+        elapsed = asyncio.run(run_counters(stub, work, args.flush_interval))
+        got = total_sent(stub)
+        print(f" after: {got}/{expected} increments kept ({expected - got} lost), "
+              f"{stub.total_requests()} requests, {elapsed:.2f}s")
+
+        seed(stub, args.bots, args.groups)
+        counter = asyncio.run(run_bad_key(stub, work, args.flush_interval))
+        kept = total_sent(stub)
+        print(f"bad key: {kept}/{expected} valid increments kept, {counter.dropped}/{expected} rejected ones "
+              f"dropped, {counter.pending} keys left pending, {stub.rejected} calls rejected")
+
+    if got != expected:
+        print("FAIL: increments were lost with GroupStatsCounter")
+        sys.exit(1)
+    if kept != expected or counter.dropped != expected or counter.pending:
+        print("FAIL: a rejected bot_id held back or lost the other group stats")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
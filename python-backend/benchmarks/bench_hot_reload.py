@@ -0,0 +1,133 @@
+"""Benchmark: changing a running bot's config, PATCH vs stop + start.
+
+Runs one bot over --groups groups against a fake transport, with a
+min_group_interval long enough that every group should get exactly one
+message per cycle. Part way through the cycle it PATCHes a new message
+template and a new group list (some unsent groups removed, some added),
+then checks the cycle: every group of the new list sent once, nothing sent
+to a removed group after the swap, and only sends already in flight still
+using the old template. Then reports PATCH latency over repeated swaps,
+the auto-reply handler count while toggling it, and what stop + start
+costs for the same change (reconnect, and the cycle restarting).
+
+    python -m benchmarks.bench_hot_reload --groups 300
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-hot-reload-")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from benchmarks.common import fmt_ms, percentile  # noqa: E402
+
+SESSION = "bench-session"
+BOT_ID = "bench-bot"
+
+
+async def wait_for(condition, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("condition not reached")
+        await asyncio.sleep(0.001)
+
+
+async def run(args):
+    transport = fake_telethon.install(main, fake_telethon.FakeTransport(
+        connect_latency=args.connect_latency, rpc_latency=0.05, send_latency=args.send_latency,
+    ))
+    sent = transport.sent[SESSION]
+    groups = list(range(1_000_000, 1_000_000 + args.groups))
+    start = {
+        "bot_id": BOT_ID, "api_id": 1, "api_hash": "hash", "phone_number": "+48000000000",
+        "session_string": SESSION, "group_ids": groups, "message_template": "v1",
+        "messages_per_minute": args.rate, "min_group_interval": 3600, "max_concurrent_sends": 5,
+    }
+    http = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+    path = f"/api/telegram/bot/config/{BOT_ID}"
+
+    response = await http.post("/api/telegram/bot/start", json=start)
+    assert response.json()["status"] == "STARTED", response.text
+    await wait_for(lambda: len(sent) >= args.groups // 3)
+
+    # Swap mid-cycle: new template, drop unsent groups, add new ones
+    in_flight = set(main.running_bots[BOT_ID].engine.in_flight)
+    sent_before = {group for group, _ in sent}
+    unsent = [g for g in groups if g not in sent_before and g not in in_flight]
+    removed = set(unsent[:args.groups // 10])
+    added = list(range(2_000_000, 2_000_000 + args.groups // 6))
+    new_groups = [g for g in groups if g not in removed] + added
+    connects = transport.calls["connect"]
+    started = time.perf_counter()
+    swap_index = len(sent)
+    response = await http.patch(path, json={"message_template": "v2", "group_ids": new_groups})
+    latency = time.perf_counter() - started
+    assert response.json()["status"] == "UPDATED", response.text
+    await wait_for(lambda: any(message == "v2" for _, message in sent[swap_index:]))
+    first_new = time.perf_counter() - started
+    await wait_for(lambda: set(new_groups) <= {g for g, _ in sent})
+    await asyncio.sleep(0.5)
+
+    counts = Counter(group for group, _ in sent)
+    duplicates = sum(1 for c in counts.values() if c > 1)
+    missed = sum(1 for g in new_groups if counts[g] == 0)
+    removed_after = sum(1 for g, _ in sent[swap_index:] if g in removed)
+    old_after = sum(1 for _, message in sent[swap_index:] if message == "v1")
+    stats = main.running_bots[BOT_ID].stats()
+    print(f"mid-cycle PATCH: {fmt_ms(latency)}, first send with the new template after {fmt_ms(first_new)}, "
+          f"{transport.calls['connect'] - connects} reconnects")
+    print(f"  {len(sent)} sends to {len(counts)} groups: {duplicates} duplicates, {missed} missed, "
+          f"{removed_after} to removed groups, {old_after} old-template sends in flight at the swap; "
+          f"stats kept: {stats['messages_sent']} sent")
+
+    latencies = []
+    for i in range(args.swaps):
+        started = time.perf_counter()
+        await http.patch(path, json={"message_template": f"swap {i}", "max_delay": 40 + i % 2})
+        latencies.append(time.perf_counter() - started)
+    print(f"{args.swaps} PATCHes: p50 {fmt_ms(percentile(latencies, 50))}, p99 {fmt_ms(percentile(latencies, 99))}")
+
+    client = main.running_bots[BOT_ID].client
+    handler_counts = set()
+    for i in range(20):
+        await http.patch(path, json={"auto_reply_enabled": i % 2 == 1})
+        handler_counts.add(sum(1 for _, event in client.handlers if type(event).__name__ == "NewMessage"))
+    print(f"auto-reply toggled 20 times: NewMessage handlers registered {sorted(handler_counts)}")
+
+    # The same change through stop + start
+    before = len(sent)
+    started = time.perf_counter()
+    await http.post("/api/telegram/bot/stop", json={"bot_id": BOT_ID})
+    await http.post("/api/telegram/bot/start", json={**start, "group_ids": new_groups, "message_template": "v3"})
+    await wait_for(lambda: any(message == "v3" for _, message in sent[before:]))
+    restart = time.perf_counter() - started
+    await asyncio.sleep(1.0)
+    resent = len({g for g, _ in sent[before:]})
+    print(f"stop + start: first send with the new template after {fmt_ms(restart)}, "
+          f"cycle restarted: {resent} groups sent again within 1s")
+    await http.post("/api/telegram/bot/stop", json={"bot_id": BOT_ID})
+    await http.aclose()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=6000, help="messages_per_minute")
+    parser.add_argument("--swaps", type=int, default=200)
+    parser.add_argument("--connect-latency", type=float, default=0.3)
+    parser.add_argument("--send-latency", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+    main.log_setup.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
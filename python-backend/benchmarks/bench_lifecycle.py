@@ -0,0 +1,182 @@
+"""Stress test: interleaved start/stop calls against the bot lifecycle.
+
+Fires --calls `/start` and `/stop` calls at random over --bots bots within
+--spread seconds, against a fake transport whose connects take
+--connect-latency (so starts overlap each other and the stops). One bot's
+session is unauthorized, so its starts fail. Tracks every connected client
+and running message loop per bot, and checks:
+
+- at no point did a bot have more than one connected client or loop
+- afterwards each bot is either fully running (in running_bots, state
+  running, one client, one loop, registered) or fully stopped (none of it)
+- after stopping everything no client, loop or task is left
+
+and exits with status 1 if any check fails.
+
+    python -m benchmarks.bench_lifecycle --bots 10 --calls 1000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-lifecycle-")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from fastapi import HTTPException  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from lifecycle import RUNNING  # noqa: E402
+
+
+class Tracker:
+    def __init__(self):
+        self.clients = Counter()  # session -> connected clients
+        self.loops = Counter()  # bot_id -> running message loops
+        self.max_clients = Counter()
+        self.max_loops = Counter()
+
+
+def install(tracker, transport):
+    fake_telethon.install(main, transport)
+
+    class TrackedClient(fake_telethon.FakeTelegramClient):
+        async def connect(self):
+            was = self._connected
+            await super().connect()
+            if not was and self._connected:
+                session = self.session.string
+                tracker.clients[session] += 1
+                tracker.max_clients[session] = max(tracker.max_clients[session], tracker.clients[session])
+
+        async def disconnect(self):
+            if self._connected:
+                tracker.clients[self.session.string] -= 1
+            await super().disconnect()
+
+    main.TelegramClient = TrackedClient
+    message_loop = main.bot_message_loop
+
+    async def tracked_loop(bot_id):
+        tracker.loops[bot_id] += 1
+        tracker.max_loops[bot_id] = max(tracker.max_loops[bot_id], tracker.loops[bot_id])
+        try:
+            await message_loop(bot_id)
+        finally:
+            tracker.loops[bot_id] -= 1
+
+    main.bot_message_loop = tracked_loop
+
+
+def config(bot_id):
+    return main.StartBot(
+        bot_id=bot_id, api_id=1, api_hash="hash", phone_number="+48000000000",
+        session_string=f"session-{bot_id}", group_ids=list(range(1_000_000, 1_000_010)),
+        messages_per_minute=600,
+    )
+
+
+async def call(kind, bot_id, delay, outcomes, latencies):
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+    try:
+        if kind == "start":
+            result = await main.start_bot(config(bot_id), None)
+        else:
+            result = await main.stop_bot(main.StopBot(bot_id=bot_id), None)
+        outcomes[f"{kind} {result['status']}"] += 1
+    except HTTPException as e:
+        outcomes[f"{kind} error {e.status_code}"] += 1
+    latencies.append(time.perf_counter() - started)
+
+
+def check(tracker, bot_ids):
+    """Bots whose pieces disagree about whether they are running"""
+    registered = set(main.registry.bot_ids())
+    broken = []
+    for bot_id in bot_ids:
+        pieces = (
+            bot_id in main.running_bots,
+            main.lifecycle.state(bot_id) == RUNNING,
+            tracker.clients[f"session-{bot_id}"] == 1,
+            tracker.loops[bot_id] == 1,
+            bot_id in registered,
+        )
+        if any(pieces) and not all(pieces):
+            broken.append((bot_id, pieces))
+        if tracker.clients[f"session-{bot_id}"] > 1 or tracker.loops[bot_id] > 1:
+            broken.append((bot_id, pieces))
+    return broken
+
+
+async def run(args):
+    tracker = Tracker()
+    transport = fake_telethon.FakeTransport(
+        connect_latency=args.connect_latency, rpc_latency=0.005, send_latency=0.01,
+    )
+    install(tracker, transport)
+    bot_ids = [f"bot-{i}" for i in range(args.bots)]
+    transport.unauthorized.add(f"session-{bot_ids[-1]}")
+
+    rng = random.Random(args.seed)
+    outcomes = Counter()
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        call(rng.choice(("start", "stop")), rng.choice(bot_ids), rng.uniform(0, args.spread), outcomes, latencies)
+        for _ in range(args.calls)
+    ))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(0.2)
+
+    print(f"{args.calls} calls over {args.bots} bots in {elapsed:.2f}s "
+          f"(p50 {sorted(latencies)[len(latencies) // 2] * 1000:.0f}ms per call): "
+          + ", ".join(f"{k} {v}" for k, v in sorted(outcomes.items())))
+    stats = main.lifecycle.stats()
+    print(f"lifecycle: {stats['transitions']} transitions run, {stats['joined']} calls joined one in progress")
+    print(f"max connected clients per bot: {max(tracker.max_clients.values())}, "
+          f"max message loops per bot: {max(tracker.max_loops.values(), default=0)}")
+    running = [b for b in bot_ids if b in main.running_bots]
+    broken = check(tracker, bot_ids)
+    print(f"after: {len(running)} running, {args.bots - len(running)} stopped, inconsistent: {broken or 'none'}")
+
+    await asyncio.gather(*(main.stop_bot(main.StopBot(bot_id=b), None) for b in bot_ids))
+    leftover = sum(tracker.clients.values()), sum(tracker.loops.values()), main.supervisor.stats()["tasks"]
+    active = len(main.lifecycle.active())
+    print(f"after stopping all: {leftover[0]} clients, {leftover[1]} loops, {leftover[2]} supervised tasks, "
+          f"{active} lifecycle entries, {transport.live_connections} live connections")
+    await main.supervisor.stop()
+
+    failures = []
+    if max(tracker.max_clients.values()) > 1 or max(tracker.max_loops.values(), default=0) > 1:
+        failures.append("a bot had more than one client or message loop")
+    if broken:
+        failures.append(f"{len(broken)} bots half running")
+    if any(leftover) or active or transport.live_connections:
+        failures.append("clients, loops, tasks or connections left after stopping all")
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--spread", type=float, default=2.0, help="seconds over which the calls are fired")
+    parser.add_argument("--connect-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    failures = asyncio.run(run(args))
+    main.log_setup.stop()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,129 @@
+"""Benchmark: memory per bot and append throughput of the in-memory log ring.
+
+Fills one BotLogBuffer per bot to capacity with a mix of sent, failed and
+auto-reply records and compares it with the obvious alternative, a
+`deque(maxlen=...)` of dicts. Also times `read(limit=50)` (the
+/bot/logs payload) and a cursor walk over the whole ring, and checks that
+an SSE tail sees every record appended while it is connected.
+
+    python -m benchmarks.bench_log_buffer --bots 100 --capacity 500
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+from benchmarks.common import fmt_ms
+from log_buffer import AUTO_REPLY, FAILED, SENT, BotLogBuffer
+
+
+def fill(append, n):
+    for i in range(n):
+        roll = i % 20
+        if roll == 0:
+            append(FAILED, -1001234567890 - i, "A wait of 31 seconds is required (caused by SendMessageRequest)")
+        elif roll < 4:
+            append(AUTO_REPLY, 500_000_000 + i, None)
+        else:
+            append(SENT, -1001234567890 - (i % 300), None)
+
+
+class DictDeque:
+    """Baseline: one dict per record in a bounded deque"""
+
+    def __init__(self, capacity):
+        self.records = deque(maxlen=capacity)
+        self.seq = 0
+
+    def append(self, kind, target, detail=None):
+        self.seq += 1
+        self.records.append({
+            "id": self.seq,
+            "type": kind,
+            "target": target,
+            "detail": detail,
+            "created_at": datetime.utcnow().isoformat(),
+        })
+
+
+def measure_memory(factory, bots, capacity):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    buffers = []
+    for _ in range(bots):
+        buffer = factory(capacity)
+        fill(buffer.append, capacity * 2)
+        buffers.append(buffer)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / bots
+
+
+def measure_appends(factory, capacity, n):
+    buffer = factory(capacity)
+    started = time.perf_counter()
+    fill(buffer.append, n)
+    return n / (time.perf_counter() - started)
+
+
+async def tail_check(appends):
+    buffer = BotLogBuffer(500)
+    received = []
+
+    async def tail():
+        cursor = buffer.seq
+        while True:
+            records = buffer.read(cursor, 100)
+            received.extend(r["id"] for r in records)
+            if records:
+                cursor = records[-1]["id"]
+                continue
+            if buffer.closed:
+                return
+            await buffer.wait(1.0)
+
+    reader = asyncio.create_task(tail())
+    await asyncio.sleep(0)
+    for i in range(appends):
+        buffer.append(SENT, i)
+        if i % 10 == 0:
+            await asyncio.sleep(0)
+    buffer.close()
+    await reader
+    return received == list(range(1, appends + 1))
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--capacity", type=int, default=500)
+    parser.add_argument("--appends", type=int, default=500_000)
+    args = parser.parse_args()
+
+    for label, factory in (("deque of dicts", DictDeque), ("ring buffer", BotLogBuffer)):
+        per_bot = measure_memory(factory, args.bots, args.capacity)
+        rate = measure_appends(factory, args.capacity, args.appends)
+        print(f"{label:>15}: {per_bot / 1024:,.1f} KiB per bot ({args.capacity} records), {rate:,.0f} appends/s")
+
+    buffer = BotLogBuffer(args.capacity)
+    fill(buffer.append, args.capacity * 3)
+    started = time.perf_counter()
+    for _ in range(1000):
+        buffer.read(limit=50)
+    latest = (time.perf_counter() - started) / 1000
+    started = time.perf_counter()
+    cursor, pages = buffer.oldest - 1, 0
+    while True:
+        page = buffer.read(cursor, 50)
+        if not page:
+            break
+        cursor, pages = page[-1]["id"], pages + 1
+    print(f"read(limit=50): {fmt_ms(latest)}; cursor walk of {args.capacity} records: "
+          f"{pages} pages in {fmt_ms(time.perf_counter() - started)}")
+    print(f"SSE tail saw every record: {asyncio.run(tail_check(5000))}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,162 @@
+"""Benchmark: event-loop lag from per-message log lines with many bots.
+
+Runs N simulated bots on one loop, each sending to groups and answering DMs
+as fast as its pacing allows, while stdout is a slow sink that blocks on
+every write (like a container log driver under pressure). A probe task
+measures how late its timers fire. Compares the previous print() calls with
+the structured logger, written synchronously and through the queue.
+
+    python -m benchmarks.bench_logging --bots 50 --seconds 3 --write-latency 0.0002
+"""
+import argparse
+import asyncio
+import contextlib
+import time
+from types import SimpleNamespace
+
+import main
+from benchmarks.common import fmt_ms, percentile
+from bot_state import BotState
+from bot_logging import LogSetup
+from log_buffer import BotLogBuffer
+from reply_cooldown import ReplyCooldown
+
+
+class SlowStdout:
+    """File-like sink whose writes block the calling thread"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.writes = 0
+
+    def write(self, text):
+        self.writes += 1
+        time.sleep(self.latency)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class FakeClient:
+    async def send_message(self, entity, message):
+        await asyncio.sleep(0)
+
+
+class KnownPeers(dict):
+    """Every group is already in the entity store"""
+
+    def get(self, group_id, default=None):
+        return group_id
+
+
+class FakeEvent:
+    __slots__ = ("is_private", "out", "sender_id", "text")
+
+    def __init__(self, sender_id):
+        self.is_private = True
+        self.out = False
+        self.sender_id = sender_id
+        self.text = "hi"
+
+    async def respond(self, message):
+        await asyncio.sleep(0)
+
+
+async def legacy_send(bot_id, group_id):
+    """The previous send_to_group/auto_reply_handler output"""
+    await main.running_bots[bot_id].client.send_message(group_id, "Hello!")
+    print(f"[BOT {bot_id}] ✅ Sent message to {group_id}")
+
+
+async def legacy_reply(bot_id, event):
+    print(f"[BOT {bot_id}] Received DM from {event.sender_id}: {event.text[:50]}...")
+    await event.respond("To jest tylko bot.")
+    print(f"[BOT {bot_id}] Sent auto-reply to {event.sender_id}")
+
+
+def register_bots(count):
+    main.running_bots.clear()
+    for i in range(count):
+        bot_id = f"bot-{i}"
+        config = SimpleNamespace(message_template="Hello!", auto_reply_message="To jest tylko bot.",
+                                 auto_reply_cooldown=0)
+        main.running_bots[bot_id] = BotState(
+            bot_id, config, FakeClient(), bot_id, SimpleNamespace(id=1), KnownPeers(),
+            main.log_setup.bot_logger(bot_id), BotLogBuffer(), main.BotMetrics(bot_id), ReplyCooldown(),
+        )
+
+
+async def probe(lags, stop, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run_bots(send, reply, bots, seconds, pacing):
+    lags = []
+    stop = asyncio.Event()
+    operations = 0
+
+    async def bot(bot_id):
+        nonlocal operations
+        i = 0
+        while not stop.is_set():
+            await asyncio.sleep(pacing)
+            if i % 4 == 3:
+                await reply(bot_id, FakeEvent(1000 + i))
+            else:
+                await send(bot_id, i)
+            operations += 1
+            i += 1
+
+    tasks = [asyncio.create_task(bot(bot_id)) for bot_id in list(main.running_bots)[:bots]]
+    prober = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(prober, *tasks)
+    return lags, operations
+
+
+def run_mode(label, args, send, reply, setup=None):
+    sink = SlowStdout(args.write_latency)
+    if setup is not None:
+        main.log_setup.stop()
+        main.log_setup = setup
+        setup.start()
+    register_bots(args.bots)
+    with contextlib.redirect_stdout(sink):
+        started = time.perf_counter()
+        lags, operations = asyncio.run(run_bots(send, reply, args.bots, args.seconds, args.pacing))
+        elapsed = time.perf_counter() - started
+        main.log_setup.stop()
+    dropped = main.log_setup.stats()["dropped"] if setup is not None else 0
+    print(f"{label:>28}: loop lag p50 {fmt_ms(percentile(lags, 50))}, p99 {fmt_ms(percentile(lags, 99))}, "
+          f"max {fmt_ms(max(lags, default=0.0))}; {operations / elapsed:,.0f} msgs/s, "
+          f"{sink.writes} writes, {dropped} dropped")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--pacing", type=float, default=0.01, help="seconds between messages per bot")
+    parser.add_argument("--write-latency", type=float, default=0.0002, help="blocking time per stdout write (s)")
+    args = parser.parse_args()
+
+    def send(bot_id, group_id):
+        return main.send_to_group(main.running_bots[bot_id], group_id)
+
+    run_mode("print (before)", args, legacy_send, legacy_reply)
+    run_mode("logger, synchronous", args, send, main.auto_reply_handler,
+             LogSetup(queue_size=0))
+    run_mode("logger, queued", args, send, main.auto_reply_handler,
+             LogSetup())
+    run_mode("logger, queued, sample 0.1", args, send, main.auto_reply_handler,
+             LogSetup(sample_rate=0.1))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,77 @@
+"""Benchmark: cost of recording metrics and of rendering /metrics.
+
+Times `observe()` on a bot's cached histogram series (what the send path
+does) and through a `labels()` lookup, renders the exposition with one set
+of per-bot series for N bots (the first render also builds the line
+prefixes), and checks that label values beyond `max_series` fold into
+bot="_other" instead of growing the output.
+
+    python -m benchmarks.bench_metrics --bots 1000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import fmt_ms
+from metrics import LAG_BUCKETS, WAIT_BUCKETS, Registry
+
+
+def build(bots, max_series):
+    registry = Registry()
+    histograms = [
+        registry.histogram("telegram_send_seconds", "send", ["bot"], max_series=max_series),
+        registry.histogram("auto_reply_seconds", "reply", ["bot"], max_series=max_series),
+        registry.histogram("send_drift_seconds", "drift", ["bot"], buckets=LAG_BUCKETS, max_series=max_series),
+        registry.histogram("telegram_flood_wait_seconds", "wait", ["bot"], buckets=WAIT_BUCKETS, max_series=max_series),
+    ]
+    errors = registry.counter("telegram_send_errors", "errors", ["bot", "error"], max_series=max_series * 4)
+    for i in range(bots):
+        for histogram in histograms:
+            histogram.labels(f"bot-{i}").observe(random.expovariate(10))
+        errors.labels(f"bot-{i}", "FloodWaitError").inc()
+    return registry, histograms
+
+
+def per_call(fn, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=1000)
+    parser.add_argument("--observations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    registry, (send, *_) = build(args.bots, max_series=args.bots)
+    child = send.labels("bot-0")
+    values = [random.expovariate(10) for _ in range(1024)]
+    it = iter(values * (args.observations // len(values) + 1))
+    cached = per_call(lambda: child.observe(next(it)), args.observations)
+    it = iter(values * (args.observations // len(values) + 1))
+    lookup = per_call(lambda: send.labels("bot-0").observe(next(it)), args.observations)
+    print(f"observe: {cached * 1e9:,.0f} ns on the cached series, {lookup * 1e9:,.0f} ns via labels()")
+
+    started = time.perf_counter()
+    body = registry.render()
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(10):
+        registry.render()
+    print(f"render {args.bots:,} bots: first {fmt_ms(first)}, then {fmt_ms((time.perf_counter() - started) / 10)}; "
+          f"{len(body) / 1024:,.0f} KiB, {body.count(chr(10)):,} lines, {registry.stats()['series']:,} series")
+
+    capped, _ = build(args.bots * 5, max_series=args.bots)
+    print(f"{args.bots * 5:,} distinct bots with max_series={args.bots:,}: "
+          f"{capped.stats()['series']:,} series, {len(capped.render()) / 1024:,.0f} KiB "
+          f"(overflow in bot=\"_other\")")
+
+    for i in range(args.bots):
+        registry.forget("bot", f"bot-{i}")
+    print(f"after forgetting every bot: {registry.stats()['series']} series")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,127 @@
+"""Soak test: abandoned logins against a fake transport.
+
+Calls /send-code for N phones that never verify (every tenth phone asks for
+a second code, which replaces its first login) and samples the pending
+logins, live connections, open file descriptors, session files, registry
+rows and Python heap as they go. With the TTL sweeper every count levels
+off at roughly rate x PENDING_AUTH_TTL (at most PENDING_AUTH_MAX) and
+returns to the baseline once the last logins expire. For comparison, the
+previous plain dict is run for a few hundred logins; it grows by one
+connection, descriptor and session file per login.
+
+    python -m benchmarks.bench_pending_auth --logins 10000 --ttl 1
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+def sample(main, transport):
+    pending = main.registry._db.execute("SELECT COUNT(*) FROM pending_auth").fetchone()[0]
+    return {
+        "pending": len(main.pending_auth),
+        "connections": transport.live_connections,
+        "fds": open_fds(),
+        "files": len(os.listdir(main.SESSIONS_DIR)),
+        "rows": pending,
+        "heap": tracemalloc.get_traced_memory()[0],
+    }
+
+
+def show(label, s, base):
+    print(f"{label:>14}: {s['pending']:5,} pending, {s['connections']:5,} connections, "
+          f"{s['fds'] - base['fds']:+6,} fds, {s['files']:5,} session files, {s['rows']:5,} registry rows, "
+          f"heap {(s['heap'] - base['heap']) / 1024:+8,.0f} KiB")
+
+
+async def legacy(main, logins):
+    """The previous /send-code: a dict entry per phone, never expired"""
+    clients = {}
+    for i in range(logins):
+        phone = f"+49{i:09d}"
+        client = main.create_login_client(phone, 1, "hash")
+        await client.connect()
+        sent = await client.send_code_request(phone)
+        clients[phone] = {"client": client, "phone_code_hash": sent.phone_code_hash}
+    return clients
+
+
+async def run(args, main, transport):
+    tracemalloc.start()
+    base = sample(main, transport)
+    show("baseline", base, base)
+
+    clients = await legacy(main, args.legacy)
+    show(f"legacy x{args.legacy}", sample(main, transport), base)
+    for entry in clients.values():
+        await entry["client"].disconnect()
+    for name in os.listdir(main.SESSIONS_DIR):
+        os.remove(os.path.join(main.SESSIONS_DIR, name))
+    clients.clear()
+
+    base = sample(main, transport)
+    await main.pending_auth.start()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    peak = dict(base)
+    started = time.perf_counter()
+
+    async def login(i):
+        async with semaphore:
+            await main.send_code(main.SendCode(api_id=1, api_hash="hash", phone=f"+48{i:09d}"))
+            if i % 10 == 0:
+                await main.send_code(main.SendCode(api_id=1, api_hash="hash", phone=f"+48{i:09d}"))
+            if args.rate:
+                await asyncio.sleep(args.concurrency / args.rate)
+
+    step = max(1, args.logins // 10)
+    for start in range(0, args.logins, step):
+        await asyncio.gather(*(login(i) for i in range(start, min(args.logins, start + step))))
+        current = sample(main, transport)
+        peak = {k: max(peak[k], v) for k, v in current.items()}
+        show(f"{start + step:,} logins", current, base)
+    elapsed = time.perf_counter() - started
+
+    await asyncio.sleep(args.ttl + main.pending_auth.sweep_interval * 2)
+    final = sample(main, transport)
+    show("after TTL", final, base)
+    show("peak", peak, base)
+    stats = main.pending_auth.stats()
+    print(f"{args.logins:,} logins in {elapsed:.1f}s; closed {stats['closed']}")
+    await main.pending_auth.stop()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=10_000)
+    parser.add_argument("--ttl", type=float, default=1.0, help="PENDING_AUTH_TTL for the run")
+    parser.add_argument("--max-pending", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=2000, help="logins/s (0 = as fast as possible)")
+    parser.add_argument("--legacy", type=int, default=300, help="logins through the previous dict")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-pending-auth-"))
+    os.environ.update({
+        "STATE_DIR": "state",
+        "LOG_LEVEL": "WARNING",
+        "PENDING_AUTH_TTL": str(args.ttl),
+        "PENDING_AUTH_MAX": str(args.max_pending),
+        "PENDING_AUTH_SWEEP_INTERVAL": str(max(0.05, args.ttl / 4)),
+    })
+    import main
+    from benchmarks import fake_telethon
+
+    transport = fake_telethon.install(main, fake_telethon.FakeTransport(connect_latency=0.001, rpc_latency=0.001))
+    asyncio.run(run(args, main, transport))
+    main.log_setup.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
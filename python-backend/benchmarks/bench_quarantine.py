@@ -0,0 +1,141 @@
+"""Fake-clock simulation: send cycles with dead groups, with and without quarantine.
+
+A bot sends to --groups groups of which --dead share fail every time with
+ChatWriteForbiddenError (banned, kicked or muted), and live groups fail
+now and then with a transient error. Runs on a virtual-time loop:
+
+- serial: the old bot_message_loop (send, then sleep min_delay..max_delay)
+- engine before: the SendEngine retrying every failing group each cycle and
+  spending a pacing slot on every failure
+- engine after: permanent errors quarantine the group, transient ones back
+  off, and failures give their pacing slot back
+
+Reports the effective cycle time (gap between two messages to the same live
+group), messages posted per hour, attempts wasted on dead groups, and the
+smallest gap between two posted messages (pacing must still hold).
+
+    python -m benchmarks.bench_quarantine --groups 100 --dead 0.3
+"""
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+from types import SimpleNamespace
+
+from telethon import errors
+
+from benchmarks.bench_scheduler import legacy_loop
+from benchmarks.common import percentile
+from benchmarks.virtual_time import run_virtual
+from scheduler import SendEngine
+
+
+class PreviousEngine(SendEngine):
+    """SendEngine as it was: failures keep their slot and never back off"""
+
+    def _refund(self, started):
+        pass
+
+
+class DeadGroupSender:
+    """Dead groups always fail; live ones fail with `transient_ratio`"""
+
+    def __init__(self, groups, dead_ratio, transient_ratio, seed):
+        self.rng = random.Random(seed)
+        self.dead = set(self.rng.sample(range(groups), int(groups * dead_ratio)))
+        self.transient_ratio = transient_ratio
+        self.posted = []  # (time, group_id)
+        self.wasted = 0
+        self.transient = 0
+
+    async def send(self, group_id):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.sleep(self.rng.uniform(0.2, 0.6))
+        if group_id in self.dead:
+            self.wasted += 1
+            raise errors.ChatWriteForbiddenError(request=None)
+        if self.rng.random() < self.transient_ratio:
+            self.transient += 1
+            raise TimeoutError("request timed out")
+        self.posted.append((started, group_id))
+
+
+async def engine_loop(engine_class, config, sender, until, **options):
+    loop = asyncio.get_running_loop()
+    engine = engine_class("sim", sender.send, lambda: config if loop.time() < until else None, **options)
+    loop.call_at(until, engine.wake)
+    await engine.run()
+    return engine
+
+
+def analyse(sender, duration):
+    per_group = defaultdict(list)
+    for t, group_id in sender.posted:
+        per_group[group_id].append(t)
+    cycles = [b - a for times in per_group.values() for a, b in zip(times, times[1:])]
+    starts = sorted(t for t, _ in sender.posted)
+    gaps = [b - a for a, b in zip(starts, starts[1:])]
+    return {
+        "cycle_p50": percentile(cycles, 50),
+        "posted_per_hour": len(starts) / duration * 3600,
+        "wasted": sender.wasted,
+        "min_gap": min(gaps) if gaps else 0.0,
+    }
+
+
+def simulate(mode, args):
+    config = SimpleNamespace(
+        group_ids=list(range(args.groups)),
+        min_delay=args.min_delay,
+        max_delay=args.max_delay,
+        messages_per_minute=None,
+        min_group_interval=0,
+        max_concurrent_sends=3,
+    )
+    duration = args.hours * 3600
+    random.seed(args.seed)
+    sender = DeadGroupSender(args.groups, args.dead, args.transient, args.seed)
+    engine = None
+    if mode == "serial":
+        run_virtual(legacy_loop(config, sender, duration))
+    elif mode == "engine before":
+        engine = run_virtual(engine_loop(
+            PreviousEngine, config, sender, duration, retry_delay=0, quarantine_time=0,
+        ))
+    else:
+        engine = run_virtual(engine_loop(SendEngine, config, sender, duration))
+    result = analyse(sender, duration)
+    result["quarantined"] = sum(h.quarantined for h in engine.health.values()) if engine else 0
+    result["refunds"] = engine.refunds if engine else 0
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--dead", type=float, default=0.3, help="share of groups that always fail")
+    parser.add_argument("--transient", type=float, default=0.02, help="share of sends to live groups that fail")
+    parser.add_argument("--hours", type=float, default=12)
+    parser.add_argument("--min-delay", type=int, default=20)
+    parser.add_argument("--max-delay", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    live = args.groups - int(args.groups * args.dead)
+    nominal = (args.min_delay + args.max_delay) / 2
+    print(f"{args.groups} groups, {args.groups - live} dead, {args.hours:g}h; "
+          f"ideal cycle over the live groups {live * nominal:.0f}s")
+    print(f"{'mode':>14} {'cycle p50':>10} {'posted/h':>9} {'dead tries':>10} {'quarantined':>11} "
+          f"{'refunds':>8} {'min gap':>8}")
+    baseline = None
+    for mode in ("serial", "engine before", "engine after"):
+        r = simulate(mode, args)
+        baseline = baseline or r["cycle_p50"]
+        print(f"{mode:>14} {r['cycle_p50']:>9.0f}s {r['posted_per_hour']:>9.0f} {r['wasted']:>10} "
+              f"{r['quarantined']:>11} {r['refunds']:>8} {r['min_gap']:>7.1f}s"
+              f"  ({r['cycle_p50'] / baseline:.0%} of serial)")
+
+
+if __name__ == "__main__":
+    main_cli()
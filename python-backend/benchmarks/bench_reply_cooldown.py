@@ -0,0 +1,129 @@
+"""Benchmark: auto-replies sent for a synthetic DM stream, with and without a cooldown.
+
+Feeds N private messages into `main.auto_reply_handler`. Senders are drawn
+from a heavy-tailed distribution: a few chatty contacts send most messages.
+Arrivals are spread over --hours of simulated time (the cooldown cache reads
+a virtual clock). Reports replies and Supabase rows per run, handler
+throughput, the cache's size and memory, and how many replies one contact
+sending 30 messages in a row gets.
+
+    python -m benchmarks.bench_reply_cooldown --messages 100000 --cooldown 600
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import main
+from bot_state import BotState
+from log_buffer import BotLogBuffer
+from reply_cooldown import ReplyCooldown
+
+BOT_ID = "bench-bot"
+
+
+class FakeEvent:
+    __slots__ = ("is_private", "out", "sender_id", "text", "replies")
+
+    def __init__(self, sender_id, replies):
+        self.is_private = True
+        self.out = False
+        self.sender_id = sender_id
+        self.text = "hi"
+        self.replies = replies
+
+    async def respond(self, message):
+        self.replies[0] += 1
+
+
+def make_stream(n, senders, hours, seed=1):
+    """[(arrival seconds, sender_id)] sorted by arrival"""
+    rng = random.Random(seed)
+    ids = list(range(1_000_000, 1_000_000 + senders))
+    # Zipf-like weights: sender k sends ~1/k of the top sender's messages
+    weights = [1 / (k + 1) for k in range(senders)]
+    chosen = rng.choices(ids, weights=weights, k=n)
+    arrivals = sorted(rng.uniform(0, hours * 3600) for _ in range(n))
+    return list(zip(arrivals, chosen))
+
+
+def register(cooldown, capacity, clock):
+    rows = [0]
+
+    async def count_rows(table, data):
+        rows[0] += 1
+
+    main.log_to_supabase = count_rows
+    main.running_bots[BOT_ID] = BotState(
+        BOT_ID, SimpleNamespace(auto_reply_message="To jest tylko bot.", auto_reply_cooldown=cooldown),
+        None, BOT_ID, SimpleNamespace(id=1), {}, main.log_setup.bot_logger(BOT_ID), BotLogBuffer(),
+        main.BotMetrics(BOT_ID), ReplyCooldown(capacity, clock=clock),
+    )
+    return rows
+
+
+async def run_stream(stream, cooldown, capacity):
+    now = [0.0]
+    rows = register(cooldown, capacity, lambda: now[0])
+    replies = [0]
+    events = [FakeEvent(sender_id, replies) for _, sender_id in stream]
+    started = time.perf_counter()
+    for (arrival, _), event in zip(stream, events):
+        now[0] = arrival
+        await main.auto_reply_handler(BOT_ID, event)
+    elapsed = time.perf_counter() - started
+    cache = main.running_bots[BOT_ID].reply_cooldown
+    return replies[0], rows[0], len(stream) / elapsed, cache
+
+
+async def burst(cooldown):
+    now = [0.0]
+    register(cooldown, 10000, lambda: now[0])
+    replies = [0]
+    for i in range(30):
+        now[0] = i * 2.0
+        await main.auto_reply_handler(BOT_ID, FakeEvent(42, replies))
+    return replies[0]
+
+
+def cache_memory(capacity):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = ReplyCooldown(capacity, clock=lambda: 0.0)
+    for sender_id in range(1_000_000, 1_000_000 + capacity * 2):
+        cache.try_acquire(sender_id, 600)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return len(cache), used
+
+
+async def run(args):
+    stream = make_stream(args.messages, args.senders, args.hours)
+    print(f"{args.messages:,} DMs from {len({s for _, s in stream}):,} senders over {args.hours:g}h")
+    for label, cooldown in (("no cooldown", 0), (f"cooldown {args.cooldown:g}s", args.cooldown)):
+        replies, rows, rate, cache = await run_stream(stream, cooldown, args.capacity)
+        suppressed = main.running_bots[BOT_ID].auto_replies_suppressed
+        print(f"{label:>15}: {replies:7,} replies, {rows:7,} Supabase rows, {suppressed:7,} suppressed; "
+              f"{rate:,.0f} msgs/s; cache {len(cache):,} senders")
+        print(f"{'':>15}  replies to 30 messages from one contact: {await burst(cooldown)}")
+    size, used = cache_memory(args.capacity)
+    print(f"full cache: {size:,} senders, {used / 1024:,.0f} KiB ({used / size:.0f} B per sender)")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--senders", type=int, default=20_000)
+    parser.add_argument("--hours", type=float, default=6.0)
+    parser.add_argument("--cooldown", type=float, default=600.0)
+    parser.add_argument("--capacity", type=int, default=10_000)
+    args = parser.parse_args()
+
+    main.log_setup.stop()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
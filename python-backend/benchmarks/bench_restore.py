@@ -0,0 +1,108 @@
+"""Benchmark: cold start to all registered bots running.
+
+Registers N bots in a temporary registry (each part-way through its cycle),
+then runs the app lifespan against a fake Telethon transport and measures
+how long it takes until every bot is running again, for several restore
+concurrency limits. Also checks that each bot resumes with the next unsent
+group instead of group 0.
+
+    python -m benchmarks.bench_restore --bots 50 --connect-latency 0.3
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-restore-")
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from lifecycle import BotLifecycle  # noqa: E402
+
+GROUPS = list(range(1, 11))
+ALREADY_SENT = GROUPS[:4]
+
+
+def register_bots(count):
+    now = time.time()
+    for i in range(count):
+        bot_id = f"bot-{i}"
+        main.registry.save_bot(bot_id, main.StartBot(
+            bot_id=bot_id,
+            api_id=1,
+            api_hash="hash",
+            phone_number=f"+48{i:09d}",
+            session_string=f"session-{i}",
+            group_ids=GROUPS,
+        ).dict(), True)
+        main.registry.checkpoint(
+            {bot_id: {g: now - 100 + g for g in ALREADY_SENT}},
+            {bot_id: {"messages_sent": len(ALREADY_SENT), "messages_failed": 0, "auto_replies": 0}},
+        )
+
+
+async def simulate_crash():
+    """Drop every running bot without unregistering it, like a killed process"""
+    for bot_id, bot_data in list(main.running_bots.items()):
+        bot_data.running = False
+        bot_data.engine.wake()
+        await bot_data.client.disconnect()
+    main.running_bots.clear()
+    # A new process starts with no bots running
+    main.lifecycle = BotLifecycle()
+    await asyncio.sleep(0.05)
+
+
+def expected_first_groups():
+    """Per session: the group a resumed cycle should start with"""
+    return {
+        entry["config"]["session_string"]: min(GROUPS, key=lambda g: entry["positions"].get(g, 0.0))
+        for entry in main.registry.load_bots()
+    }
+
+
+async def cold_start(expected, transport):
+    first_groups = expected_first_groups()
+    started = time.perf_counter()
+    async with main.lifespan(main.app):
+        while main.restore_status["seconds"] is None or len(main.running_bots) < expected:
+            if main.restore_status["seconds"] is not None and main.restore_status["failed"]:
+                break
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        # Let each bot make its first send
+        while sum(1 for s in transport.sent.values() if s) < expected:
+            await asyncio.sleep(0.005)
+        resumed = sum(1 for session, s in transport.sent.items() if s[0][0] == first_groups[session])
+        await simulate_crash()
+    return elapsed, resumed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=50)
+    parser.add_argument("--connect-latency", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    register_bots(args.bots)
+    ok = True
+    for concurrency in args.concurrency:
+        transport = fake_telethon.install(main, fake_telethon.FakeTransport(connect_latency=args.connect_latency))
+        main.RESTORE_CONCURRENCY = concurrency
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, resumed = asyncio.run(cold_start(args.bots, transport))
+        label = "serial" if concurrency == 1 else f"concurrency={concurrency}"
+        print(f"{label:>15}: {args.bots} bots running after {elapsed:.2f}s "
+              f"({transport.calls['connect']} connects), resumed mid-cycle: {resumed}/{args.bots}")
+        ok = ok and resumed == args.bots
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,150 @@
+"""Fake-clock simulation: serial bot_message_loop vs. the SendEngine scheduler.
+
+Both run on a virtual-time event loop against a fake send with random
+latency, slow sends, failures and FloodWait injection. Reports achieved
+cycle time (gap between two sends to the same group) and pacing compliance
+(gaps between posted messages; failed sends give their slot back) for
+1/100/1000 groups.
+
+    python -m benchmarks.bench_scheduler --groups 1 100 1000 --min-delay 20 --max-delay 40
+"""
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+from types import SimpleNamespace
+
+from telethon import errors
+
+from benchmarks.common import percentile
+from benchmarks.virtual_time import run_virtual
+from scheduler import SendEngine
+
+
+class FakeSender:
+    """Records send starts; injects latency, slow sends, failures and FloodWaits"""
+
+    def __init__(self, seed, slow_ratio=0.05, fail_ratio=0.03, flood_ratio=0.005, flood_seconds=60):
+        self.rng = random.Random(seed)
+        self.slow_ratio = slow_ratio
+        self.fail_ratio = fail_ratio
+        self.flood_ratio = flood_ratio
+        self.flood_seconds = flood_seconds
+        self.starts = []  # (time, group_id)
+        self.failed = set()  # indexes into starts
+        self.flood_windows = []  # (from, until)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send(self, group_id):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        index = len(self.starts)
+        self.starts.append((now, group_id))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            roll = self.rng.random()
+            if roll < self.flood_ratio:
+                await asyncio.sleep(0.2)
+                self.flood_windows.append((loop.time(), loop.time() + self.flood_seconds))
+                raise errors.FloodWaitError(request=None, capture=self.flood_seconds)
+            if roll < self.flood_ratio + self.fail_ratio:
+                await asyncio.sleep(0.5)
+                self.failed.add(index)
+                raise errors.ChatWriteForbiddenError(request=None)
+            if roll < self.flood_ratio + self.fail_ratio + self.slow_ratio:
+                await asyncio.sleep(20)
+            else:
+                await asyncio.sleep(self.rng.uniform(0.2, 1.5))
+        finally:
+            self.in_flight -= 1
+
+
+async def legacy_loop(config, sender, until):
+    """The previous serial loop: send, then sleep randint(min_delay, max_delay)"""
+    loop = asyncio.get_running_loop()
+    while loop.time() < until:
+        for group_id in config.group_ids:
+            if loop.time() >= until:
+                break
+            try:
+                await sender.send(group_id)
+            except Exception:
+                pass
+            await asyncio.sleep(random.randint(config.min_delay, config.max_delay))
+
+
+async def engine_loop(config, sender, until):
+    loop = asyncio.get_running_loop()
+    engine = SendEngine("sim", sender.send, lambda: config if loop.time() < until else None)
+    # Make sure the engine notices the deadline even while idle
+    loop.call_at(until, engine.wake)
+    await engine.run()
+
+
+def analyse(sender, config):
+    per_group = defaultdict(list)
+    for t, group_id in sender.starts:
+        per_group[group_id].append(t)
+    cycles = [b - a for times in per_group.values() for a, b in zip(times, times[1:])]
+
+    starts = sorted(t for t, _ in sender.starts)
+    posted = sorted(t for i, (t, _) in enumerate(sender.starts) if i not in sender.failed)
+    gaps = [b - a for a, b in zip(posted, posted[1:])]
+    min_spacing = 60.0 / config.messages_per_minute if config.messages_per_minute else config.min_delay
+    spacing_ok = sum(1 for g in gaps if g >= min_spacing - 1e-6)
+    in_pause = sum(1 for t in starts for a, b in sender.flood_windows if a <= t < b)
+    return {
+        "sends": len(starts),
+        "cycle_p50": percentile(cycles, 50),
+        "cycle_max": max(cycles) if cycles else 0.0,
+        "spacing_ok": spacing_ok / len(gaps) if gaps else 1.0,
+        "sends_during_floodwait": in_pause,
+        "max_in_flight": sender.max_in_flight,
+    }
+
+
+def simulate(runner, groups, cycles, seed, config_overrides):
+    config = SimpleNamespace(
+        group_ids=list(range(groups)),
+        min_delay=20,
+        max_delay=40,
+        messages_per_minute=None,
+        min_group_interval=0,
+        max_concurrent_sends=3,
+    )
+    for key, value in config_overrides.items():
+        setattr(config, key, value)
+    nominal_spacing = 60.0 / config.messages_per_minute if config.messages_per_minute else (config.min_delay + config.max_delay) / 2
+    until = cycles * max(groups, 1) * nominal_spacing + nominal_spacing
+    random.seed(seed)
+    sender = FakeSender(seed)
+    run_virtual(runner(config, sender, until))
+    result = analyse(sender, config)
+    result["nominal_cycle"] = groups * nominal_spacing
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--min-delay", type=int, default=20)
+    parser.add_argument("--max-delay", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    overrides = {"min_delay": args.min_delay, "max_delay": args.max_delay}
+    print(f"{'groups':>6} {'mode':>7} {'sends':>6} {'nominal':>9} {'cycle p50':>10} {'cycle max':>10} "
+          f"{'spacing ok':>10} {'in FloodWait':>12} {'max conc':>8}")
+    for groups in args.groups:
+        for name, runner in (("before", legacy_loop), ("after", engine_loop)):
+            r = simulate(runner, groups, args.cycles, args.seed, overrides)
+            print(f"{groups:>6} {name:>7} {r['sends']:>6} {r['nominal_cycle']:>8.0f}s {r['cycle_p50']:>9.0f}s "
+                  f"{r['cycle_max']:>9.0f}s {r['spacing_ok']:>9.1%} {r['sends_during_floodwait']:>12} "
+                  f"{r['max_in_flight']:>8}")
+
+
+if __name__ == "__main__":
+    main_cli()
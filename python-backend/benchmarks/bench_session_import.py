@@ -0,0 +1,139 @@
+"""Benchmark: onboarding N accounts, one request per session vs one bulk upload.
+
+Runs the app on a local port against a fake transport (every twentieth
+session is logged out) and imports the same sessions twice each way:
+
+- .session files: N x POST /import-session vs one zip to /import-sessions
+- session strings: N x POST /validate-session vs one NDJSON to /import-sessions
+
+Reports wall time, time to the first result and the result counts.
+
+    python -m benchmarks.bench_session_import --sessions 500 --concurrency 20
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import zipfile
+from collections import Counter
+
+import httpx
+
+
+def session_bytes(i, size):
+    return random.Random(i).randbytes(size)
+
+
+def make_zip(phones, size):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i, phone in enumerate(phones):
+            archive.writestr(f"session_{phone}.session", session_bytes(i, size))
+    return buffer.getvalue()
+
+
+def make_ndjson(strings):
+    return "".join(json.dumps({"phone": f"string-{i}", "session_string": s}) + "\n"
+                   for i, s in enumerate(strings)).encode()
+
+
+def serial(client, label, requests):
+    started = time.perf_counter()
+    first = None
+    statuses = Counter()
+    for path, kwargs in requests:
+        response = client.post(path, **kwargs)
+        statuses[response.json().get("status", str(response.status_code))] += 1
+        if first is None:
+            first = time.perf_counter() - started
+    report(label, time.perf_counter() - started, first, statuses)
+
+
+def bulk(client, label, name, body):
+    form = {"api_id": "1", "api_hash": "hash"}
+    started = time.perf_counter()
+    first = None
+    statuses = Counter()
+    with client.stream("POST", "/import-sessions", data=form, files={"sessions": (name, body)}) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            result = json.loads(line)
+            if "index" not in result:
+                summary = result
+                continue
+            if first is None:
+                first = time.perf_counter() - started
+            statuses[result["status"]] += 1
+    assert summary["status"] == "SUCCESS", summary
+    report(label, time.perf_counter() - started, first, statuses)
+
+
+def report(label, elapsed, first, statuses):
+    counts = ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+    print(f"{label:>22}: {elapsed:6.2f}s, first result {first * 1000:7.1f}ms ({counts})")
+
+
+def run(args, main, transport):
+    from benchmarks.common import BackgroundServer
+
+    phones = [f"+48{i:09d}" for i in range(args.sessions)]
+    strings = [f"string-session-{i}" for i in range(args.sessions)]
+    for i in range(0, args.sessions, 20):
+        transport.unauthorized.add(os.path.join(main.SESSIONS_DIR, f"session_{phones[i]}"))
+        transport.unauthorized.add(strings[i])
+    archive = make_zip(phones, args.file_size)
+    print(f"{args.sessions} sessions, zip {len(archive) / 1024 / 1024:.1f} MiB, "
+          f"connect {args.connect_latency * 1000:.0f}ms + RPC {args.rpc_latency * 1000:.0f}ms, "
+          f"IMPORT_CONCURRENCY={main.IMPORT_CONCURRENCY}")
+
+    with BackgroundServer(main.app) as server, httpx.Client(base_url=server.url, timeout=600) as client:
+        form = {"api_id": "1", "api_hash": "hash"}
+        serial(client, "files, one by one", [
+            ("/import-session", {
+                "data": {**form, "phone": phone},
+                "files": {"session_file": (f"{phone}.session", session_bytes(i, args.file_size))},
+            })
+            for i, phone in enumerate(phones)
+        ])
+        bulk(client, "files, bulk zip", "sessions.zip", archive)
+
+        serial(client, "strings, one by one", [
+            ("/validate-session", {"data": {**form, "session_string": s}}) for s in strings
+        ])
+        bulk(client, "strings, bulk NDJSON", "sessions.ndjson", make_ndjson(strings))
+
+    left = [name for name in os.listdir(main.SESSIONS_DIR) if not name.startswith("session_")]
+    print(f"stray files in {main.SESSIONS_DIR}: {len(left)}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=28 * 1024, help="bytes per .session file")
+    parser.add_argument("--connect-latency", type=float, default=0.05)
+    parser.add_argument("--rpc-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="bench-session-import-"))
+    os.environ.update({
+        "STATE_DIR": "state",
+        "LOG_LEVEL": "WARNING",
+        "IMPORT_CONCURRENCY": str(args.concurrency),
+        "CLIENT_POOL_SIZE": "0",
+    })
+    import main
+    from benchmarks import fake_telethon
+
+    transport = fake_telethon.install(main, fake_telethon.FakeTransport(
+        connect_latency=args.connect_latency, rpc_latency=args.rpc_latency,
+    ))
+    run(args, main, transport)
+    main.log_setup.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,236 @@
+"""Benchmark: aggregate sends/sec and loop lag with 1 vs. N sharded workers.
+
+Starts W worker processes sharing one STATE_DIR (registry and lease table)
+and one public port, each with a fake Telegram transport whose sends cost
+some CPU on the event loop. Starts B bots through the public port (requests
+are forwarded to the owning worker), then measures sends/sec across all
+workers and each worker's event-loop lag. Also checks that every bot runs
+on exactly one worker, and with several workers stops one and times how
+long the others take to resume its bots. One of the stopped worker's bots
+has its session revoked meanwhile: the others must unregister it rather
+than reconnect it on every rebalancing pass (exit status 1 if not).
+
+    python -m benchmarks.bench_sharding --bots 400 --workers 1 4 --send-cpu 0.002
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import fmt_ms, percentile
+
+
+def serve(args):
+    os.environ.update({
+        "STATE_DIR": args.state_dir,
+        "SHARD_WORKER_ID": f"worker-{args.serve}",
+        "SHARD_WORKER_URL": f"http://127.0.0.1:{args.private_port}",
+        "SHARD_HEARTBEAT_INTERVAL": "0.5",
+        "SHARD_WORKER_TTL": "3",
+        "SHARD_LEASE_TTL": "5",
+        "RESTORE_CONCURRENCY": "50",
+        "LOG_LEVEL": "WARNING",
+    })
+    import main
+    import sharding
+    from benchmarks import fake_telethon
+
+    transport = fake_telethon.FakeTransport(connect_latency=0.01, send_latency=0.02, send_cpu=args.send_cpu)
+    fake_telethon.install(main, transport)
+    probe = {"lags": [], "task": None}
+
+    async def measure_lag():
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + 0.01
+            await asyncio.sleep(0.01)
+            probe["lags"].append(loop.time() - expected)
+
+    @main.app.post("/bench/reset")
+    async def reset():
+        probe["lags"] = []
+        if probe["task"] is None:
+            probe["task"] = asyncio.create_task(measure_lag())
+        return {"sent": sum(b.messages_sent for b in main.running_bots.values())}
+
+    @main.app.post("/bench/revoke")
+    async def revoke(session: str):
+        transport.unauthorized.add(session)
+
+    @main.app.get("/bench/metrics")
+    async def metrics():
+        lags = probe["lags"]
+        return {
+            "sent": sum(b.messages_sent for b in main.running_bots.values()),
+            "running": sorted(main.running_bots),
+            "registered": len(await asyncio.to_thread(main.registry.bot_ids)),
+            "connects": transport.calls["connect"],
+            "lag_p50": percentile(lags, 50),
+            "lag_p99": percentile(lags, 99),
+        }
+
+    sharding.serve_worker(main.app, "127.0.0.1", args.port, args.private_port, log_level="error")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def stop(process, timeout=60):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def spawn(i, args, state_dir, port, private_port):
+    return subprocess.Popen([
+        sys.executable, "-m", "benchmarks.bench_sharding", "--serve", str(i),
+        "--state-dir", state_dir, "--port", str(port), "--private-port", str(private_port),
+        "--send-cpu", str(args.send_cpu),
+    ])
+
+
+async def wait_ready(http, urls):
+    for url in urls:
+        for _ in range(300):
+            try:
+                await http.get(f"{url}/health")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+
+
+async def collect(http, urls):
+    return [(await http.get(f"{url}/bench/metrics")).json() for url in urls]
+
+
+async def wait_running(http, urls, expected, timeout=120.0):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        running = [bot for m in await collect(http, urls) for bot in m["running"]]
+        if len(running) >= expected:
+            return time.perf_counter() - started, running
+        await asyncio.sleep(0.2)
+    return None, running
+
+
+async def run(args, workers):
+    state_dir = tempfile.mkdtemp(prefix="bench-sharding-")
+    port = free_port()
+    private = [free_port() for _ in range(workers)]
+    processes = [spawn(i, args, state_dir, port, private[i]) for i in range(workers)]
+    urls = [f"http://127.0.0.1:{p}" for p in private]
+    failures = []
+    try:
+        async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=50)) as http:
+            await wait_ready(http, urls)
+            # Let the workers see each other before placing bots
+            await asyncio.sleep(1.5)
+            semaphore = asyncio.Semaphore(20)
+
+            async def start(i):
+                async with semaphore:
+                    for _ in range(5):
+                        response = await http.post(f"http://127.0.0.1:{port}/api/telegram/bot/start", json={
+                            "bot_id": f"bot-{i}",
+                            "api_id": 1,
+                            "api_hash": "hash",
+                            "phone_number": f"+48{i:09d}",
+                            "session_string": f"session-{i}",
+                            "group_ids": list(range(1, 11)),
+                            "min_delay": 1,
+                            "max_delay": 1,
+                            "auto_reply_enabled": False,
+                        })
+                        # An overloaded owner may time out; the start is idempotent
+                        if response.status_code != 503:
+                            break
+                    response.raise_for_status()
+
+            await asyncio.gather(*(start(i) for i in range(args.bots)))
+            _, running = await wait_running(http, urls, args.bots)
+            await asyncio.sleep(2)
+
+            before = [(await http.post(f"{url}/bench/reset")).json()["sent"] for url in urls]
+            started = time.perf_counter()
+            await asyncio.sleep(args.seconds)
+            metrics = await collect(http, urls)
+            elapsed = time.perf_counter() - started
+
+            sent = sum(m["sent"] for m in metrics) - sum(before)
+            running = [bot for m in metrics for bot in m["running"]]
+            per_worker = ", ".join(str(len(m["running"])) for m in metrics)
+            print(f"{workers} worker(s): {sent / elapsed:,.1f} sends/s "
+                  f"(demand {args.bots:,}/s), loop lag p50 {fmt_ms(max(m['lag_p50'] for m in metrics))} "
+                  f"p99 {fmt_ms(max(m['lag_p99'] for m in metrics))} (worst worker); "
+                  f"bots per worker [{per_worker}], unique {len(set(running))}/{len(running)}")
+
+            if workers > 1 and metrics[-1]["running"]:
+                victim = processes.pop()
+                urls.pop()
+                moved = len(metrics[-1]["running"])
+                revoked = metrics[-1]["running"][0]
+                for url in urls:
+                    await http.post(f"{url}/bench/revoke", params={"session": revoked.replace("bot-", "session-")})
+                stop(victim)
+                took, running = await wait_running(http, urls, args.bots - 1)
+                print(f"  worker stopped: its {moved - 1} bots resumed on the others in "
+                      f"{took:.1f}s, unique {len(set(running))}/{len(running)}")
+
+                # Several rebalancing passes (SHARD_HEARTBEAT_INTERVAL 0.5s)
+                await asyncio.sleep(2)
+                before = sum(m["connects"] for m in await collect(http, urls))
+                await asyncio.sleep(3)
+                metrics = await collect(http, urls)
+                reconnects = sum(m["connects"] for m in metrics) - before
+                registered = metrics[0]["registered"]
+                print(f"  revoked session of {revoked}: {registered}/{args.bots} bots registered, "
+                      f"{reconnects} connects in the 3s after")
+                if reconnects or registered != args.bots - 1:
+                    failures.append(f"{revoked} with a revoked session is still retried")
+    finally:
+        for process in processes:
+            stop(process)
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--send-cpu", type=float, default=0.002, help="CPU seconds per send")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--state-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--private-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        serve(args)
+        return
+
+    print(f"{len(os.sched_getaffinity(0))} CPU core(s) available")
+    failures = []
+    for workers in args.workers:
+        failures += asyncio.run(run(args, workers))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
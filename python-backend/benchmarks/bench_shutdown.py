@@ -0,0 +1,149 @@
+"""Benchmark: app shutdown with every bot in the middle of a send.
+
+Restores --bots registered bots through the app lifespan against a fake
+Telethon transport and a local stub PostgREST. Sends take --send-latency;
+--stuck bots have sends that take --stuck-latency (like Telethon sleeping
+through a FloodWait). Once every bot has a send in flight the lifespan is
+left:
+
+- before: the previous shutdown (cancel every task and await it, one step
+  after another, no deadline, bot clients left connected)
+- after: starts refused, sends in flight drained for up to
+  --drain-timeout, every bot stopped and disconnected at once
+
+Reports the shutdown time, what became of the sends in flight, connections
+left open, message_logs rows shipped (or left in the spool) of those logged,
+and whether the saved cycle positions cover every posted group. Both are
+run again without stuck sends, and the new shutdown for a quarter and half
+of --bots too, to show its time doesn't grow with the number of bots.
+
+    python -m benchmarks.bench_shutdown --bots 200 --stuck 2
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-shutdown-")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+GROUPS = list(range(1, 11))
+
+
+def install(main, fake_telethon, args, stuck):
+    transport = fake_telethon.FakeTransport(
+        connect_latency=0.05, rpc_latency=0.005, send_latency=args.send_latency,
+        disconnect_latency=args.disconnect_latency,
+    )
+    fake_telethon.install(main, transport)
+
+    class Client(fake_telethon.FakeTelegramClient):
+        async def send_message(self, entity, message):
+            if self.session.string in stuck:
+                await asyncio.sleep(args.stuck_latency)
+            await super().send_message(entity, message)
+
+    main.TelegramClient = Client
+    return transport
+
+
+def register(main, count):
+    for bot_id in main.registry.bot_ids():
+        main.registry.remove_bot(bot_id)
+    for i in range(count):
+        main.registry.save_bot(f"bot-{i}", main.StartBot(
+            bot_id=f"bot-{i}", api_id=1, api_hash="hash", phone_number=f"+48{i:09d}",
+            session_string=f"session-{i}", group_ids=GROUPS, messages_per_minute=600,
+            max_concurrent_sends=1,
+        ).dict(), True)
+
+
+async def previous_shutdown():
+    """The lifespan's shutdown as it was"""
+    import main
+    await main.supervisor.stop()
+    await main.checkpoint_registry()
+    await main.timeseries.flush()
+    await main.loop_lag_probe.stop()
+    await main.pending_auth.stop()
+    await main.stats_hub.stop()
+    await main.client_pool.stop()
+    await main.group_stats.stop()
+    await main.supabase_writer.stop()
+
+
+async def run(main, transport, count):
+    async with main.lifespan(main.app):
+        while len(main.running_bots) < count or not all(
+            b.engine.in_flight for b in main.running_bots.values()
+        ):
+            await asyncio.sleep(0.01)
+        in_flight = sum(len(b.engine.in_flight) for b in main.running_bots.values())
+        posted_before = sum(len(s) for s in transport.sent.values())
+        started = time.perf_counter()
+    elapsed = time.perf_counter() - started
+    completed = sum(len(s) for s in transport.sent.values()) - posted_before
+    return elapsed, in_flight, completed
+
+
+def measure(main, fake_telethon, stub, args, shutdowns, mode, count, stuck):
+    from lifecycle import BotLifecycle
+    from spool import Spool
+
+    stuck = {f"session-{i}" for i in range(min(stuck, count))}
+    transport = install(main, fake_telethon, args, stuck)
+    register(main, count)
+    stub.reset()
+    main.running_bots.clear()
+    main.lifecycle = BotLifecycle()
+    main.supabase_writer.spool = Spool(tempfile.mkdtemp(prefix="spool-", dir=os.environ["STATE_DIR"]))
+    main.shutdown = shutdowns[mode]
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed, in_flight, completed = asyncio.run(run(main, transport, count))
+
+    posted = sum(len(s) for s in transport.sent.values())
+    shipped = sum(1 for row in stub.rows("message_logs") if row["status"] == "sent")
+    saved = {entry["config"]["session_string"]: entry["positions"] for entry in main.registry.load_bots()}
+    unsaved = sum(
+        1 for session, sends in transport.sent.items() for group_id, _ in sends if group_id not in saved[session]
+    )
+    spooled = main.supabase_writer.spool.depth
+    print(f"{mode:>6} {count:>4} bots, {len(stuck)} stuck: shut down in {elapsed:5.2f}s; in flight {in_flight}: "
+          f"{completed} finished, {in_flight - completed} cut off; "
+          f"{transport.live_connections} connections left open; "
+          f"rows shipped {shipped}/{posted} ({spooled} left in spool); "
+          f"posted groups without a saved position: {unsaved}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--stuck", type=int, default=2, help="bots whose sends hang")
+    parser.add_argument("--send-latency", type=float, default=0.5)
+    parser.add_argument("--stuck-latency", type=float, default=30.0)
+    parser.add_argument("--disconnect-latency", type=float, default=0.02)
+    parser.add_argument("--drain-timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    from benchmarks.stub_postgrest import StubPostgREST
+    with StubPostgREST() as stub:
+        os.environ["SUPABASE_URL"] = stub.url
+        os.environ["SUPABASE_KEY"] = "bench-key"
+        import main
+        from benchmarks import fake_telethon
+        shutdowns = {"before": previous_shutdown, "after": main.shutdown}
+        main.SHUTDOWN_DRAIN_TIMEOUT = args.drain_timeout
+        main.supabase_writer.flush_interval = 0.2
+
+        for stuck in sorted({args.stuck, 0}, reverse=True):
+            measure(main, fake_telethon, stub, args, shutdowns, "before", args.bots, stuck)
+            measure(main, fake_telethon, stub, args, shutdowns, "after", args.bots, stuck)
+        for count in sorted({max(1, args.bots // 4), max(1, args.bots // 2)}):
+            measure(main, fake_telethon, stub, args, shutdowns, "after", count, 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,186 @@
+"""Load test: dashboard polling vs. the pushed stats stream.
+
+Starts the backend in a child process with a fake Telegram transport and
+N running bots, then simulates V dashboard viewers watching every bot:
+
+- polling: each viewer GETs /bot/status and /bot/stats for every bot every
+  --poll-interval seconds (what the dashboard does today)
+- push: each viewer holds one /bot/stats/stream connection for all bots
+
+Reports request rate, server CPU (from the child's process time, minus the
+idle baseline with the same bots running) and the push traffic.
+
+    python -m benchmarks.bench_stats_push --bots 200 --viewers 10 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+
+def serve(port: int):
+    os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-stats-push-")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import uvicorn
+
+    import main
+    from benchmarks import fake_telethon
+
+    fake_telethon.install(main, fake_telethon.FakeTransport(connect_latency=0.01, send_latency=0.05))
+
+    @main.app.get("/bench/cpu")
+    async def cpu():
+        return {"cpu": time.process_time()}
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="error")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def server_cpu(http: httpx.AsyncClient) -> float:
+    return (await http.get("/bench/cpu")).json()["cpu"]
+
+
+async def start_bots(http: httpx.AsyncClient, count: int):
+    semaphore = asyncio.Semaphore(20)
+
+    async def start(i):
+        async with semaphore:
+            response = await http.post("/api/telegram/bot/start", json={
+                "bot_id": f"bot-{i}",
+                "api_id": 1,
+                "api_hash": "hash",
+                "phone_number": f"+48{i:09d}",
+                "session_string": f"session-{i}",
+                "group_ids": list(range(1, 11)),
+                "min_delay": 1,
+                "max_delay": 3,
+                "auto_reply_enabled": False,
+            })
+            response.raise_for_status()
+
+    await asyncio.gather(*(start(i) for i in range(count)))
+
+
+async def measure(http, seconds, workload):
+    """Server CPU seconds per wall second while `workload(stop)` runs"""
+    stop = asyncio.Event()
+    cpu_before = await server_cpu(http)
+    started = time.perf_counter()
+    task = asyncio.create_task(workload(stop))
+    await asyncio.sleep(seconds)
+    stop.set()
+    result = await task
+    elapsed = time.perf_counter() - started
+    return (await server_cpu(http) - cpu_before) / elapsed, elapsed, result
+
+
+async def idle(stop):
+    await stop.wait()
+
+
+def polling(http, bot_ids, viewers, interval):
+    async def run(stop):
+        requests = 0
+
+        async def viewer():
+            nonlocal requests
+            loop = asyncio.get_running_loop()
+            while not stop.is_set():
+                cycle_start = loop.time()
+                for bot_id in bot_ids:
+                    await http.get(f"/api/telegram/bot/status/{bot_id}")
+                    await http.get(f"/api/telegram/bot/stats/{bot_id}")
+                    requests += 2
+                await asyncio.sleep(max(0.0, interval - (loop.time() - cycle_start)))
+
+        tasks = [asyncio.create_task(viewer()) for _ in range(viewers)]
+        await stop.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return {"requests": requests, "events": 0, "bytes": 0}
+    return run
+
+
+def push(http, bot_ids, viewers):
+    async def run(stop):
+        totals = {"requests": 0, "events": 0, "bytes": 0}
+
+        async def viewer():
+            totals["requests"] += 1
+            async with http.stream("GET", "/api/telegram/bot/stats/stream",
+                                   params={"bot_ids": ",".join(bot_ids)}) as response:
+                async for line in response.aiter_lines():
+                    totals["bytes"] += len(line) + 1
+                    if line.startswith("data:"):
+                        totals["events"] += 1
+
+        tasks = [asyncio.create_task(viewer()) for _ in range(viewers)]
+        await stop.wait()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return totals
+    return run
+
+
+async def run(args, base_url):
+    limits = httpx.Limits(max_connections=args.viewers * 2 + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as http:
+        for _ in range(200):
+            try:
+                await http.get("/health")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        await start_bots(http, args.bots)
+        bot_ids = [f"bot-{i}" for i in range(args.bots)]
+        await asyncio.sleep(2)
+
+        idle_cpu, _, _ = await measure(http, args.seconds, idle)
+        print(f"idle ({args.bots} bots sending): server CPU {idle_cpu * 100:.1f}%")
+        for label, workload in (
+            (f"polling every {args.poll_interval:g}s", polling(http, bot_ids, args.viewers, args.poll_interval)),
+            ("push stream", push(http, bot_ids, args.viewers)),
+        ):
+            cpu, elapsed, result = await measure(http, args.seconds, workload)
+            print(f"{label:>22}: {result['requests'] / elapsed:8,.1f} req/s, server CPU {cpu * 100:5.1f}% "
+                  f"(+{max(0.0, cpu - idle_cpu) * 100:.1f}% over idle), "
+                  f"{result['events'] / elapsed:,.1f} events/s, {result['bytes'] / elapsed / 1024:,.1f} KiB/s pushed")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--viewers", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="dashboard polling interval (s)")
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_stats_push", "--serve", str(port)])
+    try:
+        asyncio.run(run(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,229 @@
+"""Benchmark: Supabase writes through an outage, in-memory queue vs on-disk spool.
+
+Against a local stub PostgREST:
+
+- outage: --bots send loops log a row every 1/--rate seconds while the stub
+  is up for --up seconds, down (503) for --outage seconds, then up again.
+  Reports what logging a row costs the send loop in each phase, the loop
+  lag, the spool depth and lag at the end of the outage, how long the
+  backlog takes to drain, and whether every row arrived exactly once.
+- restart: rows logged while the stub is down, then the writer is stopped
+  and a new one started after the stub is back (a deploy during an outage).
+- scale-down: two workers log rows while the stub is down, then one worker
+  starts alone and must send the rows of both slots.
+- replay: rows shipped but never acked (as if the process died right after
+  each insert) are shipped again by the next writer; the inserts must be
+  idempotent.
+
+Exits with status 1 if, with the spool, a row is missing or stored twice
+in any of them (the in-memory queue is expected to lose rows).
+
+    python -m benchmarks.bench_supabase_spool --bots 20 --rate 20 --outage 10
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import fmt_ms, percentile
+from benchmarks.stub_postgrest import StubPostgREST
+from spool import Spool
+from supabase_writer import SupabaseWriter
+
+
+def make_writer(stub, directory):
+    spool = Spool(directory, segment_bytes=256 * 1024) if directory else None
+    return SupabaseWriter(stub.url, "bench-key", flush_interval=0.2, max_retry_delay=2.0, spool=spool)
+
+
+def row(bot, i):
+    return {"bot_id": f"bot-{bot}", "group_id": str(i), "message_text": "Hello!", "status": "sent"}
+
+
+def arrived(stub):
+    rows = stub.rows("message_logs")
+    return len(rows), len({(r["bot_id"], r["group_id"]) for r in rows})
+
+
+async def send_loops(writer, args, seconds, phase, latencies, counter):
+    async def bot(b):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while loop.time() < deadline:
+            await asyncio.sleep(1 / args.rate)  # stands in for client.send_message
+            started = time.perf_counter()
+            writer.enqueue("message_logs", row(b, counter[b]))
+            latencies[phase].append(time.perf_counter() - started)
+            counter[b] += 1
+
+    await asyncio.gather(*(bot(b) for b in range(args.bots)))
+
+
+async def lag_probe(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + 0.01
+        await asyncio.sleep(0.01)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def outage(stub, directory, args):
+    writer = make_writer(stub, directory)
+    await writer.start()
+    latencies = {"up": [], "down": [], "recovered": []}
+    counter = [0] * args.bots
+    lags, stop = [], asyncio.Event()
+    probe = asyncio.create_task(lag_probe(lags, stop))
+
+    await send_loops(writer, args, args.up, "up", latencies, counter)
+    stub.down = True
+    await send_loops(writer, args, args.outage, "down", latencies, counter)
+    at_end = writer.stats()
+    stub.down = False
+    recovered = time.perf_counter()
+    backlog = sum(counter) - at_end["dropped"]
+    drained = []
+
+    async def watch():
+        while arrived(stub)[1] < backlog and time.perf_counter() - recovered < 60:
+            await asyncio.sleep(0.05)
+        drained.append(time.perf_counter() - recovered)
+
+    watcher = asyncio.create_task(watch())
+    await send_loops(writer, args, args.up, "recovered", latencies, counter)
+    await watcher
+    while writer.pending and time.perf_counter() - recovered < 60:
+        await asyncio.sleep(0.05)
+    stop.set()
+    await probe
+    await writer.stop()
+
+    label = "spool" if directory else "memory"
+    total = sum(counter)
+    rows, unique = arrived(stub)
+    print(f"{label:>6}: " + ", ".join(
+        f"{phase} p50 {fmt_ms(percentile(l, 50))} p99 {fmt_ms(percentile(l, 99))}" for phase, l in latencies.items()
+    ) + f" per logged row; loop lag p99 {fmt_ms(percentile(lags, 99))}")
+    spool = at_end["spool"]
+    state = f"spool {spool['rows']} rows, {spool['bytes'] / 1024:.0f} KiB, lag {spool['lag_seconds']:.1f}s" \
+        if spool else f"queue {at_end['pending']} rows, {at_end['dropped']} dropped"
+    print(f"        end of outage: {state}; outage backlog in {drained[0]:.1f}s after recovery; "
+          f"{unique}/{total} rows arrived, {rows - unique} duplicates")
+    if directory and (unique, rows) != (total, total):
+        return f"outage: {unique}/{total} rows arrived, {rows - unique} duplicates"
+
+
+async def restart(stub, directory, args):
+    writer = make_writer(stub, directory)
+    await writer.start()
+    stub.down = True
+    count = args.bots * 50
+    for i in range(count):
+        writer.enqueue("message_logs", row(i % args.bots, i))
+    await asyncio.sleep(0.5)
+    await writer.stop()
+    stub.down = False
+
+    writer = make_writer(stub, directory)
+    await writer.start()
+    deadline = time.perf_counter() + 10
+    while arrived(stub)[1] < count and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await writer.stop()
+    rows, unique = arrived(stub)
+    label = "spool" if directory else "memory"
+    print(f"{label:>6}: restart during an outage: {unique}/{count} rows arrived after it, {rows - unique} duplicates")
+    if directory and (unique, rows) != (count, count):
+        return f"restart: {unique}/{count} rows arrived, {rows - unique} duplicates"
+
+
+async def scale_down(stub, directory, args):
+    writers = [make_writer(stub, directory) for _ in range(2)]
+    for writer in writers:
+        await writer.start()
+    slots = sorted(writer.spool.stats()["slot"] for writer in writers)
+    stub.down = True
+    count = args.bots * 50
+    for i in range(count):
+        writers[i % 2].enqueue("message_logs", row(i % args.bots, i))
+    await asyncio.sleep(0.5)
+    for writer in writers:
+        await writer.stop()
+    stub.down = False
+
+    writer = make_writer(stub, directory)
+    await writer.start()
+    deadline = time.perf_counter() + 10
+    while arrived(stub)[1] < count and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await writer.stop()
+    rows, unique = arrived(stub)
+    print(f" spool: one worker after two (slots {', '.join(slots)}): {unique}/{count} rows arrived, "
+          f"{rows - unique} duplicates")
+    if (unique, rows) != (count, count):
+        return f"scale-down: {unique}/{count} rows arrived, {rows - unique} duplicates"
+
+
+async def replay(stub, directory, args):
+    count = args.bots * 50
+    writer = make_writer(stub, directory)
+    await writer.start()
+
+    async def lost_ack(position):
+        pass
+
+    writer.spool.ack = lost_ack
+    for i in range(count):
+        writer.enqueue("message_logs", row(i % args.bots, i))
+    while arrived(stub)[1] < count:
+        await asyncio.sleep(0.05)
+    await writer.stop()
+
+    writer = make_writer(stub, directory)
+    await writer.start()
+    replayed = writer.pending
+    while writer.pending:
+        await asyncio.sleep(0.05)
+    await writer.stop()
+    rows, unique = arrived(stub)
+    print(f" spool: replay of {replayed} shipped but unacked rows: {rows} rows stored for {count} logged "
+          f"({stub.duplicates} duplicate inserts ignored)")
+    if (unique, rows) != (count, count):
+        return f"replay: {rows} rows stored for {count} logged"
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=20, help="rows per second per bot")
+    parser.add_argument("--up", type=float, default=3.0, help="seconds up before and after the outage")
+    parser.add_argument("--outage", type=float, default=10.0)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-spool-")
+    failures = []
+    with StubPostgREST() as stub:
+        for directory in (None, os.path.join(root, "outage")):
+            stub.reset()
+            failures.append(asyncio.run(outage(stub, directory, args)))
+        for directory in (None, os.path.join(root, "restart")):
+            stub.reset()
+            failures.append(asyncio.run(restart(stub, directory, args)))
+        stub.reset()
+        failures.append(asyncio.run(scale_down(stub, os.path.join(root, "scale-down"), args)))
+        stub.reset()
+        failures.append(asyncio.run(replay(stub, os.path.join(root, "replay"), args)))
+    shutil.rmtree(root)
+
+    failures = [failure for failure in failures if failure]
+    for failure in failures:
+        print(f"FAIL: spool {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,170 @@
+"""Benchmark: per-row httpx client vs. the pooled, batched SupabaseWriter.
+
+Simulates `bot_message_loop` iterations (send_message + log row) against a
+local stub PostgREST and reports rows/sec and the latency each iteration
+spends in the logging call. Then logs bot_logs rows of which some break the
+table's CHECK constraint, with and without the spool, and checks that only
+those are dropped (the rest of their batches are inserted). Last, the stub
+answers 401 (an expired key) for a while: spooled rows must all arrive once
+it accepts them again, without splitting batches meanwhile.
+
+    python -m benchmarks.bench_supabase_writer --bots 20 --iterations 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import fmt_ms, percentile
+from benchmarks.stub_postgrest import StubPostgREST
+from spool import Spool
+from supabase_writer import SupabaseWriter
+
+
+async def legacy_log_to_supabase(url: str, key: str, table: str, data: dict):
+    """The pre-batching implementation: one AsyncClient (and connection) per row"""
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{url}/rest/v1/{table}",
+                json=data,
+                headers={
+                    "apikey": key,
+                    "Authorization": f"Bearer {key}",
+                    "Content-Type": "application/json",
+                    "Prefer": "return=minimal"
+                },
+                timeout=10.0
+            )
+            if response.status_code not in [200, 201, 204]:
+                print(f"[SUPABASE] Log failed: {response.status_code}")
+    except Exception as e:
+        print(f"[SUPABASE] Log error: {e}")
+
+
+async def run_bots(log, bots: int, iterations: int):
+    latencies = []
+
+    async def bot(bot_id: int):
+        for i in range(iterations):
+            await asyncio.sleep(0)  # stands in for client.send_message
+            started = time.perf_counter()
+            await log("message_logs", {
+                "bot_id": f"bot-{bot_id}",
+                "group_id": str(i),
+                "message_text": "Hello!",
+                "status": "sent",
+            })
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(bot(b) for b in range(bots)))
+    return latencies
+
+
+async def bench_legacy(stub: StubPostgREST, bots: int, iterations: int):
+    async def log(table, data):
+        await legacy_log_to_supabase(stub.url, "bench-key", table, data)
+
+    started = time.perf_counter()
+    latencies = await run_bots(log, bots, iterations)
+    return time.perf_counter() - started, latencies
+
+
+async def bench_batched(stub: StubPostgREST, bots: int, iterations: int):
+    import main
+
+    await main.supabase_writer.start()
+    started = time.perf_counter()
+    latencies = await run_bots(main.log_to_supabase, bots, iterations)
+    # Rows are only durable once the flusher has shipped them
+    await main.supabase_writer.stop()
+    return time.perf_counter() - started, latencies
+
+
+async def bench_rejected(stub: StubPostgREST, spool_dir, rows: int, bad_every: int):
+    """Valid rows mixed with rows the CHECK constraint refuses; (arrived, dropped)"""
+    spool = Spool(spool_dir) if spool_dir else None
+    writer = SupabaseWriter(stub.url, "bench-key", flush_interval=0.05, spool=spool)
+    await writer.start()
+    for i in range(rows):
+        writer.enqueue("bot_logs", {
+            "bot_id": f"bot-{i % 10}",
+            "log_type": "bogus" if i % bad_every == 0 else "info",
+            "message": f"row {i}",
+        })
+    await writer.stop()
+    return len(stub.rows("bot_logs")), writer.rows_dropped
+
+
+async def bench_unauthorized(stub: StubPostgREST, spool_dir, rows: int, seconds: float = 1.0):
+    """Rows logged while every request gets a 401; (arrived, dropped, requests during the 401s)"""
+    writer = SupabaseWriter(stub.url, "bench-key", flush_interval=0.05, retry_backoff=0.05, spool=Spool(spool_dir))
+    await writer.start()
+    stub.down, stub.down_status = True, 401
+    for i in range(rows):
+        writer.enqueue("message_logs", {"bot_id": f"bot-{i % 10}", "group_id": str(i), "status": "sent"})
+    await asyncio.sleep(seconds)
+    requests = stub.total_requests()
+    stub.down, stub.down_status = False, 503
+    deadline = time.perf_counter() + 10
+    while writer.pending and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await writer.stop()
+    return len(stub.rows("message_logs")), writer.rows_dropped, requests
+
+
+def report(name, elapsed, latencies, rows, requests):
+    print(
+        f"{name:>8}: {rows} rows in {elapsed:.2f}s -> {rows / elapsed:,.0f} rows/s | "
+        f"added latency p50={fmt_ms(percentile(latencies, 50))} "
+        f"p99={fmt_ms(percentile(latencies, 99))} | HTTP requests={requests}"
+    )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.002, help="stub response latency (s)")
+    parser.add_argument("--bad-every", type=int, default=25, help="every Nth bot_logs row breaks the CHECK")
+    args = parser.parse_args()
+
+    ok = True
+    with StubPostgREST(latency=args.latency) as stub:
+        os.environ["SUPABASE_URL"] = stub.url
+        os.environ["SUPABASE_KEY"] = "bench-key"
+        os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-supabase-writer-")
+
+        elapsed, latencies = asyncio.run(bench_legacy(stub, args.bots, args.iterations))
+        report("before", elapsed, latencies, len(stub.rows("message_logs")), stub.total_requests())
+
+        stub.reset()
+        elapsed, latencies = asyncio.run(bench_batched(stub, args.bots, args.iterations))
+        report("after", elapsed, latencies, len(stub.rows("message_logs")), stub.total_requests())
+
+        rows = args.bots * args.iterations
+        bad = len(range(0, rows, args.bad_every))
+        for label, spool_dir in (("memory", None), ("spool", os.path.join(os.environ["STATE_DIR"], "rejected"))):
+            stub.reset()
+            arrived, dropped = asyncio.run(bench_rejected(stub, spool_dir, rows, args.bad_every))
+            print(f"{label:>8}: {rows} bot_logs rows, {bad} breaking the CHECK: {arrived} inserted, "
+                  f"{dropped} dropped ({stub.rejected} requests rejected)")
+            ok = ok and arrived == rows - bad and dropped == bad
+
+        stub.reset()
+        arrived, dropped, requests = asyncio.run(
+            bench_unauthorized(stub, os.path.join(os.environ["STATE_DIR"], "unauthorized"), rows)
+        )
+        print(f"   spool: {rows} rows logged during 401s: {arrived} inserted once accepted, {dropped} dropped, "
+              f"{requests} requests during the 401s")
+        ok = ok and arrived == rows and not dropped and requests < rows // 10
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
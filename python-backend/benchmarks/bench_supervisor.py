@@ -0,0 +1,149 @@
+"""Benchmark: supervised bot tasks under faults, and the cost of supervision.
+
+Against a fake transport:
+
+- loop fault: a bot's send engine raises once. Unsupervised (restart off,
+  like the old bare create_task) the bot stays listed as running and never
+  sends again; supervised, the loop is restarted after the backoff.
+- dropped connection: the bot's client disconnects; the client task is
+  restarted and reconnects.
+- stop: --bots bots are started and stopped; every task must be gone.
+- overhead: busy-time and step accounting per await, vs a bare task.
+
+    python -m benchmarks.bench_supervisor --bots 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="bench-supervisor-")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("TASK_RESTART_DELAY", "0.2")
+
+import main  # noqa: E402
+from benchmarks import fake_telethon  # noqa: E402
+from supervisor import TaskSupervisor  # noqa: E402
+
+
+def config(bot_id, groups=50):
+    return main.StartBot(
+        bot_id=bot_id, api_id=1, api_hash="hash", phone_number="+48000000000",
+        session_string=f"session-{bot_id}", group_ids=list(range(1_000_000, 1_000_000 + groups)),
+        messages_per_minute=6000, max_concurrent_sends=3,
+    )
+
+
+def sent(transport, bot_id):
+    return len(transport.sent[f"session-{bot_id}"])
+
+
+async def loop_fault(transport, restart):
+    bot_id = f"fault-{restart}"
+    await main.launch_bot(config(bot_id))
+    if not restart:
+        # The old behaviour: a bare task that ends on the first exception
+        await main.supervisor.cancel(bot_id)
+        main.supervisor.spawn(bot_id, "message_loop", lambda: main.bot_message_loop(bot_id))
+    await asyncio.sleep(0.3)
+
+    engine = main.running_bots[bot_id].engine
+    get_config = engine.get_config
+    failures = main.supervisor.failures
+
+    def broken():
+        # Sends finishing also read the config; keep failing until the loop did
+        if main.supervisor.failures == failures:
+            raise RuntimeError("injected fault")
+        return get_config()
+
+    engine.get_config = broken
+    before = sent(transport, bot_id)
+    await asyncio.sleep(1.5)
+    after = sent(transport, bot_id) - before
+    task = main.supervisor.tasks(bot_id)
+    loop = next(t for t in task if t["name"] == "message_loop")
+    label = "supervised" if restart else "unsupervised"
+    print(f"loop fault, {label:>12}: {after:3} sends in the 1.5s after it, loop {loop['state']}, "
+          f"{loop['restarts']} restarts, last error {loop['last_error']!r}; "
+          f"listed running: {bot_id in main.running_bots}")
+    await main.stop_bot(main.StopBot(bot_id=bot_id), None)
+
+
+async def dropped_connection(transport):
+    bot_id = "dropped"
+    await main.launch_bot(config(bot_id))
+    await asyncio.sleep(0.2)
+    client = main.running_bots[bot_id].client
+    connects = transport.calls["connect"]
+    dropped = time.perf_counter()
+    await client.disconnect()
+    while not client.is_connected():
+        await asyncio.sleep(0.005)
+    tasks = {t["name"]: t for t in main.supervisor.tasks(bot_id)}
+    print(f"dropped connection: reconnected after {(time.perf_counter() - dropped) * 1000:.0f}ms "
+          f"({transport.calls['connect'] - connects} connect), client task {tasks['client']['state']}, "
+          f"{tasks['client']['restarts']} restart")
+    await main.stop_bot(main.StopBot(bot_id=bot_id), None)
+
+
+async def start_stop(bots):
+    baseline = len(asyncio.all_tasks())
+    started = time.perf_counter()
+    await asyncio.gather(*(main.launch_bot(config(f"bot-{i}", groups=5)) for i in range(bots)))
+    running = main.supervisor.stats()["tasks"]
+    tasks_running = len(asyncio.all_tasks()) - baseline
+    await asyncio.sleep(0.5)
+    sample = main.supervisor.tasks("bot-0")
+    stop_started = time.perf_counter()
+    await asyncio.gather(*(main.stop_bot(main.StopBot(bot_id=f"bot-{i}"), None) for i in range(bots)))
+    stop_time = time.perf_counter() - stop_started
+    print(f"{bots} bots: {running} supervised tasks ({tasks_running} asyncio tasks) after start in "
+          f"{time.perf_counter() - started - stop_time - 0.5:.2f}s; stopped in {stop_time:.2f}s, "
+          f"{main.supervisor.stats()['tasks']} supervised and {len(asyncio.all_tasks()) - baseline} asyncio tasks left")
+    loop = next(t for t in sample if t["name"] == "message_loop")
+    print(f"  message loop of bot-0 after 0.5s: {loop['steps']} steps, busy {loop['busy_time'] * 1000:.1f}ms, "
+          f"wall {loop['wall_time']:.2f}s, idle for {loop['idle_for'] * 1000:.0f}ms")
+
+
+async def overhead(steps):
+    async def work():
+        for _ in range(steps):
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.create_task(work())
+    bare = time.perf_counter() - started
+
+    supervisor = TaskSupervisor()
+    started = time.perf_counter()
+    await supervisor.spawn("bench", "work", work).task
+    supervised = time.perf_counter() - started
+    print(f"overhead: {steps:,} awaits bare {bare / steps * 1e6:.2f}us, supervised "
+          f"{supervised / steps * 1e6:.2f}us per await (+{(supervised - bare) / steps * 1e9:.0f}ns)")
+
+
+async def run(args):
+    transport = fake_telethon.install(main, fake_telethon.FakeTransport(
+        connect_latency=0.05, rpc_latency=0.01, send_latency=0.01,
+    ))
+    await loop_fault(transport, restart=False)
+    await loop_fault(transport, restart=True)
+    await dropped_connection(transport)
+    await start_stop(args.bots)
+    await overhead(args.steps)
+    await main.supervisor.stop()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=200_000)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+    main.log_setup.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,189 @@
+"""Benchmark: time-bucketed stats rollups vs aggregating raw log rows.
+
+Replays --days of simulated traffic for --bots bots over --groups groups
+each (a send every --interval seconds per bot, some failures and
+auto-replies) into a TimeSeriesStore on a virtual clock, flushing every
+virtual --flush-every seconds, and the same events as raw rows into an
+indexed SQLite table shaped like Supabase `message_logs`. Reports the cost
+of counting an event and of a flush, query latency for typical dashboard
+ranges from memory (running bots) and from disk (stopped bots), the same
+charts computed by GROUP BY over the raw rows, memory and disk size, and
+whether every total survives reopening the store (a restart).
+
+    python -m benchmarks.bench_timeseries --bots 100 --groups 20 --days 30
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.common import fmt_ms, percentile
+from timeseries import TimeSeriesStore
+
+START = 1_760_000_000 - 1_760_000_000 % 86400
+
+
+def raw_table(path):
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("""
+        CREATE TABLE message_logs (
+            bot_id TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            sent_at REAL NOT NULL
+        )
+    """)
+    db.execute("CREATE INDEX message_logs_bot_time ON message_logs (bot_id, sent_at)")
+    return db
+
+
+async def replay(store, raw, args, now):
+    """Feed the simulated traffic; returns (events, seconds counting, flush times)"""
+    events = 0
+    counting = 0.0
+    flushes = []
+    pending = []
+    next_flush = START + args.flush_every
+    end = START + args.days * 86400
+    t = START
+    tick = 0
+    bot_ids = [f"bot-{b}" for b in range(args.bots)]
+    while t < end:
+        now[0] = t
+        tick_events = []
+        for b, bot_id in enumerate(bot_ids):
+            group_id = 1_000_000 + (tick + b) % args.groups
+            failed = (tick + b) % 20 == 0
+            tick_events.append((bot_id, "messages_failed" if failed else "messages_sent", group_id))
+            pending.append((bot_id, group_id, "failed" if failed else "sent", t))
+            if (tick + b) % 3 == 0:
+                tick_events.append((bot_id, "auto_replies", None))
+        started = time.perf_counter()
+        for bot_id, field, group_id in tick_events:
+            store.add(bot_id, field, group_id)
+        counting += time.perf_counter() - started
+        events += len(tick_events)
+        t += args.interval
+        tick += 1
+        if t >= next_flush:
+            now[0] = next_flush
+            started = time.perf_counter()
+            await store.flush()
+            flushes.append(time.perf_counter() - started)
+            next_flush += args.flush_every
+            raw.execute("BEGIN")
+            raw.executemany("INSERT INTO message_logs VALUES (?, ?, ?, ?)", pending)
+            raw.execute("COMMIT")
+            pending = []
+    now[0] = end
+    if pending:
+        raw.executemany("INSERT INTO message_logs VALUES (?, ?, ?, ?)", pending)
+    await store.flush()
+    return events, counting, flushes
+
+
+def ranges(now):
+    return [
+        ("last hour, minutes", now - 3600, None),
+        ("last 24h, minutes", now - 86400, None),
+        ("last 7d, hours", now - 7 * 86400, None),
+        ("last 30d, hours", now - 30 * 86400, "hour"),
+        ("last 30d, days", now - 30 * 86400, "day"),
+    ]
+
+
+async def time_queries(store, args, now, label):
+    print(f"{label}:")
+    group_id = 1_000_000
+    for name, start, resolution in ranges(now) + [("group, last 7d, hours", now - 7 * 86400, None)]:
+        latencies = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            result = await store.query(f"bot-{i % args.bots}", start, now, resolution,
+                                       group_id if name.startswith("group") else None)
+            latencies.append(time.perf_counter() - started)
+        print(f"  {name:>22}: {len(result['timestamps']):5} {result['resolution']} buckets, "
+              f"p50 {fmt_ms(percentile(latencies, 50))}, p99 {fmt_ms(percentile(latencies, 99))}")
+
+
+def raw_queries(raw, args, now):
+    print("GROUP BY over raw rows (what a dashboard query does today):")
+    for name, start, step in (
+        ("last 24h, minutes", now - 86400, 60),
+        ("last 7d, hours", now - 7 * 86400, 3600),
+        ("last 30d, days", now - 30 * 86400, 86400),
+    ):
+        latencies = []
+        for i in range(min(args.queries, 50)):
+            started = time.perf_counter()
+            raw.execute(
+                "SELECT CAST(sent_at / ? AS INTEGER) AS bucket, "
+                "SUM(status = 'sent'), SUM(status = 'failed') FROM message_logs "
+                "WHERE bot_id = ? AND sent_at >= ? AND sent_at <= ? GROUP BY bucket",
+                (step, f"bot-{i % args.bots}", start, now),
+            ).fetchall()
+            latencies.append(time.perf_counter() - started)
+        print(f"  {name:>22}: p50 {fmt_ms(percentile(latencies, 50))}, p99 {fmt_ms(percentile(latencies, 99))}")
+
+
+async def run(args):
+    directory = tempfile.mkdtemp(prefix="bench-timeseries-")
+    path = os.path.join(directory, "timeseries.db")
+    now = [START]
+    store = TimeSeriesStore(path, clock=lambda: now[0])
+    raw = raw_table(os.path.join(directory, "raw.db"))
+
+    events, counting, flushes = await replay(store, raw, args, now)
+    stats = store.stats()
+    print(f"{events:,} events from {args.bots} bots over {args.days} days: "
+          f"{counting / events * 1e9:.0f}ns to count one; {len(flushes)} flushes, "
+          f"p50 {fmt_ms(percentile(flushes, 50))}, max {fmt_ms(max(flushes))}, "
+          f"{stats['rows_written'] / len(flushes):.0f} buckets each")
+    print(f"memory: {stats['bytes'] / stats['bots'] / 1024:.1f} KiB per bot incl. {args.groups} groups "
+          f"({stats['series']} series); disk: {os.path.getsize(path) / 1024 / 1024:.1f} MiB buckets, "
+          f"{os.path.getsize(os.path.join(directory, 'raw.db')) / 1024 / 1024:.1f} MiB raw rows")
+
+    end = now[0]
+    await time_queries(store, args, end, "running bots (memory)")
+    before = {}
+    for b in range(args.bots):
+        result = await store.query(f"bot-{b}", end - args.days * 86400, end, "day")
+        before[f"bot-{b}"] = result["totals"]
+        await store.flush(f"bot-{b}", evict=True)
+    await time_queries(store, args, end, "stopped bots (disk)")
+    raw_queries(raw, args, end)
+
+    # Restart: a new store over the same file
+    store.close()
+    reopened = TimeSeriesStore(path, clock=lambda: now[0])
+    started = time.perf_counter()
+    for b in range(args.bots):
+        await reopened.load(f"bot-{b}")
+    load_time = time.perf_counter() - started
+    same = True
+    for bot_id, totals in before.items():
+        result = await reopened.query(bot_id, end - args.days * 86400, end, "day")
+        same = same and result["totals"] == totals
+    print(f"restart: loaded {args.bots} bots in {load_time:.2f}s ({load_time / args.bots * 1000:.1f}ms each), "
+          f"totals identical: {same}")
+    reopened.close()
+    raw.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=300, help="seconds between sends of a bot")
+    parser.add_argument("--flush-every", type=int, default=3600, help="virtual seconds between flushes")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
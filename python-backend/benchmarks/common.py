@@ -0,0 +1,64 @@
+"""Small helpers shared by the benchmark scripts."""
+import socket
+import threading
+import time
+
+import uvicorn
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def fmt_ms(seconds):
+    return f"{seconds * 1000:.3f}ms"
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+class BackgroundServer:
+    """Serve an ASGI app with uvicorn on a background thread (random local port)"""
+
+    def __init__(self, app, lifespan="off"):
+        self.app = app
+        self.lifespan = lifespan
+        self.url = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+        config = uvicorn.Config(self.app, log_level="error", lifespan=self.lifespan)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [sock]}, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=30)
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
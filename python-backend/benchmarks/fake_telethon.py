@@ -0,0 +1,231 @@
+"""In-process stand-in for Telethon's TelegramClient.
+
+`install(main)` swaps `main.TelegramClient` / `main.StringSession` for fakes
+that talk to a shared FakeTransport instead of Telegram. The transport
+simulates handshake and RPC latency, counts every call and can fail sends
+with transient errors or FloodWaits. `FakeTelegramClient.receive` delivers
+an incoming message to the client's NewMessage handlers.
+"""
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from telethon import errors, events, utils
+from telethon.tl.types import Channel, Chat, ChatPhotoEmpty, InputPeerChannel, User
+
+
+def make_dialogs(count, seed=0):
+    """Synthetic dialogs, newest first: users, small groups, megagroups and broadcast channels"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    dialogs = []
+    for i in range(count):
+        date = now - timedelta(minutes=i * 7)
+        roll = rng.random()
+        if roll < 0.4:
+            entity = User(id=10_000 + i, access_hash=rng.getrandbits(63), first_name=f"User {i}")
+            title = entity.first_name
+        elif roll < 0.7:
+            entity = Chat(id=20_000 + i, title=f"Group {i}", photo=ChatPhotoEmpty(),
+                          participants_count=rng.randint(3, 200), date=date, version=1)
+            title = entity.title
+        else:
+            broadcast = roll >= 0.9
+            entity = Channel(id=1_000_000 + i, title=f"Channel {i}", photo=ChatPhotoEmpty(), date=date,
+                             access_hash=rng.getrandbits(63), broadcast=broadcast, megagroup=not broadcast,
+                             creator=rng.random() < 0.1, username=f"chan{i}" if rng.random() < 0.3 else None,
+                             participants_count=rng.randint(10, 50_000))
+            title = entity.title
+        dialogs.append(SimpleNamespace(id=entity.id, entity=entity, title=title, date=date, pinned=False))
+    return dialogs
+
+
+class FakeTransport:
+    def __init__(self, connect_latency=0.3, rpc_latency=0.05, send_latency=0.1, dialogs=None, send_cpu=0.0,
+                 disconnect_latency=0.0, send_error_rate=0.0, flood_wait_rate=0.0, flood_wait_seconds=30, seed=0):
+        self.connect_latency = connect_latency
+        # Closing the connection (Telethon awaits its sender and receiver loops)
+        self.disconnect_latency = disconnect_latency
+        self.rpc_latency = rpc_latency
+        self.send_latency = send_latency
+        # CPU burnt on the event loop per send (request serialization and encryption)
+        self.send_cpu = send_cpu
+        self.dialogs = dialogs if dialogs is not None else make_dialogs(50)
+        self.dialog_page_size = 100
+        self.calls = Counter()
+        self.sent = defaultdict(list)  # session -> [(entity, message)]
+        self.live_connections = 0
+        self.unauthorized = set()  # session strings that fail is_user_authorized
+        # Share of sends failing with a server error, and with a FloodWait of
+        # `flood_wait_seconds` (what Telethon raises above flood_sleep_threshold)
+        self.send_error_rate = send_error_rate
+        self.flood_wait_rate = flood_wait_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.rng = random.Random(seed)
+        self.errors = Counter()  # error name -> sends failed with it
+
+    async def rpc(self, name, latency=None):
+        self.calls[name] += 1
+        await asyncio.sleep(self.rpc_latency if latency is None else latency)
+
+
+    def fail_send(self):
+        roll = self.rng.random()
+        if roll < self.flood_wait_rate:
+            self.errors["FloodWaitError"] += 1
+            raise errors.FloodWaitError(request=None, capture=self.flood_wait_seconds)
+        if roll < self.flood_wait_rate + self.send_error_rate:
+            self.errors["ServerError"] += 1
+            raise errors.ServerError(request=None, message="INTERNAL", code=500)
+
+
+class FakeMessageEvent:
+    """An incoming message as NewMessage handlers see it; `respond` is a send"""
+
+    def __init__(self, client, sender_id, text="hi", is_private=True):
+        self.client = client
+        self.sender_id = sender_id
+        self.chat_id = sender_id
+        self.text = text
+        self.is_private = is_private
+        self.is_group = not is_private
+        self.is_channel = False
+        self.out = False
+        self.received = time.perf_counter()
+        self.responded = None
+
+    async def respond(self, message):
+        await self.client.transport.rpc("respond", self.client.transport.send_latency)
+        self.responded = time.perf_counter()
+
+
+class FakeStringSession:
+    def __init__(self, string=None):
+        self.string = string or ""
+
+    def save(self):
+        return self.string
+
+
+class FakeTelegramClient:
+    transport = FakeTransport()
+
+    def __init__(self, session, api_id, api_hash, **kwargs):
+        # Like Telethon's SQLiteSession, a path session creates `<path>.session`
+        # and keeps it open until the client disconnects
+        self._session_file = None
+        if not isinstance(session, FakeStringSession):
+            self._session_file = open(f"{session}.session", "a")
+            session = FakeStringSession(str(session))
+        self.session = session
+        # Ids Telethon could send to without resolving (its entity cache)
+        self.known_peers = set()
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.handlers = []
+        self._connected = False
+        self._disconnected = asyncio.Event()
+
+    def is_connected(self):
+        return self._connected
+
+    async def connect(self):
+        if self._connected:
+            return
+        await self.transport.rpc("connect", self.transport.connect_latency)
+        self._connected = True
+        self._disconnected.clear()
+        self.transport.live_connections += 1
+
+    async def disconnect(self):
+        if self._connected:
+            self._connected = False
+            if self.transport.disconnect_latency:
+                await asyncio.sleep(self.transport.disconnect_latency)
+            self.transport.live_connections -= 1
+            self.transport.calls["disconnect"] += 1
+        if self._session_file is not None:
+            self._session_file.close()
+            self._session_file = None
+        self._disconnected.set()
+
+    async def is_user_authorized(self):
+        await self.transport.rpc("is_user_authorized")
+        return self.session.string not in self.transport.unauthorized
+
+    async def send_code_request(self, phone):
+        await self.transport.rpc("send_code_request")
+        return SimpleNamespace(phone_code_hash=f"hash-{phone}")
+
+    async def sign_in(self, phone=None, code=None, *, password=None, phone_code_hash=None):
+        await self.transport.rpc("sign_in")
+        return SimpleNamespace(id=1)
+
+    async def get_me(self):
+        await self.transport.rpc("get_me")
+        return SimpleNamespace(id=abs(hash(self.session.string)) % 10**9, first_name="Fake", phone="+000")
+
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append((callback, event))
+
+    def remove_event_handler(self, callback, event=None):
+        self.handlers = [(c, e) for c, e in self.handlers if c != callback]
+
+    def on(self, event):
+        def decorator(callback):
+            self.add_event_handler(callback, event)
+            return callback
+        return decorator
+
+    async def run_until_disconnected(self):
+        await self._disconnected.wait()
+
+    async def get_input_entity(self, peer):
+        if isinstance(peer, int):
+            if peer not in self.known_peers:
+                # Telethon asks Telegram for ids missing from its cache
+                await self.transport.rpc("ResolvePeer")
+                self.known_peers.add(peer)
+            return InputPeerChannel(peer, peer * 7919)
+        return peer
+
+    async def send_message(self, entity, message):
+        if not self._connected:
+            raise ConnectionError("Cannot send requests while disconnected")
+        peer = await self.get_input_entity(entity)
+        if self.transport.send_cpu:
+            deadline = time.perf_counter() + self.transport.send_cpu
+            while time.perf_counter() < deadline:
+                pass
+        await self.transport.rpc("send_message", self.transport.send_latency)
+        self.transport.fail_send()
+        self.transport.sent[self.session.string].append((utils.get_peer_id(peer, add_mark=False), message))
+
+    async def receive(self, event):
+        """Deliver an incoming message to the NewMessage handlers, like Telethon's update loop"""
+        for callback, kind in self.handlers:
+            if isinstance(kind, events.NewMessage):
+                await callback(event)
+
+    async def iter_dialogs(self, limit=None):
+        if not self._connected:
+            raise ConnectionError("Cannot send requests while disconnected")
+        dialogs = self.transport.dialogs[:limit] if limit else self.transport.dialogs
+        page_size = self.transport.dialog_page_size
+        for start in range(0, len(dialogs), page_size):
+            await self.transport.rpc("GetDialogs")
+            for dialog in dialogs[start:start + page_size]:
+                self.known_peers.add(dialog.entity.id)
+                yield dialog
+
+
+def install(main_module, transport=None):
+    """Patch the backend module to use the fakes; returns the transport"""
+    transport = transport or FakeTransport()
+    FakeTelegramClient.transport = transport
+    main_module.TelegramClient = FakeTelegramClient
+    main_module.StringSession = FakeStringSession
+    return transport
@@ -0,0 +1,315 @@
+"""Load test: the real app over HTTP, against a fake Telegram and a stub PostgREST.
+
+Runs the app's lifespan and drives it through its HTTP endpoints (in
+process, over httpx's ASGI transport), fully offline:
+
+- starts --bots bots with --groups groups each through POST
+  /api/telegram/bot/start, --start-concurrency at a time
+- for --duration seconds the bots send --rate messages per minute each;
+  sends take --send-latency and the fake transport fails --send-errors of
+  them with a server error and --flood-waits with a FloodWait
+- meanwhile --dms incoming DMs per second (over all bots, from --senders
+  senders) reach the auto-reply handler, and --api-rate status/stats/health
+  and --fetch-rate /groups/fetch requests per second hit the API
+- stops every bot through POST /api/telegram/bot/stop, then the lifespan
+
+Reports sends per second, auto-reply latency (DM received to reply sent),
+API latency per endpoint, event-loop lag, RSS, and requests per external
+system (Telegram RPCs, PostgREST requests). `--json` writes the report for
+scripted runs, and `--compare` prints two reports side by side:
+
+    python -m benchmarks.loadtest --bots 200 --groups 50 --dms 50 --json after.json
+    python -m benchmarks.loadtest --compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+os.environ["STATE_DIR"] = tempfile.mkdtemp(prefix="loadtest-")
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+import httpx  # noqa: E402
+
+from benchmarks import fake_telethon  # noqa: E402
+from benchmarks.common import percentile  # noqa: E402
+from benchmarks.stub_postgrest import StubPostgREST  # noqa: E402
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def summary_ms(values) -> dict:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p95": round(percentile(values, 95) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "max": round(max(values, default=0.0) * 1000, 3),
+    }
+
+
+def start_body(i, args) -> dict:
+    return {
+        "bot_id": f"bot-{i}", "api_id": 1, "api_hash": "hash", "phone_number": f"+48{i:09d}",
+        "session_string": f"session-{i}", "group_ids": list(range(1_000_000, 1_000_000 + args.groups)),
+        "messages_per_minute": args.rate, "auto_reply_enabled": True,
+        "auto_reply_cooldown": args.reply_cooldown,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.api = defaultdict(list)  # endpoint -> latencies
+        self.status = Counter()  # "endpoint code" -> responses
+        self.replies = []  # DM received -> reply sent
+        self.dms = 0
+        self.lags = []
+        self.peak_rss = 0
+
+    async def request(self, http, endpoint, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await http.request(method, url, **kwargs)
+            code = response.status_code
+        except Exception as e:
+            response, code = None, type(e).__name__
+        self.api[endpoint].append(time.perf_counter() - started)
+        self.status[f"{endpoint} {code}"] += 1
+        return response
+
+
+async def probe(recorder, stop):
+    """Event-loop lag every 10ms, peak RSS every 0.5s"""
+    loop = asyncio.get_running_loop()
+    next_rss = 0.0
+    while not stop.is_set():
+        expected = loop.time() + 0.01
+        await asyncio.sleep(0.01)
+        now = loop.time()
+        recorder.lags.append(max(0.0, now - expected))
+        if now >= next_rss:
+            recorder.peak_rss = max(recorder.peak_rss, rss())
+            next_rss = now + 0.5
+
+
+async def arrivals(rate, seconds, rng, fire):
+    """Call `fire()` as a task at Poisson arrivals of `rate` per second"""
+    if rate <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + seconds
+    tasks = set()
+    while True:
+        await asyncio.sleep(rng.expovariate(rate))
+        if loop.time() >= deadline:
+            break
+        task = asyncio.create_task(fire())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def bounded(concurrency, calls):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(call):
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*(run(call) for call in calls))
+
+
+async def drive(main, transport, stub, args) -> dict:
+    rng = random.Random(args.seed)
+    recorder = Recorder()
+    bot_ids = [f"bot-{i}" for i in range(args.bots)]
+    report = {"rss_mb": {"before": round(rss() / 2**20, 1)}}
+
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=main.app), base_url="http://app", timeout=120
+        ) as http:
+            started = time.perf_counter()
+            await bounded(args.start_concurrency, [
+                lambda i=i: recorder.request(http, "start", "POST", "/api/telegram/bot/start", json=start_body(i, args))
+                for i in range(args.bots)
+            ])
+            report["start_seconds"] = round(time.perf_counter() - started, 3)
+            report["running_bots"] = len(main.running_bots)
+            report["rss_mb"]["running"] = round(rss() / 2**20, 1)
+
+            async def dm():
+                bot_data = main.running_bots.get(rng.choice(bot_ids))
+                if bot_data is None:
+                    return
+                event = fake_telethon.FakeMessageEvent(bot_data.client, 1_000 + rng.randrange(args.senders))
+                recorder.dms += 1
+                await bot_data.client.receive(event)
+                if event.responded is not None:
+                    recorder.replies.append(event.responded - event.received)
+
+            async def api():
+                bot_id = rng.choice(bot_ids)
+                endpoint, url = rng.choice((
+                    ("status", f"/api/telegram/bot/status/{bot_id}"),
+                    ("stats", f"/api/telegram/bot/stats/{bot_id}"),
+                    ("health", "/health"),
+                ))
+                await recorder.request(http, endpoint, "GET", url)
+
+            async def fetch():
+                body = start_body(rng.randrange(args.bots), args)
+                await recorder.request(http, "groups/fetch", "POST", "/api/telegram/groups/fetch", json={
+                    key: body[key] for key in ("bot_id", "api_id", "api_hash", "session_string")
+                } | {"limit": 100})
+
+            stop = asyncio.Event()
+            prober = asyncio.create_task(probe(recorder, stop))
+            posted = sum(len(s) for s in transport.sent.values())
+            failed = sum(transport.errors.values())
+            cpu = time.process_time()
+            started = time.perf_counter()
+            await asyncio.gather(
+                arrivals(args.dms, args.duration, rng, dm),
+                arrivals(args.api_rate, args.duration, rng, api),
+                arrivals(args.fetch_rate, args.duration, rng, fetch),
+                asyncio.sleep(args.duration),
+            )
+            elapsed = time.perf_counter() - started
+            report["cpu_percent"] = round((time.process_time() - cpu) / elapsed * 100, 1)
+            report["sends_per_second"] = round((sum(len(s) for s in transport.sent.values()) - posted) / elapsed, 2)
+            report["failed_sends_per_second"] = round((sum(transport.errors.values()) - failed) / elapsed, 2)
+            report["target_sends_per_second"] = round(args.bots * args.rate / 60, 2)
+            stop.set()
+            await prober
+
+            started = time.perf_counter()
+            await bounded(args.start_concurrency, [
+                lambda bot_id=bot_id: recorder.request(
+                    http, "stop", "POST", "/api/telegram/bot/stop", json={"bot_id": bot_id}
+                )
+                for bot_id in bot_ids
+            ])
+            report["stop_seconds"] = round(time.perf_counter() - started, 3)
+        started = time.perf_counter()
+    report["shutdown_seconds"] = round(time.perf_counter() - started, 3)
+
+    report["rss_mb"]["peak"] = round(recorder.peak_rss / 2**20, 1)
+    report["send_errors"] = dict(transport.errors)
+    report["dms"] = recorder.dms
+    report["reply_ms"] = summary_ms(recorder.replies)
+    report["loop_lag_ms"] = summary_ms(recorder.lags)
+    report["api_ms"] = {endpoint: summary_ms(values) for endpoint, values in sorted(recorder.api.items())}
+    report["api_responses"] = dict(sorted(recorder.status.items()))
+    report["telegram_requests"] = dict(sorted(transport.calls.items()))
+    report["supabase_requests"] = dict(sorted(stub.requests.items()))
+    report["supabase_rows"] = {table: len(stub.rows(table)) for table in ("message_logs", "bot_logs")}
+    report["supabase_rejected"] = stub.rejected
+    return report
+
+
+def run(args) -> dict:
+    with StubPostgREST(latency=args.supabase_latency) as stub:
+        os.environ["SUPABASE_URL"] = stub.url
+        os.environ["SUPABASE_KEY"] = "loadtest-key"
+        import main
+        transport = fake_telethon.install(main, fake_telethon.FakeTransport(
+            connect_latency=args.connect_latency, rpc_latency=args.rpc_latency, send_latency=args.send_latency,
+            send_error_rate=args.send_errors, flood_wait_rate=args.flood_waits,
+            flood_wait_seconds=args.flood_wait_seconds, seed=args.seed,
+        ))
+        report = asyncio.run(drive(main, transport, stub, args))
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("json", "compare")}
+    return report
+
+
+def print_report(report):
+    print(f"{report['running_bots']} bots started in {report['start_seconds']}s, "
+          f"stopped in {report['stop_seconds']}s, shutdown {report['shutdown_seconds']}s")
+    print(f"sends: {report['sends_per_second']}/s of {report['target_sends_per_second']}/s target, "
+          f"{report['failed_sends_per_second']}/s failed ({report['send_errors']}); CPU {report['cpu_percent']}%")
+    reply = report["reply_ms"]
+    print(f"auto-replies: {reply['count']} of {report['dms']} DMs, "
+          f"p50 {reply['p50']}ms p95 {reply['p95']}ms p99 {reply['p99']}ms max {reply['max']}ms")
+    lag = report["loop_lag_ms"]
+    print(f"loop lag: p50 {lag['p50']}ms p99 {lag['p99']}ms max {lag['max']}ms; "
+          f"RSS {report['rss_mb']['before']} -> {report['rss_mb']['running']} MiB, peak {report['rss_mb']['peak']} MiB")
+    for endpoint, s in report["api_ms"].items():
+        print(f"  {endpoint:>13}: {s['count']:>6} requests, p50 {s['p50']}ms p99 {s['p99']}ms")
+    print(f"API responses: {report['api_responses']}")
+    print(f"Telegram requests: {report['telegram_requests']}")
+    print(f"PostgREST requests: {report['supabase_requests']}, rows stored: {report['supabase_rows']}, "
+          f"requests rejected by a CHECK: {report['supabase_rejected']}")
+
+
+def flatten(report, prefix=""):
+    for key, value in report.items():
+        if key == "config":
+            continue
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}{key}", value
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = dict(flatten(json.load(f)))
+    with open(after_path) as f:
+        after = dict(flatten(json.load(f)))
+    width = max(len(key) for key in before.keys() | after.keys())
+    print(f"{'metric':<{width}} {'before':>12} {'after':>12} {'change':>8}")
+    for key in sorted(before.keys() | after.keys()):
+        a, b = before.get(key), after.get(key)
+        change = f"{(b - a) / a:+.0%}" if a and b is not None else ""
+        print(f"{key:<{width}} {'-' if a is None else a:>12} {'-' if b is None else b:>12} {change:>8}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bots", type=int, default=100)
+    parser.add_argument("--groups", type=int, default=50, help="groups per bot")
+    parser.add_argument("--rate", type=float, default=60, help="messages per minute per bot")
+    parser.add_argument("--dms", type=float, default=50, help="incoming DMs per second, over all bots")
+    parser.add_argument("--senders", type=int, default=100_000, help="distinct DM senders")
+    parser.add_argument("--reply-cooldown", type=int, default=600)
+    parser.add_argument("--api-rate", type=float, default=20, help="status/stats/health requests per second")
+    parser.add_argument("--fetch-rate", type=float, default=1, help="/groups/fetch requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--start-concurrency", type=int, default=20)
+    parser.add_argument("--connect-latency", type=float, default=0.3)
+    parser.add_argument("--rpc-latency", type=float, default=0.05)
+    parser.add_argument("--send-latency", type=float, default=0.1)
+    parser.add_argument("--send-errors", type=float, default=0.01, help="share of sends failing with a server error")
+    parser.add_argument("--flood-waits", type=float, default=0.001, help="share of sends answered with a FloodWait")
+    parser.add_argument("--flood-wait-seconds", type=int, default=30)
+    parser.add_argument("--supabase-latency", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="print two reports side by side")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if report["running_bots"] < args.bots:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
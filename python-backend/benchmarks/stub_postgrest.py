@@ -0,0 +1,168 @@
+"""Minimal in-process stand-in for the Supabase REST (PostgREST) API.
+
+Runs a Starlette app under uvicorn on a background thread so benchmarks can
+point SUPABASE_URL at it. Only the pieces the backend uses are implemented.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from benchmarks.common import BackgroundServer
+
+
+class StubPostgREST:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.down = False
+        # What every request gets while down: 503, or e.g. 401 for an expired key
+        self.down_status = 503
+        self.tables = defaultdict(list)
+        self.requests = defaultdict(int)
+        # Primary keys per table, for `Prefer: resolution=ignore-duplicates`
+        self.ids = defaultdict(set)
+        self.duplicates = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self.url = None
+
+        self.rpcs = {"increment_group_stats": self._increment_group_stats}
+        # CHECK constraints per table (scripts/001_create_bots_tables.sql,
+        # 006_add_scheduling_and_logs.sql); a POST with any failing row is
+        # rejected whole, like Postgres does. "rpc/<fn>" entries check each
+        # row of an RPC's p_rows the same way
+        self.checks = {
+            "bot_logs": lambda row: row.get("log_type") in ("info", "error", "warning"),
+            "message_logs": lambda row: row.get("status") in ("sent", "failed", "pending"),
+        }
+        self.rejected = 0
+
+        self.app = Starlette(routes=[
+            Route("/rest/v1/rpc/{fn}", self._rpc, methods=["POST"]),
+            Route("/rest/v1/{table}", self._table, methods=["GET", "POST", "PATCH"]),
+        ])
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self):
+        self._server = BackgroundServer(self.app).start()
+        self.url = self._server.url
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -- helpers -----------------------------------------------------------
+
+    def rows(self, table: str):
+        with self._lock:
+            return list(self.tables[table])
+
+    def total_requests(self) -> int:
+        with self._lock:
+            return sum(self.requests.values())
+
+    def reset(self):
+        with self._lock:
+            self.tables.clear()
+            self.requests.clear()
+            self.ids.clear()
+            self.duplicates = 0
+            self.rejected = 0
+
+    # -- handlers ----------------------------------------------------------
+
+    async def _table(self, request: Request):
+        table = request.path_params["table"]
+        with self._lock:
+            self.requests[f"{request.method} {table}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.down:
+            return JSONResponse({"code": "PGRST000", "message": "down"}, status_code=self.down_status)
+
+        filters = {
+            k: v.split(".", 1)[1]
+            for k, v in request.query_params.items()
+            if "." in v and v.startswith("eq.")
+        }
+
+        if request.method == "POST":
+            body = await request.json()
+            rows = body if isinstance(body, list) else [body]
+            ignore_duplicates = "resolution=ignore-duplicates" in request.headers.get("prefer", "")
+            check = self.checks.get(table)
+            if check is not None and not all(check(row) for row in rows):
+                with self._lock:
+                    self.rejected += 1
+                return JSONResponse({"code": "23514", "message": "violates check constraint"}, status_code=400)
+            with self._lock:
+                ids = self.ids[table]
+                for row in rows:
+                    if "id" in row:
+                        if row["id"] in ids and ignore_duplicates:
+                            self.duplicates += 1
+                            continue
+                        ids.add(row["id"])
+                    self.tables[table].append(row)
+            return Response(status_code=201)
+
+        if request.method == "GET":
+            with self._lock:
+                matched = [r for r in self.tables[table] if _matches(r, filters)]
+            return JSONResponse(matched)
+
+        # PATCH
+        body = await request.json()
+        with self._lock:
+            for row in self.tables[table]:
+                if _matches(row, filters):
+                    row.update(body)
+        return Response(status_code=204)
+
+
+    async def _rpc(self, request: Request):
+        fn = request.path_params["fn"]
+        with self._lock:
+            self.requests[f"RPC {fn}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.down:
+            return JSONResponse({"code": "PGRST000", "message": "down"}, status_code=self.down_status)
+        if fn not in self.rpcs:
+            return JSONResponse({"message": f"function {fn} not found"}, status_code=404)
+        params = await request.json()
+        check = self.checks.get(f"rpc/{fn}")
+        if check is not None and not all(check(row) for row in params.get("p_rows", [])):
+            with self._lock:
+                self.rejected += 1
+            return JSONResponse({"code": "22P02", "message": "invalid input syntax for type uuid"}, status_code=400)
+        result = self.rpcs[fn](params)
+        if result is None:
+            return Response(status_code=204)
+        return JSONResponse(result)
+
+    def _increment_group_stats(self, params: dict):
+        # Mirrors scripts/013_add_group_stats_rpc.sql: one atomic update per row
+        with self._lock:
+            for delta in params["p_rows"]:
+                for row in self.tables["bot_groups"]:
+                    if row["bot_id"] == delta["bot_id"] and int(row["group_id"]) == int(delta["group_id"]):
+                        row["messages_sent"] = (row.get("messages_sent") or 0) + delta["delta"]
+                        row["last_message_at"] = delta["last_message_at"]
+
+
+def _matches(row: dict, filters: dict) -> bool:
+    return all(str(row.get(k)) == v for k, v in filters.items())
@@ -0,0 +1,175 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from typing import Optional
+
+ROOT = "telegram_bot"
+
+
+def get_logger(component: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{component}")
+
+
+def parse_level(level) -> int:
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(str(level).upper())
+    if not isinstance(value, int):
+        raise ValueError(f"Unknown log level: {level}")
+    return value
+
+
+class TextFormatter(logging.Formatter):
+    """`2024-01-01T12:00:00 INFO [BOT abc] message` - the old print() layout with a timestamp and level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        bot_id = getattr(record, "bot_id", None)
+        tag = f"BOT {bot_id}" if bot_id else record.name.rpartition(".")[2].upper()
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+        line = f"{stamp} {record.levelname} [{tag}] {record.getMessage()}"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, component, bot_id, msg and any `extra` fields"""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "component": record.name.rpartition(".")[2],
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time"""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records are dropped (and counted) when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogWriter(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room instead of failing when the queue is full at shutdown
+        self.queue.put(self._sentinel)
+
+
+class BotLogger(logging.LoggerAdapter):
+    """Logger for one bot: tags records with bot_id, has its own level and
+    samples per-message lines (`sampled`) at `sample_rate`"""
+
+    def __init__(self, logger: logging.Logger, bot_id: str, level=None, sample_rate: float = 1.0):
+        super().__init__(logger, {"bot_id": bot_id})
+        self.level = logging.NOTSET if level is None else parse_level(level)
+        self.sample_rate = sample_rate
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+    def isEnabledFor(self, level: int) -> bool:
+        if self.level:
+            return level >= self.level
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, msg, *args, **kwargs):
+        # Bypass the shared logger's level so a bot can be more verbose than the rest
+        if self.isEnabledFor(level):
+            msg, kwargs = self.process(msg, kwargs)
+            self.logger._log(level, msg, args, **kwargs)
+
+    def sampled(self, level: int, msg, *args, **kwargs):
+        """Log a per-message line for roughly `sample_rate` of the calls"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.log(level, msg, *args, **kwargs)
+
+
+class LogSetup:
+    """Handlers for the `telegram_bot` loggers.
+
+    With `queue_size > 0` records go through a bounded queue to a writer
+    thread, so a slow stdout (container log drivers) never stalls the event
+    loop; `queue_size = 0` writes synchronously.
+    """
+
+    def __init__(self, level="INFO", fmt: str = "text", sample_rate: float = 1.0, queue_size: int = 10000):
+        self.sample_rate = sample_rate
+        self.root = logging.getLogger(ROOT)
+        self.root.setLevel(parse_level(level))
+        self.root.propagate = False
+        for handler in list(self.root.handlers):
+            self.root.removeHandler(handler)
+
+        output = StdoutHandler()
+        output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+        self.handler: Optional[DroppingQueueHandler] = None
+        self.writer: Optional[LogWriter] = None
+        if queue_size > 0:
+            self.handler = DroppingQueueHandler(queue.Queue(queue_size))
+            self.writer = LogWriter(self.handler.queue, output, respect_handler_level=True)
+            self.root.addHandler(self.handler)
+        else:
+            self.root.addHandler(output)
+        self._running = False
+
+    def start(self):
+        if self.writer is not None and not self._running:
+            self.writer.start()
+            self._running = True
+
+    def stop(self):
+        """Write out everything queued and stop the writer thread"""
+        if self.writer is not None and self._running:
+            self.writer.stop()
+            self._running = False
+
+    def bot_logger(self, bot_id: str, level=None, sample_rate: Optional[float] = None) -> BotLogger:
+        return BotLogger(
+            get_logger("bot"),
+            bot_id,
+            level=level,
+            sample_rate=self.sample_rate if sample_rate is None else sample_rate,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "level": logging.getLevelName(self.root.level),
+            "queued": self.handler.queue.qsize() if self.handler else 0,
+            "dropped": self.handler.dropped if self.handler else 0,
+        }
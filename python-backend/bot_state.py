@@ -0,0 +1,69 @@
+import time
+from datetime import datetime
+from typing import Optional
+
+# Per-bot counters, as served by the stats endpoints and saved by checkpoints
+COUNTERS = ("messages_sent", "messages_failed", "auto_replies", "auto_replies_suppressed")
+
+
+class BotState:
+    """Everything a worker holds for one running bot, in one slotted record.
+
+    Replaces a dict entry in `running_bots` plus a second dict in
+    `bot_stats`: counters are int fields, and the start is kept as a wall
+    clock time (for display) and a monotonic one (for `uptime`). The send
+    engine reads `current_config` and the send callback gets the record
+    itself, so a scheduling step does no dict lookups.
+    """
+
+    __slots__ = (
+        "bot_id", "config", "client", "session_key", "me", "peers", "log", "logs", "metrics",
+        "reply_cooldown", "reply_handler", "engine", "loop_task", "client_task", "running",
+        "messages_sent", "messages_failed", "auto_replies", "auto_replies_suppressed",
+        "started_at", "started",
+    )
+
+    def __init__(self, bot_id: str, config, client, session_key: str, me, peers: dict,
+                 log, logs, metrics, reply_cooldown, counters: Optional[dict] = None):
+        self.bot_id = bot_id
+        self.config = config
+        self.client = client
+        self.session_key = session_key
+        self.me = me
+        self.peers = peers
+        self.log = log
+        self.logs = logs
+        self.metrics = metrics
+        self.reply_cooldown = reply_cooldown
+        self.reply_handler = None
+        self.engine = None
+        # Supervised tasks (supervisor.SupervisedTask), set once spawned
+        self.loop_task = None
+        self.client_task = None
+        self.running = True
+
+        counters = counters or {}
+        self.messages_sent = int(counters.get("messages_sent", 0))
+        self.messages_failed = int(counters.get("messages_failed", 0))
+        self.auto_replies = int(counters.get("auto_replies", 0))
+        self.auto_replies_suppressed = int(counters.get("auto_replies_suppressed", 0))
+        self.started_at = time.time()
+        self.started = time.monotonic()
+
+    def current_config(self):
+        """The config while running, None once stopped (the engine's `get_config`)"""
+        return self.config if self.running else None
+
+    @property
+    def uptime(self) -> float:
+        """Seconds since this worker started the bot"""
+        return time.monotonic() - self.started
+
+    def stats(self) -> dict:
+        return {
+            "messages_sent": self.messages_sent,
+            "messages_failed": self.messages_failed,
+            "auto_replies": self.auto_replies,
+            "auto_replies_suppressed": self.auto_replies_suppressed,
+            "started_at": datetime.utcfromtimestamp(self.started_at).isoformat(),
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+from bot_logging import get_logger
+
+log = get_logger("pool")
+
+
+class SessionNotAuthorized(Exception):
+    """The session string is no longer logged in"""
+
+
+def session_key(session_string: str) -> str:
+    return hashlib.sha256(session_string.encode()).hexdigest()
+
+
+class PooledClient:
+    __slots__ = ("key", "client", "me", "in_use", "last_used", "borrowed")
+
+    def __init__(self, key: str, client, me=None, borrowed: bool = False):
+        self.key = key
+        self.client = client
+        self.me = me
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        # Borrowed clients belong to a running bot and are never disconnected here
+        self.borrowed = borrowed
+
+    async def get_me(self):
+        if self.me is None:
+            self.me = await self.client.get_me()
+        return self.me
+
+
+class ClientPool:
+    """LRU pool of connected Telegram clients for one-shot endpoints.
+
+    Keyed by a hash of the session string. If a running bot already uses the
+    session its client is borrowed instead of opening a second connection.
+    Idle clients are disconnected after `idle_timeout` seconds, and the pool
+    never keeps more than `max_size` idle clients (0 disables pooling).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str, int, str], object],
+        running_lookup: Callable[[str], Optional[PooledClient]] = lambda key: None,
+        max_size: int = 50,
+        idle_timeout: float = 300.0,
+    ):
+        self.factory = factory
+        self.running_lookup = running_lookup
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self._entries: "OrderedDict[str, PooledClient]" = OrderedDict()
+        # key -> lock serializing connects of the session; an entry goes away
+        # with the last _acquire holding or waiting for it, whatever the outcome
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.borrowed = 0
+        self.evictions = 0
+
+    async def start(self):
+        if self._sweeper is None and self.max_size > 0:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        entries = list(self._entries.values())
+        self._entries.clear()
+        await asyncio.gather(*(self._disconnect(e) for e in entries), return_exceptions=True)
+
+    @asynccontextmanager
+    async def session(self, session_string: str, api_id: int, api_hash: str):
+        """Yield a connected, authorized PooledClient for the session"""
+        key = session_key(session_string)
+
+        running = self.running_lookup(key)
+        if running is not None:
+            self.borrowed += 1
+            yield running
+            return
+
+        entry = await self._acquire(key, session_string, api_id, api_hash)
+        broken = False
+        try:
+            yield entry
+        except BaseException:
+            # Don't hand a client in an unknown state to the next request
+            broken = not entry.client.is_connected()
+            raise
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+            if broken or self.max_size == 0:
+                await self._evict(entry)
+            else:
+                await self._trim()
+
+    async def _acquire(self, key: str, session_string: str, api_id: int, api_hash: str) -> PooledClient:
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.client.is_connected():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                entry.in_use += 1
+                return entry
+            if entry is not None:
+                await self._evict(entry)
+
+            self.misses += 1
+            client = self.factory(session_string, api_id, api_hash)
+            try:
+                await client.connect()
+                if not await client.is_user_authorized():
+                    raise SessionNotAuthorized()
+            except BaseException:
+                await self._disconnect_client(client)
+                raise
+
+            entry = PooledClient(key, client)
+            entry.in_use = 1
+            if self.max_size > 0:
+                self._entries[key] = entry
+            return entry
+
+    async def _trim(self):
+        """Drop least recently used idle clients beyond max_size"""
+        while len(self._entries) > self.max_size:
+            victim = next((e for e in self._entries.values() if e.in_use == 0), None)
+            if victim is None:
+                return
+            await self._evict(victim)
+
+    async def _evict(self, entry: PooledClient):
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        if self.max_size > 0:
+            self.evictions += 1
+        await self._disconnect(entry)
+
+    async def _disconnect(self, entry: PooledClient):
+        if not entry.borrowed:
+            await self._disconnect_client(entry.client)
+
+    @staticmethod
+    async def _disconnect_client(client):
+        try:
+            await client.disconnect()
+        except Exception as e:
+            log.warning("Disconnect error: %s", e)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            await self.evict_idle()
+
+    async def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for entry in [e for e in self._entries.values() if e.in_use == 0 and e.last_used < cutoff]:
+            await self._evict(entry)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "in_use": sum(1 for e in self._entries.values() if e.in_use),
+            "hits": self.hits,
+            "misses": self.misses,
+            "borrowed": self.borrowed,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,278 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncIterable, Awaitable, Callable, Dict, List, Optional
+
+from telethon.tl.types import Channel, Chat
+
+from bot_logging import get_logger
+
+log = get_logger("dialogs")
+
+# Columns returned by /api/telegram/groups/fetch
+PUBLIC_FIELDS = ("id", "title", "type", "members_count", "username", "is_megagroup")
+
+
+def group_from_dialog(dialog) -> Optional[dict]:
+    """Index record for a dialog we can post to, or None for users and broadcast channels"""
+    entity = dialog.entity
+
+    # Only include groups and channels (not private chats)
+    if not isinstance(entity, (Chat, Channel)):
+        return None
+    # Skip broadcast channels we didn't create - we can't post there
+    if isinstance(entity, Channel) and entity.broadcast and not entity.creator:
+        return None
+
+    return {
+        "id": entity.id,
+        "title": dialog.title or entity.title or "Unknown",
+        "type": "channel" if isinstance(entity, Channel) else "group",
+        "members_count": getattr(entity, 'participants_count', None),
+        "username": getattr(entity, 'username', None),
+        "is_megagroup": getattr(entity, 'megagroup', False) if isinstance(entity, Channel) else False,
+        "access_hash": getattr(entity, 'access_hash', None),
+        "date": dialog.date.timestamp() if dialog.date else 0.0,
+        "pinned": bool(getattr(dialog, 'pinned', False)),
+    }
+
+
+def public_group(group: dict) -> dict:
+    return {field: group[field] for field in PUBLIC_FIELDS}
+
+
+class AccountDialogs:
+    __slots__ = ("groups", "high_water", "refreshed_at", "full_synced_at", "stale", "_ordered")
+
+    def __init__(self):
+        self.groups: Dict[int, dict] = {}
+        # Newest non-pinned dialog date seen; a delta refresh stops below it
+        self.high_water = 0.0
+        self.refreshed_at: Optional[float] = None
+        self.full_synced_at: Optional[float] = None
+        self.stale = False
+        self._ordered: Optional[List[dict]] = None
+
+    def ordered(self) -> List[dict]:
+        """Public group records in dialog order (pinned first, then newest)"""
+        if self._ordered is None:
+            self._ordered = [
+                public_group(g)
+                for g in sorted(self.groups.values(), key=lambda g: (not g["pinned"], -g["date"]))
+            ]
+        return self._ordered
+
+    def changed(self):
+        self._ordered = None
+
+
+class DialogIndex:
+    """Per-account index of postable groups, persisted in SQLite.
+
+    `/api/telegram/groups/fetch` answers from the index and refreshes it in
+    the background. A refresh walks dialogs newest-first and stops at the
+    first unpinned dialog not newer than the previous refresh; every
+    `full_sync_interval` seconds it walks everything to notice left groups.
+    Live ChatAction updates from running bots are applied in between.
+    """
+
+    def __init__(self, path: str, refresh_interval: float = 60.0, full_sync_interval: float = 3600.0):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.full_sync_interval = full_sync_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._accounts: Dict[str, AccountDialogs] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS dialog_groups (
+                account TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                title TEXT,
+                type TEXT,
+                members_count INTEGER,
+                username TEXT,
+                is_megagroup INTEGER,
+                access_hash INTEGER,
+                date REAL,
+                pinned INTEGER,
+                PRIMARY KEY (account, id)
+            );
+            CREATE TABLE IF NOT EXISTS dialog_accounts (
+                account TEXT PRIMARY KEY,
+                high_water REAL,
+                refreshed_at REAL,
+                full_synced_at REAL
+            );
+        """)
+        self._load()
+
+    def _load(self):
+        with self._lock:
+            for account, high_water, refreshed_at, full_synced_at in self._db.execute(
+                "SELECT account, high_water, refreshed_at, full_synced_at FROM dialog_accounts"
+            ):
+                entry = self._accounts.setdefault(account, AccountDialogs())
+                entry.high_water = high_water or 0.0
+                entry.refreshed_at = refreshed_at
+                entry.full_synced_at = full_synced_at
+            for row in self._db.execute(
+                "SELECT account, id, title, type, members_count, username, is_megagroup, "
+                "access_hash, date, pinned FROM dialog_groups"
+            ):
+                account = row[0]
+                group = dict(zip(
+                    ("id", "title", "type", "members_count", "username", "is_megagroup",
+                     "access_hash", "date", "pinned"),
+                    row[1:],
+                ))
+                group["is_megagroup"] = bool(group["is_megagroup"])
+                group["pinned"] = bool(group["pinned"])
+                self._accounts.setdefault(account, AccountDialogs()).groups[group["id"]] = group
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # -- reads -------------------------------------------------------------
+
+    def get(self, account: str) -> Optional[AccountDialogs]:
+        entry = self._accounts.get(account)
+        if entry is None or entry.refreshed_at is None:
+            return None
+        return entry
+
+    def needs_refresh(self, account: str) -> bool:
+        entry = self._accounts.get(account)
+        if entry is None or entry.refreshed_at is None or entry.stale:
+            return True
+        return time.time() - entry.refreshed_at > self.refresh_interval
+
+    def is_refreshing(self, account: str) -> bool:
+        return account in self._refreshing
+
+    # -- refresh -----------------------------------------------------------
+
+    async def refresh(
+        self,
+        account: str,
+        dialogs: AsyncIterable,
+        full: bool = False,
+        on_group: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ) -> AccountDialogs:
+        """Walk `dialogs` (newest first) and update the account's index"""
+        entry = self._accounts.setdefault(account, AccountDialogs())
+        now = time.time()
+        if entry.full_synced_at is None or now - entry.full_synced_at > self.full_sync_interval:
+            full = True
+
+        seen = set()
+        changed: List[dict] = []
+        removed: List[int] = []
+        high_water = entry.high_water
+        async for dialog in dialogs:
+            date = dialog.date.timestamp() if dialog.date else 0.0
+            pinned = bool(getattr(dialog, 'pinned', False))
+            if not full and not pinned and date <= entry.high_water:
+                break
+            if not pinned:
+                high_water = max(high_water, date)
+
+            group = group_from_dialog(dialog)
+            entity_id = dialog.entity.id
+            if group is None:
+                if entity_id in entry.groups:
+                    removed.append(entity_id)
+                continue
+            seen.add(entity_id)
+            changed.append(group)
+            if on_group is not None:
+                await on_group(public_group(group))
+
+        if full:
+            removed.extend(gid for gid in entry.groups if gid not in seen)
+
+        for group in changed:
+            entry.groups[group["id"]] = group
+        for gid in removed:
+            entry.groups.pop(gid, None)
+        entry.high_water = high_water
+        entry.refreshed_at = now
+        if full:
+            entry.full_synced_at = now
+        entry.stale = False
+        entry.changed()
+
+        await asyncio.to_thread(self._persist, account, entry, changed, removed)
+        return entry
+
+    def refresh_once(self, account: str, run: Callable[[], Awaitable]) -> asyncio.Task:
+        """Start `run()` unless a refresh for the account is already in flight"""
+        task = self._refreshing.get(account)
+        if task is None:
+            task = asyncio.create_task(run())
+            self._refreshing[account] = task
+            task.add_done_callback(lambda t: self._refresh_done(account, t))
+        return task
+
+    def _refresh_done(self, account: str, task: asyncio.Task):
+        self._refreshing.pop(account, None)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Refresh failed: %s", task.exception())
+
+    # -- live updates --------------------------------------------------------
+
+    async def update_title(self, account: str, group_id: int, title: str):
+        entry = self._accounts.get(account)
+        if entry is not None and group_id in entry.groups:
+            entry.groups[group_id]["title"] = title
+            entry.changed()
+            await asyncio.to_thread(self._persist, account, entry, [entry.groups[group_id]], [])
+
+    async def remove_group(self, account: str, group_id: int):
+        entry = self._accounts.get(account)
+        if entry is not None and group_id in entry.groups:
+            del entry.groups[group_id]
+            entry.changed()
+            await asyncio.to_thread(self._persist, account, entry, [], [group_id])
+
+    def mark_stale(self, account: str):
+        entry = self._accounts.get(account)
+        if entry is not None:
+            entry.stale = True
+
+    # -- storage -------------------------------------------------------------
+
+    def _persist(self, account: str, entry: AccountDialogs, changed: List[dict], removed: List[int]):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO dialog_groups (account, id, title, type, members_count, username, "
+                    "is_megagroup, access_hash, date, pinned) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (account, g["id"], g["title"], g["type"], g["members_count"], g["username"],
+                         int(bool(g["is_megagroup"])), g["access_hash"], g["date"], int(g["pinned"]))
+                        for g in changed
+                    ],
+                )
+                self._db.executemany(
+                    "DELETE FROM dialog_groups WHERE account = ? AND id = ?",
+                    [(account, gid) for gid in removed],
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO dialog_accounts (account, high_water, refreshed_at, full_synced_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (account, entry.high_water, entry.refreshed_at, entry.full_synced_at),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telethon import utils as telethon_utils
+from telethon.tl.types import (
+    Channel,
+    Chat,
+    InputPeerChannel,
+    InputPeerChat,
+    PeerChannel,
+)
+
+CHAT = "chat"
+CHANNEL = "channel"
+
+# Ids per SELECT, below SQLite's limit on bound parameters
+QUERY_CHUNK = 500
+
+
+def peer_key(peer_id: int) -> Tuple[int, Tuple[str, ...]]:
+    """Bare entity id for a bare or marked (-100...) peer id, and the kinds
+    it can be, most likely first"""
+    if peer_id < 0:
+        entity_id, peer_type = telethon_utils.resolve_id(peer_id)
+        return entity_id, (CHANNEL,) if peer_type is PeerChannel else (CHAT,)
+    return peer_id, (CHANNEL, CHAT)
+
+
+def entity_row(entity) -> Optional[Tuple[int, str, int]]:
+    """(id, kind, access_hash) for a group entity or input peer, None if
+    unusable or not a group"""
+    if isinstance(entity, (Chat, InputPeerChat)):
+        return (getattr(entity, "chat_id", None) or entity.id, CHAT, 0)
+    if not isinstance(entity, (Channel, InputPeerChannel)):
+        # Users share the id space of bare group ids; bots only send to groups
+        return None
+    access_hash = getattr(entity, "access_hash", None)
+    if access_hash is None:
+        # Min entities come without a usable hash
+        return None
+    return (getattr(entity, "channel_id", None) or entity.id, CHANNEL, access_hash)
+
+
+def input_peer(kind: str, entity_id: int, access_hash: int):
+    if kind == CHANNEL:
+        return InputPeerChannel(entity_id, access_hash)
+    return InputPeerChat(entity_id)
+
+
+class EntityStore:
+    """Per-account group peers ((kind, id) -> access hash), persisted in SQLite.
+
+    StringSession keeps Telethon's entity cache in memory only, so after a
+    start every bare group id would have to be resolved again. Bots load
+    their groups' InputPeers from here and send to them directly. Filled
+    from dialog walks (/api/telegram/groups/fetch) and from peers Telethon
+    resolved while sending. Calls are blocking; run them with
+    `asyncio.to_thread` from the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entities (
+                account TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                access_hash INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (account, kind, id)
+            )
+        """)
+        keyed = {row[1]: row[5] for row in self._db.execute("PRAGMA table_info(entities)")}
+        if not keyed["kind"]:
+            # Files from before the kind was part of the key, with user rows
+            self._db.executescript("""
+                BEGIN;
+                CREATE TABLE entities_by_kind (
+                    account TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    access_hash INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (account, kind, id)
+                );
+                INSERT INTO entities_by_kind SELECT * FROM entities WHERE kind != 'user';
+                DROP TABLE entities;
+                ALTER TABLE entities_by_kind RENAME TO entities;
+                COMMIT;
+            """)
+
+        self.remembered = 0
+        self.forgotten = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def remember(self, account: str, entities: Iterable) -> int:
+        """Store the usable peers among `entities`; returns how many"""
+        now = time.time()
+        rows = [(account, row[0], row[1], row[2], now) for row in map(entity_row, entities) if row is not None]
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO entities (account, id, kind, access_hash, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        self.remembered += len(rows)
+        return len(rows)
+
+    def forget(self, account: str, peer_id: int):
+        """Drop a peer whose hash stopped working"""
+        entity_id, kinds = peer_key(peer_id)
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM entities WHERE account = ? AND kind = ? AND id = ?",
+                [(account, kind, entity_id) for kind in kinds],
+            )
+        self.forgotten += 1
+
+    def input_peers(self, account: str, peer_ids: Iterable[int]) -> Dict[int, object]:
+        """InputPeers for the known `peer_ids`, keyed by the ids as given"""
+        wanted: Dict[int, List[int]] = {}
+        for peer_id in peer_ids:
+            wanted.setdefault(peer_key(peer_id)[0], []).append(peer_id)
+        if not wanted:
+            return {}
+        ids = list(wanted)
+        rows = []
+        with self._lock:
+            for start in range(0, len(ids), QUERY_CHUNK):
+                chunk = ids[start:start + QUERY_CHUNK]
+                rows += self._db.execute(
+                    f"SELECT id, kind, access_hash FROM entities WHERE account = ? AND id IN ({','.join('?' * len(chunk))})",
+                    (account, *chunk),
+                ).fetchall()
+        hashes = {(entity_id, kind): access_hash for entity_id, kind, access_hash in rows}
+        peers = {}
+        for entity_id, given in wanted.items():
+            for peer_id in given:
+                for kind in peer_key(peer_id)[1]:
+                    if (entity_id, kind) in hashes:
+                        peers[peer_id] = input_peer(kind, entity_id, hashes[entity_id, kind])
+                        break
+        return peers
+
+    def stats(self) -> dict:
+        return {"remembered": self.remembered, "forgotten": self.forgotten}
@@ -0,0 +1,118 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+# Bot states
+STARTING = "starting"
+RUNNING = "running"
+STOPPING = "stopping"
+STOPPED = "stopped"
+
+START = "start"
+
+
+class _Bot:
+    __slots__ = ("state", "lock", "tail", "tail_kind")
+
+    def __init__(self):
+        self.state = STOPPED
+        # Held by the transition in progress; FIFO, so transitions apply in
+        # the order they were requested
+        self.lock = asyncio.Lock()
+        # Last requested transition, joined by callers asking for the same
+        self.tail: Optional[asyncio.Task] = None
+        self.tail_kind: Optional[str] = None
+
+
+class BotLifecycle:
+    """Start/stop state machine of the bots on this worker.
+
+    Every start and stop of a bot runs as one transition under the bot's
+    lock, so a start can't pass its "already running?" check while another
+    one is still connecting, and a stop waits for a start in progress
+    instead of missing it. A caller asking for the same transition as the
+    last one requested joins it and gets its result (or exception) instead
+    of running it twice. Transitions run in their own task: a caller that
+    gives up (a dropped request) doesn't abort one halfway.
+
+    `start(bot_id, launch)` runs `launch()` unless the bot is running; it
+    returns whether the bot was started (`launch` may return False, e.g.
+    when another worker holds the bot). `stop(bot_id, teardown, kind)`
+    runs `teardown()` if the bot is running and returns its result, or None
+    if it wasn't running. A failed start leaves the bot stopped; a stop
+    leaves it stopped even if `teardown` raises. Between `close()` (app
+    shutdown) and `open()` starts return False without running `launch`.
+    """
+
+    def __init__(self):
+        self._bots: Dict[str, _Bot] = {}
+        self.closed = False
+        self.transitions = 0
+        self.joined = 0
+
+    def state(self, bot_id: str) -> str:
+        bot = self._bots.get(bot_id)
+        return bot.state if bot is not None else STOPPED
+
+    def open(self):
+        self.closed = False
+
+    def close(self):
+        """Refuse further starts; stops and a start already running go on"""
+        self.closed = True
+
+    def active(self) -> Set[str]:
+        """Bots starting, running or stopping, or with a transition queued"""
+        return set(self._bots)
+
+    async def start(self, bot_id: str, launch: Callable[[], Awaitable[bool]]) -> bool:
+        return await self._submit(bot_id, START, launch)
+
+    async def stop(self, bot_id: str, teardown: Callable[[], Awaitable[Any]], kind: str = "stop") -> Any:
+        return await self._submit(bot_id, kind, teardown)
+
+    async def _submit(self, bot_id: str, kind: str, operation: Callable[[], Awaitable[Any]]) -> Any:
+        bot = self._bots.get(bot_id)
+        if bot is None:
+            bot = self._bots[bot_id] = _Bot()
+        if bot.tail is not None and bot.tail_kind == kind:
+            self.joined += 1
+            return await asyncio.shield(bot.tail)
+        task = asyncio.create_task(self._run(bot_id, bot, kind, operation))
+        bot.tail, bot.tail_kind = task, kind
+        return await asyncio.shield(task)
+
+    async def _run(self, bot_id: str, bot: _Bot, kind: str, operation: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            async with bot.lock:
+                if kind == START:
+                    if bot.state == RUNNING or self.closed:
+                        return False
+                    self.transitions += 1
+                    bot.state = STARTING
+                    started = False
+                    try:
+                        started = bool(await operation())
+                    finally:
+                        bot.state = RUNNING if started else STOPPED
+                    return started
+
+                if bot.state != RUNNING:
+                    return None
+                self.transitions += 1
+                bot.state = STOPPING
+                try:
+                    return await operation()
+                finally:
+                    bot.state = STOPPED
+        finally:
+            if bot.tail is asyncio.current_task():
+                bot.tail = bot.tail_kind = None
+                # Nothing queued behind this one: a stopped bot needs no entry
+                if bot.state == STOPPED and self._bots.get(bot_id) is bot:
+                    del self._bots[bot_id]
+
+    def stats(self) -> dict:
+        states: Dict[str, int] = {}
+        for bot in self._bots.values():
+            states[bot.state] = states.get(bot.state, 0) + 1
+        return {"states": states, "transitions": self.transitions, "joined": self.joined, "closed": self.closed}
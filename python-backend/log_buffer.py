@@ -0,0 +1,98 @@
+import asyncio
+import time
+from array import array
+from datetime import datetime
+from typing import List, Optional
+
+# Record types; stored as an index into this tuple
+KINDS = ("info", "sent", "failed", "auto_reply")
+INFO, SENT, FAILED, AUTO_REPLY = range(len(KINDS))
+
+DETAIL_LIMIT = 200
+
+
+class BotLogBuffer:
+    """Fixed-size ring of a bot's recent activity.
+
+    Records live in preallocated parallel arrays (timestamp, type, group or
+    user id, optional text), so memory does not grow with traffic. Every
+    record gets an increasing sequence number that doubles as the paging
+    cursor: `read(since=n)` returns what was appended after record `n`.
+    Appends happen on the event loop; `wait()` lets streams sleep until the
+    next one.
+    """
+
+    __slots__ = ("capacity", "seq", "_ts", "_kind", "_target", "_detail", "_new", "closed")
+
+    def __init__(self, capacity: int = 500):
+        self.capacity = max(1, capacity)
+        self.seq = 0  # sequence number of the newest record (0 = empty)
+        self._ts = array("d", bytes(8 * self.capacity))
+        self._kind = bytearray(self.capacity)
+        self._target = array("q", bytes(8 * self.capacity))
+        self._detail: List[Optional[str]] = [None] * self.capacity
+        self._new: Optional[asyncio.Event] = None
+        self.closed = False
+
+    def append(self, kind: int, target: int = 0, detail: Optional[str] = None) -> int:
+        self.seq += 1
+        i = self.seq % self.capacity
+        self._ts[i] = time.time()
+        self._kind[i] = kind
+        self._target[i] = target
+        self._detail[i] = detail[:DETAIL_LIMIT] if detail else None
+        if self._new is not None:
+            self._new.set()
+            self._new = None
+        return self.seq
+
+    @property
+    def oldest(self) -> int:
+        """Sequence number of the oldest record still held"""
+        return max(1, self.seq - self.capacity + 1)
+
+    def read(self, since: Optional[int] = None, limit: int = 50) -> List[dict]:
+        """Records after `since` (oldest first), or the newest `limit` without a cursor"""
+        limit = max(0, limit)
+        if since is None:
+            start = max(self.oldest, self.seq - limit + 1)
+        else:
+            start = max(self.oldest, since + 1)
+        end = min(self.seq, start + limit - 1)
+        return [self._record(seq) for seq in range(start, end + 1)]
+
+    def _record(self, seq: int) -> dict:
+        i = seq % self.capacity
+        kind = self._kind[i]
+        record = {
+            "id": seq,
+            "type": KINDS[kind],
+            "created_at": datetime.utcfromtimestamp(self._ts[i]).isoformat(),
+        }
+        if kind in (SENT, FAILED):
+            record["group_id"] = self._target[i]
+        elif kind == AUTO_REPLY:
+            record["user_id"] = self._target[i]
+        detail = self._detail[i]
+        if detail is not None:
+            record["error_message" if kind == FAILED else "message"] = detail
+        return record
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the next append; False on timeout or once the buffer is closed"""
+        if self.closed:
+            return False
+        if self._new is None:
+            self._new = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._new.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return not self.closed
+
+    def close(self):
+        """Wake and end any streams (the bot was stopped)"""
+        self.closed = True
+        if self._new is not None:
+            self._new.set()
+            self._new = None
@@ -1,41 +1,427 @@
 import os
 import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from telethon import TelegramClient, errors, events
+from telethon import utils as telethon_utils
 from telethon.sessions import StringSession
-from typing import Optional, List
+from typing import Dict, Optional, List
 import shutil
-from telethon.tl.types import Chat, Channel
-import httpx
 
-app = FastAPI()
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+from bot_logging import LogSetup, get_logger
+from bot_state import COUNTERS, BotState
+from client_pool import ClientPool, PooledClient, SessionNotAuthorized, session_key
+from dialog_index import DialogIndex
+from entity_store import EntityStore
+from lifecycle import STOPPED, STOPPING, BotLifecycle
+from log_buffer import AUTO_REPLY, FAILED, INFO, SENT, BotLogBuffer
+from metrics import CONTENT_TYPE, LAG_BUCKETS, REGISTRY, WAIT_BUCKETS, LoopLagProbe
+from pending_auth import CODE_EXPIRED, PendingAuthManager
+from registry import BotRegistry
+from reply_cooldown import ReplyCooldown
+from scheduler import SendEngine, StopSending
+from session_import import (
+    MAX_SESSION_BYTES,
+    SESSION_SUFFIX,
+    ImportItem,
+    InvalidUpload,
+    open_upload,
+    remove_file,
+    run_bounded,
+    save_upload,
+    session_file as session_file_path,
+    valid_phone,
 )
+from sharding import FORWARDED_HEADER, LeaseExpired, LeaseTable, ShardCoordinator, load_secret
+from spool import Spool
+from stats_stream import StatsHub
+from supabase_writer import GroupStatsCounter, SupabaseWriter
+from supervisor import RUNNING, TaskSupervisor
+from timeseries import TimeSeriesStore
+
 
 SESSIONS_DIR = "sessions"
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
+# Logging: records go through a queue to a writer thread so slow stdout never
+# stalls the event loop; per-message lines are sampled at LOG_SAMPLE_RATE
+log_setup = LogSetup(
+    level=os.environ.get("LOG_LEVEL", "INFO"),
+    fmt=os.environ.get("LOG_FORMAT", "text"),
+    sample_rate=float(os.environ.get("LOG_SAMPLE_RATE", 1.0)),
+    queue_size=int(os.environ.get("LOG_QUEUE_SIZE", 10000)),
+)
+log_setup.start()
+logger = get_logger("main")
+
+# Recent activity kept in memory per running bot for /api/telegram/bot/logs
+LOG_BUFFER_SIZE = int(os.environ.get("LOG_BUFFER_SIZE", 500))
+
+# Bulk session import: sessions validated at once and accepted per upload
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", 20))
+IMPORT_MAX_SESSIONS = int(os.environ.get("IMPORT_MAX_SESSIONS", 5000))
+
+# Senders remembered per bot for the auto-reply cooldown
+AUTO_REPLY_CACHE_SIZE = int(os.environ.get("AUTO_REPLY_CACHE_SIZE", 10000))
+
+# Failing groups: first retry delay and its cap, and how long a group the
+# account can't post in (banned, kicked, muted) is left out of the cycle
+GROUP_RETRY_DELAY = float(os.environ.get("GROUP_RETRY_DELAY", 60.0))
+GROUP_MAX_RETRY_DELAY = float(os.environ.get("GROUP_MAX_RETRY_DELAY", 3600.0))
+GROUP_QUARANTINE_TIME = float(os.environ.get("GROUP_QUARANTINE_TIME", 86400.0))
+registry_log = get_logger("registry")
+
 # Supabase config (optional - for logging stats)
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_ANON_KEY") or os.environ.get("SUPABASE_KEY")
 
-# Pending auth clients
-clients = {}
+# Local state (bot registry) - keep on a persistent volume in production
+STATE_DIR = os.environ.get("STATE_DIR", "state")
+
+# Rows wait on disk for Supabase, so outages and restarts don't lose them
+# (an empty SUPABASE_SPOOL_DIR keeps them in memory instead)
+SUPABASE_SPOOL_DIR = os.environ.get("SUPABASE_SPOOL_DIR", os.path.join(STATE_DIR, "supabase_spool"))
+
+# Shared writer: one pooled HTTP client + batched inserts for all log rows
+supabase_writer = SupabaseWriter(
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    batch_size=int(os.environ.get("SUPABASE_BATCH_SIZE", 100)),
+    flush_interval=float(os.environ.get("SUPABASE_FLUSH_INTERVAL", 1.0)),
+    max_queue=int(os.environ.get("SUPABASE_MAX_QUEUE", 10000)),
+    max_retry_delay=float(os.environ.get("SUPABASE_MAX_RETRY_DELAY", 30.0)),
+    spool=Spool(
+        SUPABASE_SPOOL_DIR,
+        segment_bytes=int(float(os.environ.get("SUPABASE_SPOOL_SEGMENT_MB", 8)) * 1024 * 1024),
+        max_bytes=int(float(os.environ.get("SUPABASE_SPOOL_MAX_MB", 512)) * 1024 * 1024),
+    ) if SUPABASE_SPOOL_DIR else None,
+)
+
+# Per-group message counters, flushed as atomic server-side increments
+group_stats = GroupStatsCounter(
+    supabase_writer,
+    flush_interval=float(os.environ.get("GROUP_STATS_FLUSH_INTERVAL", 5.0)),
+)
+
+RESTORE_CONCURRENCY = int(os.environ.get("RESTORE_CONCURRENCY", 10))
+
+# Shutdown: seconds sends in flight get to finish, clients get to disconnect,
+# and queued Supabase rows get to be shipped
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get("SHUTDOWN_DRAIN_TIMEOUT", 10.0))
+SHUTDOWN_DISCONNECT_TIMEOUT = float(os.environ.get("SHUTDOWN_DISCONNECT_TIMEOUT", 5.0))
+SHUTDOWN_FLUSH_TIMEOUT = float(os.environ.get("SHUTDOWN_FLUSH_TIMEOUT", 10.0))
+REGISTRY_CHECKPOINT_INTERVAL = float(os.environ.get("REGISTRY_CHECKPOINT_INTERVAL", 10.0))
+
+registry = BotRegistry(os.path.join(STATE_DIR, "registry.db"))
+
+# Per-bot and per-group counters in minute / hour / day buckets, flushed
+# with every checkpoint; sizes are how many buckets of each are kept
+timeseries = TimeSeriesStore(
+    os.path.join(STATE_DIR, "timeseries.db"),
+    minutes=int(os.environ.get("TIMESERIES_MINUTES", 1440)),
+    hours=int(os.environ.get("TIMESERIES_HOURS", 720)),
+    days=int(os.environ.get("TIMESERIES_DAYS", 365)),
+    group_hours=int(os.environ.get("TIMESERIES_GROUP_HOURS", 168)),
+    group_days=int(os.environ.get("TIMESERIES_GROUP_DAYS", 90)),
+)
+
+# Prometheus metrics (/metrics). Per-bot series are labelled with the bot id
+# (at most METRICS_MAX_BOTS bots, the rest share bot="_other"); with
+# METRICS_PER_BOT=false every bot reports under bot="all"
+METRICS_PER_BOT = os.environ.get("METRICS_PER_BOT", "true").lower() not in ("0", "false", "no")
+METRICS_MAX_BOTS = int(os.environ.get("METRICS_MAX_BOTS", 1000))
+
+SEND_SECONDS = REGISTRY.histogram(
+    "telegram_send_seconds", "Latency of client.send_message", ["bot"], max_series=METRICS_MAX_BOTS
+)
+SEND_ERRORS = REGISTRY.counter(
+    "telegram_send_errors", "Failed sends by error type", ["bot", "error"], max_series=METRICS_MAX_BOTS * 4
+)
+FLOOD_WAIT_SECONDS = REGISTRY.histogram(
+    "telegram_flood_wait_seconds", "Waits requested by FloodWait errors", ["bot"],
+    buckets=WAIT_BUCKETS, max_series=METRICS_MAX_BOTS,
+)
+AUTO_REPLY_SECONDS = REGISTRY.histogram(
+    "auto_reply_seconds", "Latency of the auto-reply handler for DMs", ["bot"], max_series=METRICS_MAX_BOTS
+)
+SEND_DRIFT_SECONDS = REGISTRY.histogram(
+    "send_drift_seconds", "How late sends start after they are due", ["bot"],
+    buckets=LAG_BUCKETS, max_series=METRICS_MAX_BOTS,
+)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a sleeping task", buckets=LAG_BUCKETS
+)
+REGISTRY.gauge("running_bots", "Bots running on this worker", function=lambda: len(running_bots))
+REGISTRY.gauge("supabase_queue_rows", "Rows waiting for the Supabase writer", function=lambda: supabase_writer.pending)
+REGISTRY.gauge(
+    "supabase_spool_lag_seconds", "Age of the oldest row waiting in the Supabase spool",
+    function=lambda: supabase_writer.spool.lag if supabase_writer.spool is not None else 0.0,
+)
+loop_lag_probe = LoopLagProbe(LOOP_LAG_SECONDS, float(os.environ.get("METRICS_LOOP_LAG_INTERVAL", 0.5)))
+
+
+TASK_FAILURES = REGISTRY.counter(
+    "supervised_task_failures", "Exceptions in supervised background tasks", ["task"]
+)
+
+# Owns every per-bot task (message loop, client runner) and the app's own
+supervisor = TaskSupervisor(
+    restart_delay=float(os.environ.get("TASK_RESTART_DELAY", 5.0)),
+    max_restart_delay=float(os.environ.get("TASK_MAX_RESTART_DELAY", 300.0)),
+    observe_failure=lambda name: TASK_FAILURES.labels(name).inc(),
+)
+
+
+# Values bot_logs.log_type accepts; other kinds (auto_reply) are logged as info
+BOT_LOG_TYPES = ("info", "error", "warning")
+
+
+class BotMetrics:
+    """A bot's metric series, resolved once so the send path skips label lookups"""
+
+    __slots__ = ("label", "send", "flood_wait", "auto_reply", "drift")
+
+    def __init__(self, bot_id: str):
+        self.label = bot_id if METRICS_PER_BOT else "all"
+        self.send = SEND_SECONDS.labels(self.label)
+        self.flood_wait = FLOOD_WAIT_SECONDS.labels(self.label)
+        self.auto_reply = AUTO_REPLY_SECONDS.labels(self.label)
+        self.drift = SEND_DRIFT_SECONDS.labels(self.label)
+
+    def send_error(self, error: Exception):
+        SEND_ERRORS.labels(self.label, type(error).__name__).inc()
+        if isinstance(error, errors.FloodWaitError):
+            self.flood_wait.observe(error.seconds)
+
+
+def forget_bot_metrics(bot_id: str):
+    if METRICS_PER_BOT:
+        REGISTRY.forget("bot", bot_id)
+
+
+def create_session_client(session_string: str, api_id: int, api_hash: str):
+    return TelegramClient(StringSession(session_string), api_id, api_hash)
+
+
+def running_session_client(key: str) -> Optional[PooledClient]:
+    """Client of a running bot using this session, so endpoints don't open a second connection"""
+    for bot_data in running_bots.values():
+        if bot_data.session_key == key and bot_data.running:
+            return PooledClient(key, bot_data.client, me=bot_data.me, borrowed=True)
+    return None
+
+
+# Cached groups per account for /api/telegram/groups/fetch
+dialog_index = DialogIndex(
+    os.path.join(STATE_DIR, "dialogs.db"),
+    refresh_interval=float(os.environ.get("DIALOG_REFRESH_INTERVAL", 60.0)),
+    full_sync_interval=float(os.environ.get("DIALOG_FULL_SYNC_INTERVAL", 3600.0)),
+)
+
+# Peers (id -> access hash) per account, so bots send to InputPeers after a
+# restart instead of resolving every group again
+entity_store = EntityStore(os.path.join(STATE_DIR, "entities.db"))
+
+def stats_snapshot(bot_id: str) -> dict:
+    """Live stats of one bot as pushed by /api/telegram/bot/stats/stream"""
+    bot_data = running_bots.get(bot_id)
+    if bot_data is None:
+        return {"status": "stopped"}
+    engine = bot_data.engine
+    next_due = engine.next_due_at() if engine else None
+    return {
+        "status": "running" if bot_data.running else "stopping",
+        "messages_sent": bot_data.messages_sent,
+        "messages_failed": bot_data.messages_failed,
+        "auto_replies": bot_data.auto_replies,
+        "auto_replies_suppressed": bot_data.auto_replies_suppressed,
+        "current_group": engine.current_group if engine else None,
+        # Rounded so the value only changes when the schedule does
+        "next_send_at": round(next_due) if next_due is not None else None
+    }
+
 
-# Running bots
-running_bots = {}
+# Coalesced stats pushes to dashboard viewers
+stats_hub = StatsHub(stats_snapshot, interval=float(os.environ.get("STATS_PUSH_INTERVAL", 1.0)))
+MAX_STATS_SUBSCRIPTION = 1000
 
-# Bot statistics (in-memory, also synced to Supabase if available)
-bot_stats = {}
+def create_login_client(phone: str, api_id: int, api_hash: str):
+    return TelegramClient(
+        pending_auth.session_path(phone),
+        api_id,
+        api_hash,
+        device_model="Chrome",
+        system_version="Windows 10",
+        app_version="4.0",
+        lang_code="en"
+    )
+
+
+# Logins between /send-code and /verify-code (or /verify-password); abandoned
+# ones are disconnected and their session files deleted after PENDING_AUTH_TTL
+pending_auth = PendingAuthManager(
+    create_login_client,
+    registry,
+    SESSIONS_DIR,
+    ttl=float(os.environ.get("PENDING_AUTH_TTL", 600.0)),
+    max_pending=int(os.environ.get("PENDING_AUTH_MAX", 1000)),
+    sweep_interval=float(os.environ.get("PENDING_AUTH_SWEEP_INTERVAL", 30.0)),
+)
+REGISTRY.gauge("pending_logins", "Logins waiting for a code or 2FA password", function=lambda: len(pending_auth))
+
+# Connected clients for one-shot endpoints (validate / test send / fetch groups)
+client_pool = ClientPool(
+    create_session_client,
+    running_lookup=running_session_client,
+    max_size=int(os.environ.get("CLIENT_POOL_SIZE", 50)),
+    idle_timeout=float(os.environ.get("CLIENT_POOL_IDLE_TIMEOUT", 300.0)),
+)
+
+
+# Sharding (optional): with SHARD_WORKER_URL set, several workers share
+# STATE_DIR and each bot runs on exactly one of them (see sharding.py)
+SHARD_WORKER_URL = os.environ.get("SHARD_WORKER_URL")
+# Signs requests forwarded between workers; workers on one node share a
+# generated key in STATE_DIR, workers on several need the same SHARD_SECRET
+SHARD_SECRET = os.environ.get("SHARD_SECRET")
+
+
+async def registered_bot_ids() -> List[str]:
+    return await asyncio.to_thread(registry.bot_ids)
+
+
+async def start_registered_bot(bot_id: str):
+    """Start a registered bot on this worker, resuming its saved cycle"""
+    if lifecycle.state(bot_id) != STOPPED:
+        return
+    entry = await asyncio.to_thread(registry.load_bot, bot_id)
+    if entry is None:
+        return
+    try:
+        await launch_bot(StartBot(**entry["config"]), positions=entry["positions"], stats=entry["stats"])
+    except HTTPException as e:
+        if e.status_code == 400:
+            # Session no longer authorized - unregistered like in restore_bots,
+            # or every reconcile pass would try it again
+            registry_log.warning("Unregistering %s: %s", bot_id, e.detail)
+            await asyncio.to_thread(registry.remove_bot, bot_id)
+        raise
+
+
+coordinator = None
+if SHARD_WORKER_URL:
+    coordinator = ShardCoordinator(
+        LeaseTable(os.environ.get("SHARD_LEASE_DB", os.path.join(STATE_DIR, "leases.db"))),
+        worker_id=os.environ.get("SHARD_WORKER_ID") or f"{os.uname().nodename}-{os.getpid()}",
+        url=SHARD_WORKER_URL,
+        running=lambda: lifecycle.active(),
+        registered=registered_bot_ids,
+        start_local=start_registered_bot,
+        stop_local=lambda bot_id: hand_off_bot(bot_id),
+        secret=SHARD_SECRET.encode() if SHARD_SECRET else load_secret(os.path.join(STATE_DIR, "shard.key")),
+        heartbeat_interval=float(os.environ.get("SHARD_HEARTBEAT_INTERVAL", 2.0)),
+        worker_ttl=float(os.environ.get("SHARD_WORKER_TTL", 10.0)),
+        lease_ttl=float(os.environ.get("SHARD_LEASE_TTL", 30.0)),
+        concurrency=RESTORE_CONCURRENCY,
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_setup.start()
+    logger.info("Supabase logging %s", "enabled" if SUPABASE_URL and SUPABASE_KEY else "disabled")
+    await supabase_writer.start()
+    await group_stats.start()
+    await client_pool.start()
+    await stats_hub.start()
+    await loop_lag_probe.start()
+    await pending_auth.start()
+    lifecycle.open()
+    supervisor.spawn(None, "checkpoint", checkpoint_loop, restart=True)
+    if coordinator is not None:
+        # The coordinator starts the registered bots placed on this worker
+        await coordinator.start()
+    else:
+        supervisor.spawn(None, "restore", restore_bots)
+    try:
+        yield
+    finally:
+        await shutdown()
+        log_setup.stop()
+
+
+async def shutdown():
+    """Stop everything, in a time that doesn't grow with the number of bots"""
+    started = time.monotonic()
+    # No new bots (restore, rebalancing), no more checkpoints until the last one
+    lifecycle.close()
+    await supervisor.cancel(None)
+    # Every bot at once, and the other clients alongside; bots stay registered
+    # so the next start restores them
+    await asyncio.gather(shutdown_bots(), pending_auth.stop(), client_pool.stop())
+    await supervisor.stop()
+    await checkpoint_registry()
+    await timeseries.flush()
+    await loop_lag_probe.stop()
+    await stats_hub.stop()
+    # Last, so the rows logged by the final sends are shipped too
+    try:
+        await asyncio.wait_for(group_stats.stop(), SHUTDOWN_FLUSH_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(
+            "Group stats flush cut off after %.1fs; %d group counters not saved",
+            SHUTDOWN_FLUSH_TIMEOUT, group_stats.pending,
+        )
+    await supabase_writer.stop(timeout=max(0.0, SHUTDOWN_FLUSH_TIMEOUT - (time.monotonic() - started)))
+    if coordinator is not None:
+        await coordinator.stop()
+    logger.info("Shut down in %.2fs", time.monotonic() - started)
+
+
+async def shutdown_bots():
+    """Stop every bot concurrently, waiting for starts in progress first"""
+    bot_ids = lifecycle.active()
+    if not bot_ids:
+        return
+    stops = [
+        asyncio.ensure_future(lifecycle.stop(bot_id, functools.partial(close_bot, bot_id), kind="shutdown"))
+        for bot_id in bot_ids
+    ]
+    _, pending = await asyncio.wait(stops, timeout=SHUTDOWN_DRAIN_TIMEOUT + SHUTDOWN_DISCONNECT_TIMEOUT)
+    if pending:
+        logger.warning("%d of %d bots did not stop in time", len(pending), len(stops))
+    cancelled = sum(stop.result() or 0 for stop in stops if stop.done() and not stop.exception())
+    logger.info("Stopped %d bots; %d sends cancelled after %.0fs", len(stops), cancelled, SHUTDOWN_DRAIN_TIMEOUT)
+
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Running bots: bot_id -> BotState (config, client, counters, tasks)
+running_bots: Dict[str, BotState] = {}
+
+# Starts and stops, one at a time per bot (a bot is in running_bots from the
+# end of its start until the end of its stop)
+lifecycle = BotLifecycle()
+
+# Progress of restoring registered bots at startup
+restore_status = {"total": 0, "restored": 0, "failed": 0, "seconds": None}
 
 class SendCode(BaseModel):
     api_id: int
@@ -63,20 +449,53 @@ class StartBot(BaseModel):
     phone_number: str
     session_string: str
     message_template: str = "Hello!"
-    min_delay: int = 20
-    max_delay: int = 40
+    min_delay: int = Field(20, ge=0)
+    max_delay: int = Field(40, ge=0)
     group_ids: List[int] = []
     auto_reply_enabled: bool = True
     auto_reply_message: str = "To jest tylko bot."
+    # Seconds before the same sender gets another auto-reply (0 = reply to every DM)
+    auto_reply_cooldown: int = Field(600, ge=0)
+    # Pacing: sends start every min_delay..max_delay seconds per account,
+    # or at a fixed rate if messages_per_minute is set
+    messages_per_minute: Optional[float] = Field(None, gt=0)
+    min_group_interval: int = Field(0, ge=0)
+    max_concurrent_sends: int = Field(3, ge=1)
+    # Per-bot logging: level (e.g. "DEBUG") and share of per-message lines kept;
+    # defaults to LOG_LEVEL / LOG_SAMPLE_RATE
+    log_level: Optional[str] = None
+    log_sample_rate: Optional[float] = Field(None, ge=0, le=1)
 
 class StopBot(BaseModel):
     bot_id: str
 
+class UpdateBot(BaseModel):
+    """Fields of a running bot's StartBot config that can change without a restart"""
+    message_template: Optional[str] = None
+    min_delay: Optional[int] = Field(None, ge=0)
+    max_delay: Optional[int] = Field(None, ge=0)
+    group_ids: Optional[List[int]] = None
+    auto_reply_enabled: Optional[bool] = None
+    auto_reply_message: Optional[str] = None
+    auto_reply_cooldown: Optional[int] = Field(None, ge=0)
+    messages_per_minute: Optional[float] = Field(None, gt=0)
+    min_group_interval: Optional[int] = Field(None, ge=0)
+    max_concurrent_sends: Optional[int] = Field(None, ge=1)
+    log_level: Optional[str] = None
+    log_sample_rate: Optional[float] = Field(None, ge=0, le=1)
+
+# Changing these re-times the next send; the rest apply as the engine reads them
+PACING_FIELDS = ("min_delay", "max_delay", "messages_per_minute")
+
 class FetchGroups(BaseModel):
     bot_id: str
     api_id: int
     api_hash: str
     session_string: str
+    offset: int = 0
+    limit: Optional[int] = None
+    stream: bool = False  # NDJSON: one group per line, then a summary line
+    refresh: bool = False  # wait for a fresh sync instead of answering from the index
 
 class TestMessage(BaseModel):
     api_id: int
@@ -88,101 +507,48 @@ class TestMessage(BaseModel):
 
 
 async def log_to_supabase(table: str, data: dict):
-    """Log data to Supabase if configured"""
+    """Queue a row for Supabase if configured (written in batches in the background)"""
     if not SUPABASE_URL or not SUPABASE_KEY:
         return
     
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{SUPABASE_URL}/rest/v1/{table}",
-                json=data,
-                headers={
-                    "apikey": SUPABASE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_KEY}",
-                    "Content-Type": "application/json",
-                    "Prefer": "return=minimal"
-                },
-                timeout=10.0
-            )
-            if response.status_code not in [200, 201, 204]:
-                print(f"[SUPABASE] Log failed: {response.status_code} - {response.text}")
-    except Exception as e:
-        print(f"[SUPABASE] Log error: {e}")
+    if table == "bot_logs" and data.get("log_type") not in BOT_LOG_TYPES:
+        # bot_logs.log_type is CHECKed against these (scripts/001_create_bots_tables.sql)
+        data = {**data, "log_type": "info"}
+    
+    supabase_writer.enqueue(table, data)
 
 
 async def update_group_stats(bot_id: str, group_id: int):
-    """Update message count for a group in Supabase"""
+    """Count a sent message for a group (flushed to Supabase periodically)"""
     if not SUPABASE_URL or not SUPABASE_KEY:
         return
     
-    try:
-        async with httpx.AsyncClient() as client:
-            # First get current stats
-            response = await client.get(
-                f"{SUPABASE_URL}/rest/v1/bot_groups?bot_id=eq.{bot_id}&group_id=eq.{group_id}",
-                headers={
-                    "apikey": SUPABASE_KEY,
-                    "Authorization": f"Bearer {SUPABASE_KEY}",
-                },
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data:
-                    # Update existing
-                    current_count = data[0].get("messages_sent", 0) or 0
-                    await client.patch(
-                        f"{SUPABASE_URL}/rest/v1/bot_groups?bot_id=eq.{bot_id}&group_id=eq.{group_id}",
-                        json={
-                            "messages_sent": current_count + 1,
-                            "last_message_at": datetime.utcnow().isoformat()
-                        },
-                        headers={
-                            "apikey": SUPABASE_KEY,
-                            "Authorization": f"Bearer {SUPABASE_KEY}",
-                            "Content-Type": "application/json",
-                        },
-                        timeout=10.0
-                    )
-    except Exception as e:
-        print(f"[SUPABASE] Update group stats error: {e}")
+    group_stats.add(bot_id, group_id)
 
 
 @app.post("/send-code")
 async def send_code(data: SendCode):
     """Send verification code to phone"""
-    session_path = f"{SESSIONS_DIR}/session_{data.phone}"
-
-    client = TelegramClient(
-        session_path,
-        data.api_id,
-        data.api_hash,
-        device_model="Chrome",
-        system_version="Windows 10",
-        app_version="4.0",
-        lang_code="en"
-    )
-
-    await client.connect()
+    client = create_login_client(data.phone, data.api_id, data.api_hash)
 
     try:
-        await client.send_code_request(data.phone)
+        await client.connect()
+        sent = await client.send_code_request(data.phone)
     except errors.PhoneNumberInvalidError:
+        await client.disconnect()
         raise HTTPException(400, "Nieprawidłowy numer telefonu")
     except errors.FloodWaitError as e:
+        await client.disconnect()
         raise HTTPException(429, f"Zbyt wiele prób. Odczekaj {e.seconds} sekund.")
     except errors.ApiIdInvalidError:
+        await client.disconnect()
         raise HTTPException(400, "Nieprawidłowy API ID lub API Hash")
     except Exception as e:
+        await client.disconnect()
         raise HTTPException(500, str(e))
 
-    clients[data.phone] = {
-        'client': client,
-        'api_id': data.api_id,
-        'api_hash': data.api_hash
-    }
+    # Replaces (and disconnects) an earlier login for the same phone
+    await pending_auth.put(data.phone, client, data.api_id, data.api_hash, sent.phone_code_hash)
     
     return {
         "status": "CODE_SENT",
@@ -192,17 +558,16 @@ async def send_code(data: SendCode):
 @app.post("/verify-code")
 async def verify_code(data: VerifyCode):
     """Verify the received code"""
-    if data.phone not in clients:
-        raise HTTPException(400, "Brak sesji. Wyślij kod ponownie.")
-
-    client_data = clients[data.phone]
-    client = client_data['client']
-
     try:
-        await client.sign_in(data.phone, data.code)
+        login = await pending_auth.get(data.phone)
+        if login is None:
+            raise HTTPException(400, "Brak sesji. Wyślij kod ponownie.")
+        client = login.client
+
+        await client.sign_in(data.phone, data.code, phone_code_hash=login.phone_code_hash)
         
         session_string = StringSession.save(client.session)
-        del clients[data.phone]
+        await pending_auth.finish(data.phone)
         
         return {
             "status": "LOGGED_IN",
@@ -211,28 +576,30 @@ async def verify_code(data: VerifyCode):
     except errors.PhoneCodeInvalidError:
         raise HTTPException(400, "Nieprawidłowy kod")
     except errors.PhoneCodeExpiredError:
-        del clients[data.phone]
+        await pending_auth.finish(data.phone, CODE_EXPIRED)
         raise HTTPException(400, "Kod wygasł. Wyślij nowy kod.")
     except errors.SessionPasswordNeededError:
         return {
             "status": "PASSWORD_REQUIRED",
             "info": "Konto ma włączone 2FA. Wprowadź hasło."
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
 @app.post("/verify-password")
 async def verify_password(data: VerifyPassword):
     """Verify 2FA password"""
-    if data.phone not in clients:
-        raise HTTPException(400, "Brak sesji. Zacznij od początku.")
-
-    client = clients[data.phone]['client']
-
     try:
+        login = await pending_auth.get(data.phone)
+        if login is None:
+            raise HTTPException(400, "Brak sesji. Zacznij od początku.")
+        client = login.client
+
         await client.sign_in(password=data.password)
         session_string = StringSession.save(client.session)
-        del clients[data.phone]
+        await pending_auth.finish(data.phone)
         
         return {
             "status": "LOGGED_IN",
@@ -240,9 +607,48 @@ async def verify_password(data: VerifyPassword):
         }
     except errors.PasswordHashInvalidError:
         raise HTTPException(400, "Nieprawidłowe hasło 2FA")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, str(e))
 
+# Errors after which a session file can never log in; anything else
+# (network, timeouts, cancellation) leaves it for another try
+DEAD_SESSION_ERRORS = (
+    errors.AuthKeyUnregisteredError,
+    errors.AuthKeyDuplicatedError,
+    errors.AuthKeyInvalidError,
+    errors.SessionRevokedError,
+    errors.SessionExpiredError,
+    errors.UserDeactivatedError,
+    errors.UserDeactivatedBanError,
+)
+
+
+async def import_session_file(path: str, api_id: int, api_hash: str) -> str:
+    """Session string of a .session file on disk; the file is removed if
+    it isn't a session or its session is dead (SessionNotAuthorized)"""
+    try:
+        client = TelegramClient(path[:-len(SESSION_SUFFIX)], api_id, api_hash)
+    except sqlite3.DatabaseError:
+        await asyncio.to_thread(remove_file, path)
+        raise InvalidUpload("Plik nie jest sesją Telethon")
+    try:
+        await client.connect()
+        if not await client.is_user_authorized():
+            raise SessionNotAuthorized()
+        return StringSession.save(client.session)
+    except DEAD_SESSION_ERRORS as e:
+        dead = e
+    except SessionNotAuthorized as e:
+        dead = e
+    finally:
+        await client.disconnect()
+    await asyncio.to_thread(remove_file, path)
+    if isinstance(dead, SessionNotAuthorized):
+        raise dead
+    raise SessionNotAuthorized() from dead
+
 @app.post("/import-session")
 async def import_session(
     session_file: UploadFile = File(...),
@@ -251,55 +657,79 @@ async def import_session(
     phone: str = Form(...)
 ):
     """Import existing .session file"""
+    if not valid_phone(phone):
+        raise HTTPException(400, "Nieprawidłowy numer telefonu")
     try:
-        session_path = f"{SESSIONS_DIR}/session_{phone}.session"
-        
-        with open(session_path, "wb") as f:
-            content = await session_file.read()
-            f.write(content)
-        
-        client = TelegramClient(
-            f"{SESSIONS_DIR}/session_{phone}",
-            api_id,
-            api_hash
-        )
-        
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            os.remove(session_path)
-            raise HTTPException(400, "Sesja wygasła lub jest nieprawidłowa")
-        
-        session_string = StringSession.save(client.session)
-        await client.disconnect()
+        session_path = session_file_path(SESSIONS_DIR, phone)
+        await save_upload(session_file, session_path, max_bytes=MAX_SESSION_BYTES)
+        session_string = await import_session_file(session_path, api_id, api_hash)
         
         return {
             "status": "IMPORTED",
             "session_string": session_string,
             "info": "Sesja zaimportowana pomyślnie!"
         }
-    except HTTPException:
-        raise
+    except SessionNotAuthorized:
+        raise HTTPException(400, "Sesja wygasła lub jest nieprawidłowa")
+    except InvalidUpload as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         raise HTTPException(500, f"Błąd importu: {str(e)}")
 
+async def import_one(item: ImportItem, api_id: int, api_hash: str) -> dict:
+    """Result line of one session in /import-sessions"""
+    result = {"index": item.index, "phone": item.phone}
+    if item.error is not None:
+        return {**result, "status": "ERROR", "detail": item.error}
+    try:
+        if item.path is not None:
+            session_string = await import_session_file(item.path, api_id, api_hash)
+            return {**result, "status": "IMPORTED", "session_string": session_string}
+        async with client_pool.session(item.session_string, api_id, api_hash) as pooled:
+            me = await pooled.get_me()
+        return {
+            **result,
+            "status": "VALID",
+            "user": {"id": me.id, "first_name": me.first_name, "phone": me.phone}
+        }
+    except SessionNotAuthorized:
+        return {**result, "status": "INVALID", "detail": "Sesja wygasła"}
+    except Exception as e:
+        return {**result, "status": "ERROR", "detail": str(e)}
+
+async def stream_import(items, api_id: int, api_hash: str):
+    counts = dict.fromkeys(("IMPORTED", "VALID", "INVALID", "ERROR"), 0)
+    try:
+        async for result in run_bounded(
+            items, functools.partial(import_one, api_id=api_id, api_hash=api_hash), IMPORT_CONCURRENCY
+        ):
+            counts[result["status"]] += 1
+            yield ndjson_line(result)
+    except InvalidUpload as e:
+        yield ndjson_line({"status": "ERROR", "detail": str(e), "total": sum(counts.values())})
+        return
+    logger.info("Bulk import: %s", counts)
+    yield ndjson_line({"status": "SUCCESS", "total": sum(counts.values()), **{k.lower(): v for k, v in counts.items()}})
+
+@app.post("/import-sessions")
+async def import_sessions(
+    sessions: UploadFile = File(...),
+    api_id: int = Form(...),
+    api_hash: str = Form(...)
+):
+    """Import a zip of .session files or NDJSON of sessions; one result line per session as it is checked"""
+    try:
+        items = await open_upload(sessions, SESSIONS_DIR, IMPORT_MAX_SESSIONS)
+    except InvalidUpload as e:
+        raise HTTPException(400, str(e))
+    return StreamingResponse(stream_import(items, api_id, api_hash), media_type="application/x-ndjson")
+
 @app.post("/validate-session")
 async def validate_session(api_id: int = Form(...), api_hash: str = Form(...), session_string: str = Form(...)):
     """Validate a string session"""
     try:
-        client = TelegramClient(
-            StringSession(session_string),
-            api_id,
-            api_hash
-        )
-        
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            raise HTTPException(400, "Sesja wygasła")
-        
-        me = await client.get_me()
-        await client.disconnect()
+        async with client_pool.session(session_string, api_id, api_hash) as pooled:
+            me = await pooled.get_me()
         
         return {
             "status": "VALID",
@@ -309,8 +739,8 @@ async def validate_session(api_id: int = Form(...), api_hash: str = Form(...), s
                 "phone": me.phone
             }
         }
-    except HTTPException:
-        raise
+    except SessionNotAuthorized:
+        raise HTTPException(400, "Sesja wygasła")
     except Exception as e:
         raise HTTPException(400, f"Nieprawidłowa sesja: {str(e)}")
 
@@ -319,114 +749,173 @@ async def validate_session(api_id: int = Form(...), api_hash: str = Form(...), s
 async def send_test_message(data: TestMessage):
     """Send a test message to a specific group"""
     try:
-        client = TelegramClient(
-            StringSession(data.session_string),
-            data.api_id,
-            data.api_hash
-        )
-        
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            raise HTTPException(400, "Session expired")
-        
-        # Send message
-        await client.send_message(data.group_id, data.message)
-        
-        await client.disconnect()
+        async with client_pool.session(data.session_string, data.api_id, data.api_hash) as pooled:
+            # Send message
+            await pooled.client.send_message(data.group_id, data.message)
         
         return {
             "status": "SENT",
             "group_id": data.group_id,
             "message": data.message[:50] + "..." if len(data.message) > 50 else data.message
         }
-    except HTTPException:
-        raise
+    except SessionNotAuthorized:
+        raise HTTPException(400, "Session expired")
     except Exception as e:
         raise HTTPException(500, f"Error sending message: {str(e)}")
 
 
-# Start a bot with messaging
-@app.post("/api/telegram/bot/start")
-async def start_bot(data: StartBot):
-    """Start a bot with messaging and auto-reply"""
+async def launch_bot(data: StartBot, positions: Optional[dict] = None, stats: Optional[dict] = None) -> bool:
+    """Start a bot unless it is running already; returns whether it was started"""
+    return await lifecycle.start(data.bot_id, functools.partial(connect_bot, data, positions, stats))
+
+
+async def connect_bot(data: StartBot, positions: Optional[dict] = None, stats: Optional[dict] = None) -> bool:
+    """Connect a bot's client and start its message loop and auto-reply (the lifecycle's start)"""
+    try:
+        log = log_setup.bot_logger(data.bot_id, level=data.log_level, sample_rate=data.log_sample_rate)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    # Create client from session string
+    client = TelegramClient(
+        StringSession(data.session_string),
+        data.api_id,
+        data.api_hash,
+        device_model="Chrome",
+        system_version="Windows 10",
+        app_version="4.0"
+    )
+    
     try:
-        # Check if bot already running
-        if data.bot_id in running_bots:
-            return {"status": "ALREADY_RUNNING", "bot_id": data.bot_id}
-        
-        # Create client from session string
-        client = TelegramClient(
-            StringSession(data.session_string),
-            data.api_id,
-            data.api_hash,
-            device_model="Chrome",
-            system_version="Windows 10",
-            app_version="4.0"
-        )
-        
         await client.connect()
-        
         if not await client.is_user_authorized():
             raise HTTPException(400, "Session expired, please re-authenticate")
+        # Resolve the account once; the auto-reply handler compares against it
+        me = await client.get_me()
         
-        bot_stats[data.bot_id] = {
-            "messages_sent": 0,
-            "messages_failed": 0,
-            "auto_replies": 0,
-            "started_at": datetime.utcnow().isoformat()
-        }
-        
-        # Log bot start to Supabase
-        await log_to_supabase("bot_logs", {
-            "bot_id": data.bot_id,
-            "log_type": "info",
-            "message": f"Bot started with {len(data.group_ids)} groups, auto-reply: {data.auto_reply_enabled}"
-        })
-        
-        if data.auto_reply_enabled and data.auto_reply_message:
-            @client.on(events.NewMessage(incoming=True))
-            async def auto_reply_handler(event):
-                """Handle incoming messages and auto-reply"""
-                try:
-                    # Don't reply to channels or own messages
-                    if event.is_channel and not event.is_group:
-                        return
-                    
-                    # Don't reply to yourself
-                    me = await client.get_me()
-                    if event.sender_id == me.id:
-                        return
-                    
-                    # Only reply to private messages (DMs)
-                    if event.is_private:
-                        print(f"[BOT {data.bot_id}] Received DM from {event.sender_id}: {event.text[:50] if event.text else 'no text'}...")
-                        await event.respond(data.auto_reply_message)
-                        print(f"[BOT {data.bot_id}] Sent auto-reply to {event.sender_id}")
-                        
-                        if data.bot_id in bot_stats:
-                            bot_stats[data.bot_id]["auto_replies"] += 1
-                        
-                        # Log auto-reply
-                        await log_to_supabase("bot_logs", {
-                            "bot_id": data.bot_id,
-                            "log_type": "auto_reply",
-                            "message": f"Auto-reply sent to user {event.sender_id}"
-                        })
-                except Exception as e:
-                    print(f"[BOT {data.bot_id}] Auto-reply error: {e}")
-        
-        # Store bot info
-        running_bots[data.bot_id] = {
-            "client": client,
-            "config": data,
-            "running": True
-        }
-        
-        # Start message loop in background (for group messages)
-        asyncio.create_task(bot_message_loop(data.bot_id))
-        
-        asyncio.create_task(client.run_until_disconnected())
+        account = session_key(data.session_string)
+        peers = await asyncio.to_thread(entity_store.input_peers, account, data.group_ids)
+        missing = len(set(data.group_ids)) - len(peers)
+        # Earlier buckets, so counting continues the stored history
+        await timeseries.load(data.bot_id)
+    except BaseException:
+        # Don't leave a connection behind for a bot that never started
+        await client.disconnect()
+        raise
+    
+    logs = BotLogBuffer(LOG_BUFFER_SIZE)
+    logs.append(INFO, detail=f"Bot started with {len(data.group_ids)} groups, auto-reply: {data.auto_reply_enabled}")
+    
+    # Log bot start to Supabase
+    await log_to_supabase("bot_logs", {
+        "bot_id": data.bot_id,
+        "log_type": "info",
+        "message": f"Bot started with {len(data.group_ids)} groups, auto-reply: {data.auto_reply_enabled}"
+    })
+    
+    bot_data = BotState(
+        data.bot_id,
+        data,
+        client,
+        account,
+        me,
+        peers,
+        log,
+        logs,
+        BotMetrics(data.bot_id),
+        ReplyCooldown(AUTO_REPLY_CACHE_SIZE),
+        counters=stats
+    )
+    bot_data.reply_handler = set_auto_reply(client, data, None)
+    
+    # Keep the account's dialog index current between refreshes
+    client.add_event_handler(
+        functools.partial(dialog_update_handler, data.bot_id),
+        events.ChatAction()
+    )
+    
+    bot_data.engine = SendEngine(
+        data.bot_id,
+        send=functools.partial(send_to_group, bot_data),
+        get_config=bot_data.current_config,
+        positions=positions,
+        observe_drift=bot_data.metrics.drift.observe,
+        retry_delay=GROUP_RETRY_DELAY,
+        max_retry_delay=GROUP_MAX_RETRY_DELAY,
+        quarantine_time=GROUP_QUARANTINE_TIME,
+        observe_quarantine=functools.partial(group_quarantined, bot_data)
+    )
+    
+    # Store bot info
+    running_bots[data.bot_id] = bot_data
+    
+    stats_hub.touch(data.bot_id)
+    
+    if missing and dialog_index.needs_refresh(account):
+        # One dialog walk resolves them all (and fills the store), instead of
+        # a lookup per group on the first cycle
+        log.info("%d of %d groups not in the entity store, walking dialogs", missing, len(set(data.group_ids)))
+        supervisor.spawn(data.bot_id, "warm_peers", functools.partial(warm_peers, data.bot_id))
+    
+    # Message loop (group messages) and update receiver, restarted if they fail
+    bot_data.loop_task = supervisor.spawn(
+        data.bot_id, "message_loop", functools.partial(bot_message_loop, data.bot_id), restart=True
+    )
+    bot_data.client_task = supervisor.spawn(
+        data.bot_id, "client", functools.partial(run_bot_client, data.bot_id), restart=True
+    )
+    return True
+
+
+def set_auto_reply(client, config: StartBot, handler):
+    """Register or remove the auto-reply handler to match `config`; returns the handler in use"""
+    wanted = bool(config.auto_reply_enabled and config.auto_reply_message)
+    if wanted and handler is None:
+        # The handler reads the message and cooldown from the current config
+        handler = functools.partial(auto_reply_handler, config.bot_id)
+        client.add_event_handler(handler, events.NewMessage(incoming=True))
+    elif not wanted and handler is not None:
+        client.remove_event_handler(handler)
+        handler = None
+    return handler
+
+
+def forwarded_by_peer(request: Request) -> bool:
+    """Whether another worker passed the request on to be handled here (a
+    client can't skip the ownership check by setting the header itself)"""
+    return coordinator.is_forwarded(request.headers.get(FORWARDED_HEADER))
+
+
+async def forward_to_owner(request: Request, bot_id: str, placing: bool = False, body: Optional[dict] = None):
+    """Response of the worker that owns the bot, or None to handle the request here"""
+    if coordinator is None or forwarded_by_peer(request):
+        return None
+    url = await coordinator.route(bot_id, placing)
+    if url is None:
+        return None
+    try:
+        response = await coordinator.forward(
+            url, request.method, request.url.path, params=dict(request.query_params), json=body
+        )
+    except Exception as e:
+        raise HTTPException(503, f"Worker for bot {bot_id} is unavailable: {e}")
+    return JSONResponse(response.json(), status_code=response.status_code)
+
+
+# Start a bot with messaging
+@app.post("/api/telegram/bot/start")
+async def start_bot(data: StartBot, request: Request):
+    """Start a bot with messaging and auto-reply"""
+    forwarded = await forward_to_owner(request, data.bot_id, placing=True, body=data.dict())
+    if forwarded is not None:
+        return forwarded
+    
+    try:
+        # Concurrent starts of the bot share one; a start during a stop runs after it
+        if not await lifecycle.start(data.bot_id, functools.partial(start_new_bot, data)):
+            if lifecycle.closed:
+                raise HTTPException(503, "Shutting down")
+            return {"status": "ALREADY_RUNNING", "bot_id": data.bot_id}
         
         return {
             "status": "STARTED",
@@ -440,225 +929,856 @@ async def start_bot(data: StartBot):
         raise HTTPException(500, str(e))
 
 
-async def bot_message_loop(bot_id: str):
-    """Background task to send messages"""
-    import random
+async def start_new_bot(data: StartBot) -> bool:
+    """Lease, connect and register a bot started through the API (the lifecycle's start)"""
+    # Another worker may have taken the bot since routing
+    if coordinator is not None and not await coordinator.acquire(data.bot_id):
+        return False
+    try:
+        await connect_bot(data)
+    except BaseException:
+        if coordinator is not None:
+            await coordinator.release(data.bot_id)
+        raise
     
-    print(f"[BOT {bot_id}] Message loop started")
-    print(f"[SUPABASE CONFIG] URL: {SUPABASE_URL is not None}, KEY: {SUPABASE_KEY is not None}")
+    # Remember the bot so it is restored after a restart
+    await asyncio.to_thread(registry.save_bot, data.bot_id, data.dict(), True)
+    return True
+
+
+async def restore_bots():
+    """Restart the bots recorded in the registry, a few at a time"""
+    saved = await asyncio.to_thread(registry.load_bots)
+    if not saved:
+        return
     
-    while bot_id in running_bots and running_bots[bot_id]["running"]:
-        try:
-            bot_data = running_bots[bot_id]
-            client = bot_data["client"]
-            config = bot_data["config"]
-            
-            if config.group_ids:
-                for group_id in config.group_ids:
-                    try:
-                        await client.send_message(group_id, config.message_template)
-                        print(f"[BOT {bot_id}] ✅ Sent message to {group_id}")
-                        
-                        if bot_id in bot_stats:
-                            bot_stats[bot_id]["messages_sent"] += 1
-                        
-                        # Log message to Supabase
-                        print(f"[BOT {bot_id}] Logging to Supabase message_logs...")
-                        await log_to_supabase("message_logs", {
-                            "bot_id": bot_id,
-                            "group_id": str(group_id),
-                            "message_text": config.message_template[:200],
-                            "status": "sent",
-                            "sent_at": datetime.utcnow().isoformat()
-                        })
-                        print(f"[BOT {bot_id}] ✅ Logged to Supabase")
-                        
-                        # Update group stats
-                        await update_group_stats(bot_id, group_id)
-                        
-                    except Exception as e:
-                        print(f"[BOT {bot_id}] ❌ Error sending to {group_id}: {e}")
-                        
-                        if bot_id in bot_stats:
-                            bot_stats[bot_id]["messages_failed"] += 1
-                        
-                        # Log error
-                        await log_to_supabase("message_logs", {
-                            "bot_id": bot_id,
-                            "group_id": str(group_id),
-                            "message_text": config.message_template[:200],
-                            "status": "error",
-                            "error_message": str(e)[:500]
-                        })
-                    
-                    # Random delay between messages
-                    delay = random.randint(config.min_delay, config.max_delay)
-                    print(f"[BOT {bot_id}] Waiting {delay}s before next message...")
-                    await asyncio.sleep(delay)
-            else:
-                # No groups, just wait
-                await asyncio.sleep(60)
-                
-        except Exception as e:
-            print(f"[BOT {bot_id}] Loop error: {e}")
-            await asyncio.sleep(30)
+    restore_status.update(total=len(saved), restored=0, failed=0, seconds=None)
+    registry_log.info("Restoring %d bots (concurrency %d)", len(saved), RESTORE_CONCURRENCY)
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
     
-    print(f"[BOT {bot_id}] Message loop stopped")
+    async def restore(entry):
+        config = StartBot(**entry["config"])
+        async with semaphore:
+            try:
+                await launch_bot(config, positions=entry["positions"], stats=entry["stats"])
+                restore_status["restored"] += 1
+            except HTTPException as e:
+                restore_status["failed"] += 1
+                registry_log.warning("Could not restore %s: %s", config.bot_id, e.detail)
+                if e.status_code == 400:
+                    # Session no longer authorized - it won't come back on its own
+                    await asyncio.to_thread(registry.remove_bot, config.bot_id)
+            except Exception as e:
+                restore_status["failed"] += 1
+                registry_log.warning("Could not restore %s: %s", config.bot_id, e)
+    
+    await asyncio.gather(*(restore(entry) for entry in saved))
+    restore_status["seconds"] = round(time.monotonic() - started, 3)
+    registry_log.info("Restored %d/%d bots in %ss", restore_status["restored"], len(saved), restore_status["seconds"])
 
 
-# Stop a running bot
-@app.post("/api/telegram/bot/stop")
-async def stop_bot(data: StopBot):
-    """Stop a running bot"""
-    if data.bot_id not in running_bots:
-        return {"status": "NOT_RUNNING", "bot_id": data.bot_id}
+async def checkpoint_registry():
+    """Persist cycle positions and counters of running bots"""
+    bots = running_bots
+    if coordinator is not None:
+        # A bot whose lease may have passed to another worker is left to the
+        # new owner's checkpoints
+        bots = {bot_id: bot_data for bot_id, bot_data in bots.items() if coordinator.holds_lease(bot_id)}
+    positions = {
+        bot_id: bot_data.engine.take_dirty_positions()
+        for bot_id, bot_data in bots.items()
+        if bot_data.engine
+    }
+    stats = {bot_id: bot_data.stats() for bot_id, bot_data in bots.items()}
+    if not positions and not stats:
+        return
+    try:
+        await asyncio.to_thread(registry.checkpoint, positions, stats)
+    except Exception as e:
+        registry_log.error("Checkpoint error: %s", e)
+
+
+async def checkpoint_loop():
+    while True:
+        await asyncio.sleep(REGISTRY_CHECKPOINT_INTERVAL)
+        await checkpoint_registry()
+        await timeseries.flush()
+
+
+async def auto_reply_handler(bot_id: str, event):
+    """Handle incoming messages and auto-reply"""
+    # Cheap filters first: only incoming private messages (DMs) get a reply,
+    # so group and channel traffic returns before any awaited call
+    if not event.is_private or event.out:
+        return
+    
+    bot_data = running_bots.get(bot_id)
+    if not bot_data:
+        return
     
     try:
-        bot_data = running_bots[data.bot_id]
-        bot_data["running"] = False
+        # Don't reply to yourself
+        me = bot_data.me
+        if me is not None and event.sender_id == me.id:
+            return
         
-        client = bot_data["client"]
-        await client.disconnect()
+        config = bot_data.config
+        log = bot_data.log
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Received DM from %s: %s", event.sender_id, event.text[:50] if event.text else "no text")
+        
+        # One reply per sender per cooldown; checked before awaiting so a
+        # burst of messages from one contact can't race past it
+        cooldown = bot_data.reply_cooldown
+        if not cooldown.try_acquire(event.sender_id, config.auto_reply_cooldown):
+            bot_data.auto_replies_suppressed += 1
+            timeseries.add(bot_id, "auto_replies_suppressed")
+            stats_hub.touch(bot_id)
+            return
+        
+        started = time.perf_counter()
+        try:
+            await event.respond(config.auto_reply_message)
+        except Exception:
+            cooldown.release(event.sender_id)
+            raise
+        bot_data.metrics.auto_reply.observe(time.perf_counter() - started)
+        log.sampled(logging.INFO, "Sent auto-reply to %s", event.sender_id)
+        bot_data.logs.append(AUTO_REPLY, event.sender_id)
+        stats_hub.touch(bot_id)
         
+        bot_data.auto_replies += 1
+        timeseries.add(bot_id, "auto_replies")
+        
+        # Log auto-reply
         await log_to_supabase("bot_logs", {
-            "bot_id": data.bot_id,
-            "log_type": "info",
-            "message": "Bot stopped"
+            "bot_id": bot_id,
+            "log_type": "auto_reply",
+            "message": f"Auto-reply sent to user {event.sender_id}"
         })
+    except Exception as e:
+        bot_data.log.warning("Auto-reply error: %s", e)
+
+
+async def dialog_update_handler(bot_id: str, event):
+    """Apply group title changes, joins and leaves of this account to the dialog index"""
+    bot_data = running_bots.get(bot_id)
+    if not bot_data:
+        return
+    
+    try:
+        account = bot_data.session_key
+        group_id, _ = telethon_utils.resolve_id(event.chat_id)
+        me = bot_data.me
+        about_me = me is not None and me.id in (event.user_ids or [])
         
-        # Get final stats before removing
-        final_stats = bot_stats.get(data.bot_id, {})
+        if event.new_title:
+            await dialog_index.update_title(account, group_id, event.new_title)
+        elif about_me and (event.user_kicked or event.user_left):
+            await dialog_index.remove_group(account, group_id)
+        elif about_me and (event.user_joined or event.user_added):
+            dialog_index.mark_stale(account)
+    except Exception as e:
+        bot_data.log.warning("Dialog update error: %s", e)
+
+
+async def run_bot_client(bot_id: str):
+    """Keep the bot's client receiving updates until the bot stops.
+
+    Raises when the connection drops, so the supervisor reconnects it
+    (refreshing `me`) after its backoff.
+    """
+    bot_data = running_bots.get(bot_id)
+    if bot_data is None or not bot_data.running:
+        return
+    client = bot_data.client
+    if not client.is_connected():
+        await client.connect()
+        bot_data.me = await client.get_me()
+        bot_data.log.info("Reconnected")
+    await client.run_until_disconnected()
+    if bot_data.running and running_bots.get(bot_id) is bot_data:
+        raise ConnectionError("Client disconnected")
+
+
+async def warm_peers(bot_id: str):
+    """Walk the bot's dialogs into the entity store and pick up the peers it lacked"""
+    bot_data = running_bots.get(bot_id)
+    if bot_data is None:
+        return
+    config = bot_data.config
+    account = bot_data.session_key
+    fetch = FetchGroups(
+        bot_id=bot_id, api_id=config.api_id, api_hash=config.api_hash, session_string=config.session_string
+    )
+    try:
+        await dialog_index.refresh_once(account, functools.partial(refresh_dialogs, fetch, account, True))
+    except Exception as e:
+        bot_data.log.warning("Dialog walk for peers failed: %s", e)
+        return
+    peers = await asyncio.to_thread(entity_store.input_peers, account, config.group_ids)
+    if bot_id in running_bots:
+        running_bots[bot_id].peers.update(peers)
+
+
+async def learn_peer(bot_data: BotState, group_id: int):
+    """Keep the peer Telethon resolved for a bare group id"""
+    try:
+        peer = await bot_data.client.get_input_entity(group_id)
+    except Exception:
+        return
+    bot_data.peers[group_id] = peer
+    await asyncio.to_thread(entity_store.remember, bot_data.session_key, [peer])
+
+
+async def send_to_group(bot_data: BotState, group_id: int):
+    """Send the bot's message to one group and record the result"""
+    bot_id = bot_data.bot_id
+    client = bot_data.client
+    config = bot_data.config
+    log = bot_data.log
+    metrics = bot_data.metrics
+    if coordinator is not None:
+        # Never send once another worker may have taken the bot over; this
+        # isn't the group's failure, so the engine just stops
+        try:
+            coordinator.check_lease()
+        except LeaseExpired:
+            # Concurrent sends may all get here; one stop is enough
+            if supervisor.state(None, f"lease_expired:{bot_id}") != RUNNING:
+                log.warning("Lease may have expired; stopping the bot on this worker")
+                supervisor.spawn(
+                    None, f"lease_expired:{bot_id}", functools.partial(give_up_bot, bot_id), transient=True
+                )
+            raise StopSending()
+    # The engine picked a new current group and next due time
+    stats_hub.touch(bot_id)
+    
+    peers = bot_data.peers
+    peer = peers.get(group_id)
+    started = time.perf_counter()
+    try:
+        await client.send_message(peer if peer is not None else group_id, config.message_template)
+    except Exception as e:
+        metrics.send.observe(time.perf_counter() - started)
+        metrics.send_error(e)
+        if peer is not None and isinstance(e, (errors.ChannelInvalidError, errors.PeerIdInvalidError)):
+            # Stale access hash: resolve the bare id again next time
+            peers.pop(group_id, None)
+            await asyncio.to_thread(entity_store.forget, bot_data.session_key, group_id)
+        log.warning("Error sending to %s: %s", group_id, e, extra={"group_id": group_id})
+        bot_data.logs.append(FAILED, group_id, str(e))
+        stats_hub.touch(bot_id)
         
-        del running_bots[data.bot_id]
-        if data.bot_id in bot_stats:
-            del bot_stats[data.bot_id]
+        bot_data.messages_failed += 1
+        timeseries.add(bot_id, "messages_failed", group_id)
         
-        return {
-            "status": "STOPPED", 
-            "bot_id": data.bot_id,
-            "final_stats": final_stats
-        }
+        # Log error
+        await log_to_supabase("message_logs", {
+            "bot_id": bot_id,
+            "group_id": str(group_id),
+            "message_text": config.message_template[:200],
+            "status": "failed",
+            "error_message": str(e)[:500]
+        })
+        raise
+    
+    metrics.send.observe(time.perf_counter() - started)
+    if peer is None:
+        await learn_peer(bot_data, group_id)
+    log.sampled(logging.INFO, "Sent message to %s", group_id, extra={"group_id": group_id})
+    bot_data.logs.append(SENT, group_id)
+    stats_hub.touch(bot_id)
+    
+    bot_data.messages_sent += 1
+    timeseries.add(bot_id, "messages_sent", group_id)
+    
+    # Log message to Supabase
+    await log_to_supabase("message_logs", {
+        "bot_id": bot_id,
+        "group_id": str(group_id),
+        "message_text": config.message_template[:200],
+        "status": "sent",
+        "sent_at": datetime.utcnow().isoformat()
+    })
+    
+    # Update group stats
+    await update_group_stats(bot_id, group_id)
+
+
+def group_quarantined(bot_data: BotState, group_id: int, error: Exception):
+    bot_data.log.warning(
+        "Quarantined group %s after %s; retrying in %.0fs", group_id, type(error).__name__,
+        GROUP_QUARANTINE_TIME, extra={"group_id": group_id}
+    )
+    stats_hub.touch(bot_data.bot_id)
+
+
+async def bot_message_loop(bot_id: str):
+    """Run the bot's send engine until the bot stops (errors go to the supervisor)"""
+    bot_data = running_bots.get(bot_id)
+    if bot_data is None or not bot_data.running:
+        return
+    log = bot_data.log
+    log.info("Message loop started")
+    await bot_data.engine.run()
+    log.info("Message loop stopped")
+
+
+async def hand_off_bot(bot_id: str):
+    """Stop running a bot on this worker but keep it registered, so the
+    worker it now belongs to resumes it from the saved cycle position"""
+    await lifecycle.stop(bot_id, functools.partial(release_bot, bot_id), kind="hand_off")
+
+
+async def give_up_bot(bot_id: str):
+    """Stop a bot whose lease may have lapsed and release the lease if this
+    worker still holds it; the bot's worker (maybe this one) resumes it"""
+    await hand_off_bot(bot_id)
+    await coordinator.release(bot_id)
+
+
+async def halt_bot(bot_data: BotState, drain_timeout: Optional[float] = None) -> int:
+    """Stop the bot's loops, wait for them (sends in flight finish first, or
+    are cancelled after `drain_timeout` seconds), then disconnect its client.
+    Returns how many sends were cancelled."""
+    bot_data.running = False
+    cancelled = 0
+    if bot_data.engine:
+        bot_data.engine.wake()
+        if drain_timeout is not None:
+            cancelled = await bot_data.engine.drain(drain_timeout)
+    bot_data.logs.close()
+    await supervisor.cancel(bot_data.bot_id)
+    await bot_data.client.disconnect()
+    return cancelled
+
+
+async def close_bot(bot_id: str) -> int:
+    """The lifecycle's stop at shutdown: the bot stays registered, and in
+    running_bots for the final checkpoint; returns the sends cancelled"""
+    bot_data = running_bots[bot_id]
+    cancelled = await halt_bot(bot_data, drain_timeout=SHUTDOWN_DRAIN_TIMEOUT)
+    if cancelled:
+        bot_data.log.warning("Cancelled %d sends still in flight after %.0fs", cancelled, SHUTDOWN_DRAIN_TIMEOUT)
+    return cancelled
+
+
+async def release_bot(bot_id: str):
+    """The lifecycle's stop for a hand-off"""
+    bot_data = running_bots[bot_id]
+    try:
+        await halt_bot(bot_data)
+        await checkpoint_registry()
+    finally:
+        running_bots.pop(bot_id, None)
+        await timeseries.flush(bot_id, evict=True)
+        stats_hub.touch(bot_id)
+        forget_bot_metrics(bot_id)
+
+
+async def remove_bot(bot_id: str) -> dict:
+    """The lifecycle's stop for /stop: the bot is also unregistered and its
+    lease released; returns its final stats"""
+    bot_data = running_bots[bot_id]
+    try:
+        await halt_bot(bot_data)
+        await log_to_supabase("bot_logs", {
+            "bot_id": bot_id,
+            "log_type": "info",
+            "message": "Bot stopped"
+        })
+    finally:
+        # Cleaned up even if the teardown failed, so a new start begins afresh
+        # (history stays on disk, served by /timeseries after the stop)
+        await timeseries.flush(bot_id, evict=True)
+        await asyncio.to_thread(registry.remove_bot, bot_id)
+        running_bots.pop(bot_id, None)
+        stats_hub.touch(bot_id)
+        forget_bot_metrics(bot_id)
+        if coordinator is not None:
+            await coordinator.release(bot_id)
+    return bot_data.stats()
+
+
+# Stop a running bot
+@app.post("/api/telegram/bot/stop")
+async def stop_bot(data: StopBot, request: Request):
+    """Stop a running bot"""
+    forwarded = await forward_to_owner(request, data.bot_id, body=data.dict())
+    if forwarded is not None:
+        return forwarded
+    
+    try:
+        # Concurrent stops share one; a stop during a start runs after it
+        final_stats = await lifecycle.stop(data.bot_id, functools.partial(remove_bot, data.bot_id))
     except Exception as e:
-        # Force remove from running bots
-        if data.bot_id in running_bots:
-            del running_bots[data.bot_id]
-        if data.bot_id in bot_stats:
-            del bot_stats[data.bot_id]
         raise HTTPException(500, str(e))
+    if final_stats is None:
+        return {"status": "NOT_RUNNING", "bot_id": data.bot_id}
+    return {
+        "status": "STOPPED", 
+        "bot_id": data.bot_id,
+        "final_stats": final_stats
+    }
+
+
+@app.patch("/api/telegram/bot/config/{bot_id}")
+async def update_bot(bot_id: str, data: UpdateBot, request: Request):
+    """Change a running bot's config in place, keeping its connection, stats and cycle position"""
+    changes = data.dict(exclude_unset=True)
+    forwarded = await forward_to_owner(request, bot_id, body=changes)
+    if forwarded is not None:
+        return forwarded
+    
+    bot_data = running_bots.get(bot_id)
+    if bot_data is None or not bot_data.running:
+        return {"status": "NOT_RUNNING", "bot_id": bot_id}
+    
+    old = bot_data.config
+    try:
+        config = StartBot(**{**old.dict(), **changes})
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    changed = [name for name in changes if getattr(old, name) != getattr(config, name)]
+    if not changed:
+        return {"status": "UNCHANGED", "bot_id": bot_id}
+    
+    if "log_level" in changed or "log_sample_rate" in changed:
+        try:
+            log = log_setup.bot_logger(bot_id, level=config.log_level, sample_rate=config.log_sample_rate)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        bot_data.log = log
+    
+    # One assignment: the engine, sends and auto-replies read the config
+    # from here, so each sees either the old or the new one, never a mix
+    bot_data.config = config
+    bot_data.reply_handler = set_auto_reply(bot_data.client, config, bot_data.reply_handler)
+    bot_data.engine.reconfigure(respace=any(name in changed for name in PACING_FIELDS))
+    
+    message = f"Config updated: {', '.join(changed)}"
+    bot_data.log.info(message)
+    bot_data.logs.append(INFO, detail=message)
+    stats_hub.touch(bot_id)
+    
+    # Kept for restarts, without resetting positions or counters
+    await asyncio.to_thread(registry.save_bot, bot_id, config.dict())
+    await log_to_supabase("bot_logs", {"bot_id": bot_id, "log_type": "info", "message": message})
+    
+    return {
+        "status": "UPDATED",
+        "bot_id": bot_id,
+        "changed": changed,
+        "groups": len(config.group_ids),
+        "auto_reply": bot_data.reply_handler is not None
+    }
 
 
 @app.get("/api/telegram/bot/status/{bot_id}")
-async def bot_status(bot_id: str):
+async def bot_status(bot_id: str, request: Request):
     """Get bot status with statistics"""
-    if bot_id in running_bots:
-        stats = bot_stats.get(bot_id, {})
+    forwarded = await forward_to_owner(request, bot_id)
+    if forwarded is not None:
+        return forwarded
+    
+    bot_data = running_bots.get(bot_id)
+    state = lifecycle.state(bot_id)
+    if bot_data is not None and state != STOPPING:
+        engine = bot_data.engine
+        health = engine.group_health() if engine else {"quarantined": [], "retrying": []}
         return {
             "status": "running",
             "bot_id": bot_id,
-            "groups": len(running_bots[bot_id]["config"].group_ids),
-            "stats": stats
+            "groups": len(bot_data.config.group_ids),
+            "next_send_in": engine.next_due_in() if engine else None,
+            "uptime": round(bot_data.uptime, 3),
+            "stats": bot_data.stats(),
+            "quarantined": health["quarantined"],
+            "retrying": health["retrying"],
+            # Since this worker started the bot
+            "engine": engine.stats() if engine else None
         }
-    return {"status": "stopped", "bot_id": bot_id, "stats": {}}
+    # "starting" while connecting, "stopping" while its tasks wind down
+    return {"status": state, "bot_id": bot_id, "stats": {}}
+
+
+async def stream_stats(subscription):
+    try:
+        while True:
+            changes = await subscription.next(15.0)
+            if changes:
+                yield f"data: {json.dumps(changes)}\n\n"
+            else:
+                yield ": keepalive\n\n"
+    finally:
+        stats_hub.unsubscribe(subscription)
+
+
+async def stream_sharded_stats(request: Request, ids: List[str]):
+    """Merge the stats streams of every worker running one of the bots"""
+    by_worker = {}
+    for bot_id in ids:
+        by_worker.setdefault(await coordinator.route(bot_id), []).append(bot_id)
+    
+    changes = asyncio.Queue()
+    
+    async def pump_local(bot_ids):
+        subscription = stats_hub.subscribe(bot_ids)
+        try:
+            while True:
+                pending = await subscription.next()
+                await changes.put(pending)
+        finally:
+            stats_hub.unsubscribe(subscription)
+    
+    async def pump_remote(url, bot_ids):
+        buffer = b""
+        async for chunk in coordinator.forward_stream(url, request.url.path, params={"bot_ids": ",".join(bot_ids)}):
+            buffer += chunk
+            while b"\n\n" in buffer:
+                event, buffer = buffer.split(b"\n\n", 1)
+                for line in event.split(b"\n"):
+                    if line.startswith(b"data: "):
+                        await changes.put(json.loads(line[6:]))
+    
+    pumps = [
+        asyncio.create_task(pump_local(bot_ids) if url is None else pump_remote(url, bot_ids))
+        for url, bot_ids in by_worker.items()
+    ]
+    try:
+        while True:
+            try:
+                merged = await asyncio.wait_for(changes.get(), 15.0)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            while not changes.empty():
+                for bot_id, delta in changes.get_nowait().items():
+                    merged.setdefault(bot_id, {}).update(delta)
+            yield f"data: {json.dumps(merged)}\n\n"
+    finally:
+        for pump in pumps:
+            pump.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+
+
+@app.get("/api/telegram/bot/tasks/{bot_id}")
+async def bot_tasks(bot_id: str, request: Request):
+    """State, restarts, last error and busy / wall time of a bot's background tasks"""
+    forwarded = await forward_to_owner(request, bot_id)
+    if forwarded is not None:
+        return forwarded
+    
+    return {
+        "bot_id": bot_id,
+        "running": bot_id in running_bots,
+        "tasks": supervisor.tasks(bot_id)
+    }
+
+
+@app.get("/tasks")
+async def list_tasks(state: Optional[str] = None):
+    """Every supervised task on this worker; `stalled` lists running bots whose loops are not running"""
+    tasks = supervisor.tasks()
+    stalled = [
+        bot_id for bot_id, bot_data in running_bots.items()
+        if bot_data.loop_task is None or bot_data.loop_task.state != RUNNING
+        or bot_data.client_task is None or bot_data.client_task.state != RUNNING
+    ]
+    return {
+        "stats": supervisor.stats(),
+        "stalled": stalled,
+        "tasks": [task for task in tasks if state is None or task["state"] == state]
+    }
+
+
+@app.get("/api/telegram/bot/stats/stream")
+async def stream_bot_stats(bot_ids: str, request: Request):
+    """Server-sent events with stats changes for a comma-separated list of bots
+    
+    The first event has the full stats of every bot; later ones only the
+    fields that changed, at most once per STATS_PUSH_INTERVAL.
+    """
+    ids = [bot_id for bot_id in (b.strip() for b in bot_ids.split(",")) if bot_id]
+    if not ids:
+        raise HTTPException(400, "bot_ids required")
+    if len(ids) > MAX_STATS_SUBSCRIPTION:
+        raise HTTPException(400, f"At most {MAX_STATS_SUBSCRIPTION} bots per stream")
+    
+    if coordinator is not None and not forwarded_by_peer(request):
+        stream = stream_sharded_stats(request, ids)
+    else:
+        stream = stream_stats(stats_hub.subscribe(ids))
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/telegram/bot/stats/{bot_id}")
-async def get_bot_stats(bot_id: str):
+async def get_bot_stats(bot_id: str, request: Request):
     """Get detailed bot statistics"""
-    stats = bot_stats.get(bot_id, {
-        "messages_sent": 0,
-        "messages_failed": 0,
-        "auto_replies": 0,
-        "started_at": None
-    })
+    forwarded = await forward_to_owner(request, bot_id)
+    if forwarded is not None:
+        return forwarded
     
-    is_running = bot_id in running_bots
+    bot_data = running_bots.get(bot_id)
+    if bot_data is not None:
+        stats = bot_data.stats()
+    else:
+        stats = {counter: 0 for counter in COUNTERS}
+        stats["started_at"] = None
     
     return {
         "bot_id": bot_id,
-        "is_running": is_running,
+        "is_running": bot_data is not None,
         "stats": stats,
-        "uptime": None  # TODO: calculate from started_at
+        # Seconds since this worker started the bot
+        "uptime": round(bot_data.uptime, 3) if bot_data is not None else None
     }
 
 
+@app.get("/api/telegram/bot/timeseries/{bot_id}")
+async def get_bot_timeseries(
+    bot_id: str,
+    request: Request,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    resolution: Optional[str] = None,
+    group_id: Optional[int] = None
+):
+    """Counters of a bot (or one of its groups) per minute, hour or day
+    
+    `start` / `end` are unix seconds (default: the last 24h). Without
+    `resolution` the finest one that keeps `start` is used. Served from
+    local buckets, for stopped bots too.
+    """
+    forwarded = await forward_to_owner(request, bot_id)
+    if forwarded is not None:
+        return forwarded
+    
+    try:
+        return await timeseries.query(bot_id, start, end, resolution, group_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
 @app.get("/api/telegram/bot/logs/{bot_id}")
-async def get_bot_logs(bot_id: str, limit: int = 50):
-    """Get bot logs from memory (for running bots)"""
-    # This returns in-memory logs, the main logs are in Supabase
-    is_running = bot_id in running_bots
-    stats = bot_stats.get(bot_id, {})
+async def get_bot_logs(bot_id: str, request: Request, limit: int = 50, since: Optional[int] = None):
+    """Get recent bot logs from memory (for running bots)
+    
+    Without `since` returns the newest `limit` records; with it, the records
+    after that id. Pass the returned `next` as `since` to page forward.
+    """
+    forwarded = await forward_to_owner(request, bot_id)
+    if forwarded is not None:
+        return forwarded
+    
+    # Only the last LOG_BUFFER_SIZE records are kept, the full logs are in Supabase
+    bot_data = running_bots.get(bot_id)
+    stats = bot_data.stats() if bot_data else {}
+    logs = bot_data.logs.read(since, limit) if bot_data else []
     
     return {
         "bot_id": bot_id,
-        "is_running": is_running,
+        "is_running": bot_data is not None,
         "current_stats": stats,
+        "logs": logs,
+        "next": logs[-1]["id"] if logs else since,
+        "oldest": bot_data.logs.oldest if bot_data else None,
         "note": "Full logs are stored in Supabase message_logs and bot_logs tables"
     }
 
 
+async def stream_bot_logs(buffer: BotLogBuffer, since: Optional[int]):
+    cursor = buffer.seq if since is None else since
+    while True:
+        records = buffer.read(cursor, 100)
+        for record in records:
+            yield f"id: {record['id']}\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+        if records:
+            cursor = records[-1]["id"]
+            continue
+        if buffer.closed:
+            yield "event: stopped\ndata: {}\n\n"
+            return
+        if not await buffer.wait(15.0) and not buffer.closed:
+            yield ": keepalive\n\n"
+
+
+@app.get("/api/telegram/bot/logs/{bot_id}/stream")
+async def tail_bot_logs(
+    bot_id: str,
+    request: Request,
+    since: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None)
+):
+    """Server-sent events with each new log record (resumes after `since` / Last-Event-ID)"""
+    if coordinator is not None and not forwarded_by_peer(request):
+        url = await coordinator.route(bot_id)
+        if url is not None:
+            params = {"since": since if since is not None else last_event_id}
+            return StreamingResponse(
+                coordinator.forward_stream(url, request.url.path, params={k: v for k, v in params.items() if v is not None}),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+    
+    bot_data = running_bots.get(bot_id)
+    if bot_data is None:
+        raise HTTPException(404, "Bot is not running")
+    
+    return StreamingResponse(
+        stream_bot_logs(bot_data.logs, since if since is not None else last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/health")
 async def health():
     return {
         "status": "ok",
         "sessions_dir": SESSIONS_DIR,
         "running_bots": len(running_bots),
-        "supabase_configured": bool(SUPABASE_URL and SUPABASE_KEY)
+        "restore": restore_status,
+        "lifecycle": lifecycle.stats(),
+        "client_pool": client_pool.stats(),
+        "pending_auth": pending_auth.stats(),
+        "entity_store": entity_store.stats(),
+        "supabase_configured": bool(SUPABASE_URL and SUPABASE_KEY),
+        "supabase_writer": supabase_writer.stats(),
+        "group_stats": group_stats.stats(),
+        "timeseries": timeseries.stats(),
+        "logging": log_setup.stats(),
+        "stats_stream": stats_hub.stats(),
+        "metrics": REGISTRY.stats(),
+        "tasks": supervisor.stats(),
+        "shard": coordinator.stats() if coordinator is not None else None
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus exposition of this worker's metrics"""
+    # Rendered off the loop: with per-bot series the body runs to megabytes
+    body = await asyncio.to_thread(REGISTRY.render)
+    return PlainTextResponse(body, media_type=CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     return {"message": "Telegram Bot Backend", "version": "2.1"}
 
+async def refresh_dialogs(data: FetchGroups, account: str, full: bool = False, on_group=None):
+    """Sync the account's dialog index from Telegram"""
+    entities = []
+    
+    async def dialogs():
+        async for dialog in pooled.client.iter_dialogs():
+            entities.append(dialog.entity)
+            yield dialog
+    
+    async with client_pool.session(data.session_string, data.api_id, data.api_hash) as pooled:
+        await dialog_index.refresh(account, dialogs(), full=full, on_group=on_group)
+    # Every peer walked past, so bots of this account can send without resolving
+    await asyncio.to_thread(entity_store.remember, account, entities)
+
+
+def ndjson_line(item: dict) -> bytes:
+    return (json.dumps(item, ensure_ascii=False) + "\n").encode()
+
+
+async def stream_fresh_groups(data: FetchGroups, account: str):
+    """Stream groups as the dialog walk finds them (first fetch for an account)"""
+    queue = asyncio.Queue()
+    done = object()
+    
+    task = dialog_index.refresh_once(
+        account, functools.partial(refresh_dialogs, data, account, True, queue.put)
+    )
+    task.add_done_callback(lambda _: queue.put_nowait(done))
+    index = 0
+    limit_end = data.offset + data.limit if data.limit else None
+    while True:
+        item = await queue.get()
+        if item is done:
+            break
+        if index >= data.offset and (limit_end is None or index < limit_end):
+            yield ndjson_line(item)
+        index += 1
+    
+    try:
+        task.result()
+    except SessionNotAuthorized:
+        yield ndjson_line({"status": "ERROR", "detail": "Session expired"})
+        return
+    except Exception as e:
+        yield ndjson_line({"status": "ERROR", "detail": f"Error fetching groups: {str(e)}"})
+        return
+    
+    if index == 0:
+        # Another request's refresh won the race; serve what it indexed
+        cached = dialog_index.get(account)
+        groups = cached.ordered() if cached else []
+        for group in groups[data.offset:limit_end]:
+            yield ndjson_line(group)
+        index = len(groups)
+    yield ndjson_line({"status": "SUCCESS", "total": index, "cached": False})
+
+
+async def stream_groups(groups: list, summary: dict):
+    for group in groups:
+        yield ndjson_line(group)
+    yield ndjson_line(summary)
+
+
 @app.post("/api/telegram/groups/fetch")
 async def fetch_groups(data: FetchGroups):
     """Fetch all groups and channels the user is member of"""
+    account = session_key(data.session_string)
+    cached = dialog_index.get(account)
+    
     try:
-        client = TelegramClient(
-            StringSession(data.session_string),
-            data.api_id,
-            data.api_hash
-        )
-        
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            raise HTTPException(400, "Session expired")
-        
-        groups = []
-        
-        # Get all dialogs (chats, groups, channels)
-        async for dialog in client.iter_dialogs():
-            entity = dialog.entity
-            
-            # Only include groups and channels (not private chats)
-            if isinstance(entity, (Chat, Channel)):
-                # Skip if it's a private channel we can't post to
-                if isinstance(entity, Channel) and entity.broadcast and not entity.creator:
-                    # It's a broadcast channel and we're not the creator - skip
-                    continue
-                    
-                groups.append({
-                    "id": entity.id,
-                    "title": dialog.title or entity.title or "Unknown",
-                    "type": "channel" if isinstance(entity, Channel) else "group",
-                    "members_count": getattr(entity, 'participants_count', None),
-                    "username": getattr(entity, 'username', None),
-                    "is_megagroup": getattr(entity, 'megagroup', False) if isinstance(entity, Channel) else False
-                })
-        
-        await client.disconnect()
-        
-        return {
-            "status": "SUCCESS",
-            "groups": groups,
-            "total": len(groups)
-        }
-    except HTTPException:
-        raise
+        if cached is None or data.refresh:
+            if data.stream and not dialog_index.is_refreshing(account):
+                return StreamingResponse(stream_fresh_groups(data, account), media_type="application/x-ndjson")
+            await dialog_index.refresh_once(account, functools.partial(refresh_dialogs, data, account, data.refresh))
+            cached, from_cache = dialog_index.get(account), False
+        else:
+            from_cache = True
+            if dialog_index.needs_refresh(account):
+                # Answer now, catch up in the background
+                dialog_index.refresh_once(account, functools.partial(refresh_dialogs, data, account))
+    except SessionNotAuthorized:
+        raise HTTPException(400, "Session expired")
     except Exception as e:
         raise HTTPException(500, f"Error fetching groups: {str(e)}")
+    
+    groups = cached.ordered()
+    page = groups[data.offset:data.offset + data.limit] if data.limit else groups[data.offset:]
+    summary = {
+        "status": "SUCCESS",
+        "total": len(groups),
+        "offset": data.offset,
+        "cached": from_cache,
+        "refreshed_at": datetime.utcfromtimestamp(cached.refreshed_at).isoformat()
+    }
+    
+    if data.stream:
+        return StreamingResponse(stream_groups(page, summary), media_type="application/x-ndjson")
+    
+    return {**summary, "groups": page}
+
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WORKERS", 1))
+    if workers > 1:
+        # One process per worker on the shared port, bots sharded between them
+        from sharding import run_workers
+        run_workers("main:app", "0.0.0.0", port, workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,261 @@
+import asyncio
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Label value that series beyond a metric's `max_series` are folded into
+OVERFLOW = "_other"
+
+# Seconds: Telegram round trips, handlers, PostgREST requests
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Seconds: event-loop lag and scheduling drift
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Seconds: FloodWait / SlowMode waits requested by Telegram
+WAIT_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 900, 3600, 86400)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _le(bound: float) -> str:
+    return 'le="' + _number(bound) + '"'
+
+
+class _Metric:
+    """Base for labelled metrics: one child per label-value tuple.
+
+    Children are created on first use and cached, so the hot path is one
+    dict lookup (or none, when the caller keeps the child). At most
+    `max_series` children exist; further label values share the OVERFLOW
+    child, so a misbehaving label can't grow memory or scrape size.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), max_series: int = 1000):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(self._children) >= self.max_series:
+                key = (OVERFLOW,) * len(self.labelnames)
+                child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, label: str, value: str):
+        """Drop every series whose `label` equals `value` (e.g. a stopped bot)"""
+        index = self.labelnames.index(label)
+        for key in [k for k in self._children if k[index] == value]:
+            del self._children[key]
+
+    @property
+    def series(self) -> int:
+        return len(self._children)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}_total{_labels(self.labelnames, key)} {_number(child.value)}"]
+
+
+class Gauge(_Metric):
+    """A gauge; `function` (if given) is read at scrape time instead"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 max_series: int = 1000, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.function = function
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def _render_child(self, key, child):
+        value = self.function() if self.function is not None else child.value
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "prefixes")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Exposition line prefixes, built on first render
+        self.prefixes: Optional[List[str]] = None
+        # Non-cumulative per bucket, the last one is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS, max_series: int = 1000):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, max_series)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def _render_child(self, key, child):
+        prefixes = child.prefixes
+        if prefixes is None:
+            labels = _labels(self.labelnames, key)
+            prefixes = child.prefixes = [
+                f"{self.name}_bucket{_labels(self.labelnames, key, _le(bound))} "
+                for bound in self.bounds + (math.inf,)
+            ] + [f"{self.name}_sum{labels} ", f"{self.name}_count{labels} "]
+        lines = []
+        cumulative = 0
+        for prefix, count in zip(prefixes, list(child.counts)):
+            cumulative += count
+            lines.append(prefix + str(cumulative))
+        lines.append(prefixes[-2] + _number(child.sum))
+        lines.append(prefixes[-1] + str(cumulative))
+        return lines
+
+
+class Registry:
+    """The process's metrics, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, **kwargs))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def forget(self, label: str, value: str):
+        """Drop the series of every metric labelled `label=value`"""
+        for metric in self._metrics.values():
+            if label in metric.labelnames:
+                metric.remove(label, value)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        return {
+            "metrics": len(self._metrics),
+            "series": sum(m.series for m in self._metrics.values()),
+        }
+
+
+REGISTRY = Registry()
+
+
+class LoopLagProbe:
+    """Observes how late the event loop wakes a task that sleeps `interval`"""
+
+    def __init__(self, histogram: Histogram, interval: float = 0.5):
+        self.histogram = histogram
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.histogram.observe(max(0.0, loop.time() - expected))
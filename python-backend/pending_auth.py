@@ -0,0 +1,230 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from bot_logging import get_logger
+
+log = get_logger("auth")
+
+# Why a pending login was closed (counted in stats)
+VERIFIED = "verified"
+EXPIRED = "expired"
+REPLACED = "replaced"
+EVICTED = "evicted"
+CODE_EXPIRED = "code_expired"
+REASONS = (VERIFIED, EXPIRED, REPLACED, EVICTED, CODE_EXPIRED)
+
+
+class PendingLogin:
+    __slots__ = ("phone", "client", "api_id", "api_hash", "phone_code_hash", "created_at")
+
+    def __init__(self, phone: str, client, api_id: int, api_hash: str, phone_code_hash: str, created_at: float):
+        self.phone = phone
+        self.client = client
+        self.api_id = api_id
+        self.api_hash = api_hash
+        self.phone_code_hash = phone_code_hash
+        # Wall clock, as saved in the registry
+        self.created_at = created_at
+
+
+class PendingAuthManager:
+    """Connected clients of logins waiting for /verify-code or /verify-password.
+
+    Each login is kept for `ttl` seconds after its code was sent (Telegram
+    codes don't outlive that anyway), and at most `max_pending` are held;
+    beyond that the oldest is closed. A new /send-code for the same phone
+    replaces the previous login and disconnects its client. A background
+    sweeper closes expired logins, deletes their session files and clears
+    expired rows that the registry kept across restarts.
+
+    `factory(phone, api_id, api_hash)` returns an unconnected client that
+    stores its session in `session_path(phone)`.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str, int, str], object],
+        registry,
+        sessions_dir: str,
+        ttl: float = 600.0,
+        max_pending: int = 1000,
+        sweep_interval: float = 30.0,
+    ):
+        self.factory = factory
+        self.registry = registry
+        self.sessions_dir = sessions_dir
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.sweep_interval = sweep_interval
+
+        # phone -> login, oldest first
+        self._logins: "OrderedDict[str, PendingLogin]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+
+        self.created = 0
+        self.restored = 0
+        self.closed = dict.fromkeys(REASONS, 0)
+
+    def __len__(self) -> int:
+        return len(self._logins)
+
+    def session_path(self, phone: str) -> str:
+        """Path handed to TelegramClient (Telethon appends `.session`)"""
+        return os.path.join(self.sessions_dir, f"session_{phone}")
+
+    async def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        """Disconnect every pending client; the registry rows survive the restart"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        logins = list(self._logins.values())
+        self._logins.clear()
+        await asyncio.gather(*(self._disconnect(login) for login in logins), return_exceptions=True)
+
+    # -- logins ------------------------------------------------------------
+
+    async def put(self, phone: str, client, api_id: int, api_hash: str, phone_code_hash: str):
+        """Hold a login whose code was just sent, closing any earlier one for the phone"""
+        previous = self._logins.pop(phone, None)
+        self._logins[phone] = PendingLogin(phone, client, api_id, api_hash, phone_code_hash, time.time())
+        self.created += 1
+        if previous is not None and previous.client is not client:
+            self.closed[REPLACED] += 1
+            await self._disconnect(previous)
+        # Persist the login so /verify-code still works after a restart
+        await asyncio.to_thread(self.registry.save_pending_auth, phone, api_id, api_hash, phone_code_hash)
+        while len(self._logins) > self.max_pending:
+            _, oldest = next(iter(self._logins.items()))
+            log.debug("Too many pending logins, closing the oldest")
+            await self._close(oldest, EVICTED)
+
+    async def get(self, phone: str) -> Optional[PendingLogin]:
+        """The phone's pending login, reconnected from the registry after a restart"""
+        login = self._logins.get(phone)
+        if login is not None:
+            if not self._expired(login.created_at, time.time()):
+                return login
+            await self._close(login, EXPIRED)
+            return None
+
+        saved = await asyncio.to_thread(self.registry.load_pending_auth, phone)
+        if saved is None:
+            return None
+        if self._expired(saved["created_at"], time.time()):
+            await self._discard(phone, EXPIRED)
+            return None
+
+        client = self.factory(phone, saved["api_id"], saved["api_hash"])
+        try:
+            await client.connect()
+        except BaseException:
+            await client.disconnect()
+            raise
+        current = self._logins.get(phone)
+        if current is not None:
+            # Another request restored or replaced it meanwhile
+            await client.disconnect()
+            return current
+        login = PendingLogin(
+            phone, client, saved["api_id"], saved["api_hash"], saved["phone_code_hash"], saved["created_at"]
+        )
+        self._logins[phone] = login
+        self.restored += 1
+        return login
+
+    async def finish(self, phone: str, reason: str = VERIFIED):
+        """Close a login that succeeded (the session file stays) or whose code expired"""
+        login = self._logins.get(phone)
+        if login is not None:
+            await self._close(login, reason, keep_session=reason == VERIFIED)
+        else:
+            await self._discard(phone, reason, keep_session=reason == VERIFIED)
+
+    # -- expiry ------------------------------------------------------------
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return now - created_at >= self.ttl
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                log.error("Pending login sweep failed: %s", e)
+
+    async def sweep(self) -> int:
+        """Close every expired login; returns how many were closed"""
+        now = time.time()
+        expired = []
+        # Oldest first, so stop at the first login that is still valid
+        for login in self._logins.values():
+            if not self._expired(login.created_at, now):
+                break
+            expired.append(login)
+        for login in expired:
+            del self._logins[login.phone]
+        await asyncio.gather(*(self._disconnect(login) for login in expired))
+        # One registry pass for these and for logins saved before a restart
+        # and never picked up again
+        phones = await asyncio.to_thread(self.registry.expire_pending_auth, now - self.ttl)
+        closed = {login.phone for login in expired}.union(phones)
+        closed.difference_update(self._logins)
+        for phone in closed:
+            self._remove_session_file(phone)
+        self.closed[EXPIRED] += len(closed)
+        if closed:
+            log.info("Closed %d expired pending logins", len(closed))
+        return len(closed)
+
+    async def _close(self, login: PendingLogin, reason: str, keep_session: bool = False):
+        if self._logins.get(login.phone) is login:
+            del self._logins[login.phone]
+        await self._disconnect(login)
+        await self._discard(login.phone, reason, keep_session)
+
+    async def _discard(self, phone: str, reason: str, keep_session: bool = False):
+        self.closed[reason] += 1
+        # A new /send-code for the phone may have come in meanwhile
+        if phone in self._logins:
+            return
+        await asyncio.to_thread(self.registry.remove_pending_auth, phone)
+        if not keep_session and phone not in self._logins:
+            self._remove_session_file(phone)
+
+    async def _disconnect(self, login: PendingLogin):
+        try:
+            await login.client.disconnect()
+        except Exception as e:
+            log.warning("Disconnecting pending login failed: %s", e)
+
+    def _remove_session_file(self, phone: str):
+        path = self.session_path(phone)
+        for suffix in (".session", ".session-journal"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.warning("Could not remove %s: %s", path + suffix, e)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._logins),
+            "max_pending": self.max_pending,
+            "ttl": self.ttl,
+            "created": self.created,
+            "restored": self.restored,
+            "closed": dict(self.closed),
+        }
@@ -0,0 +1,201 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from bot_state import COUNTERS
+
+
+class BotRegistry:
+    """Durable local record of running bots (SQLite).
+
+    Holds each running bot's StartBot config, the last time every group was
+    sent to (its position in the cycle) and its counters, so bots can be
+    restored after a restart. Calls are blocking; run them with
+    `asyncio.to_thread` from the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        try:
+            os.chmod(path, 0o600)  # configs contain session strings
+        except OSError:
+            pass
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS bots (
+                bot_id TEXT PRIMARY KEY,
+                config TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS group_positions (
+                bot_id TEXT NOT NULL,
+                group_id INTEGER NOT NULL,
+                last_sent_at REAL NOT NULL,
+                PRIMARY KEY (bot_id, group_id)
+            );
+            CREATE TABLE IF NOT EXISTS bot_counters (
+                bot_id TEXT PRIMARY KEY,
+                messages_sent INTEGER NOT NULL DEFAULT 0,
+                messages_failed INTEGER NOT NULL DEFAULT 0,
+                auto_replies INTEGER NOT NULL DEFAULT 0,
+                auto_replies_suppressed INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS pending_auth (
+                phone TEXT PRIMARY KEY,
+                api_id INTEGER NOT NULL,
+                api_hash TEXT NOT NULL,
+                phone_code_hash TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+        # Counters added after a registry.db was created
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(bot_counters)")}
+        for column in COUNTERS:
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE bot_counters ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # -- bots --------------------------------------------------------------
+
+    def save_bot(self, bot_id: str, config: dict, reset: bool = False):
+        """Store a bot's config; `reset` also clears its positions and counters"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if reset:
+                    self._db.execute("DELETE FROM group_positions WHERE bot_id = ?", (bot_id,))
+                    self._db.execute("DELETE FROM bot_counters WHERE bot_id = ?", (bot_id,))
+                self._db.execute(
+                    "INSERT INTO bots (bot_id, config, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(bot_id) DO UPDATE SET config = excluded.config, updated_at = excluded.updated_at",
+                    (bot_id, json.dumps(config), time.time()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def remove_bot(self, bot_id: str):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for table in ("bots", "group_positions", "bot_counters"):
+                    self._db.execute(f"DELETE FROM {table} WHERE bot_id = ?", (bot_id,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def load_bots(self) -> List[dict]:
+        """All registered bots with their config, positions and counters"""
+        with self._lock:
+            bots = {
+                bot_id: {"config": json.loads(config), "positions": {}, "stats": {}}
+                for bot_id, config in self._db.execute("SELECT bot_id, config FROM bots")
+            }
+            for bot_id, group_id, last_sent_at in self._db.execute(
+                "SELECT bot_id, group_id, last_sent_at FROM group_positions"
+            ):
+                if bot_id in bots:
+                    bots[bot_id]["positions"][group_id] = last_sent_at
+            for bot_id, *counters in self._db.execute(f"SELECT bot_id, {', '.join(COUNTERS)} FROM bot_counters"):
+                if bot_id in bots:
+                    bots[bot_id]["stats"] = dict(zip(COUNTERS, counters))
+        return list(bots.values())
+
+    def bot_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT bot_id FROM bots")]
+
+    def load_bot(self, bot_id: str) -> Optional[dict]:
+        """One registered bot with its config, positions and counters"""
+        with self._lock:
+            row = self._db.execute("SELECT config FROM bots WHERE bot_id = ?", (bot_id,)).fetchone()
+            if row is None:
+                return None
+            positions = dict(self._db.execute(
+                "SELECT group_id, last_sent_at FROM group_positions WHERE bot_id = ?", (bot_id,)
+            ).fetchall())
+            counters = self._db.execute(
+                f"SELECT {', '.join(COUNTERS)} FROM bot_counters WHERE bot_id = ?", (bot_id,)
+            ).fetchone()
+        stats = {}
+        if counters is not None:
+            stats = dict(zip(COUNTERS, counters))
+        return {"config": json.loads(row[0]), "positions": positions, "stats": stats}
+
+    def checkpoint(self, positions: Dict[str, Dict[int, float]], stats: Dict[str, dict]):
+        """Persist cycle positions and counters for many bots in one transaction"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT INTO group_positions (bot_id, group_id, last_sent_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(bot_id, group_id) DO UPDATE SET last_sent_at = excluded.last_sent_at",
+                    [
+                        (bot_id, group_id, sent_at)
+                        for bot_id, groups in positions.items()
+                        for group_id, sent_at in groups.items()
+                    ],
+                )
+                self._db.executemany(
+                    f"INSERT INTO bot_counters (bot_id, {', '.join(COUNTERS)}) "
+                    f"VALUES (?, {', '.join('?' for _ in COUNTERS)}) ON CONFLICT(bot_id) DO UPDATE SET "
+                    + ", ".join(f"{column} = excluded.{column}" for column in COUNTERS),
+                    [(bot_id, *(s.get(column, 0) for column in COUNTERS)) for bot_id, s in stats.items()],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    # -- pending logins ----------------------------------------------------
+
+    def save_pending_auth(self, phone: str, api_id: int, api_hash: str, phone_code_hash: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pending_auth (phone, api_id, api_hash, phone_code_hash, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (phone, api_id, api_hash, phone_code_hash, time.time()),
+            )
+
+    def load_pending_auth(self, phone: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT api_id, api_hash, phone_code_hash, created_at FROM pending_auth WHERE phone = ?",
+                (phone,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"api_id": row[0], "api_hash": row[1], "phone_code_hash": row[2], "created_at": row[3]}
+
+    def remove_pending_auth(self, phone: str):
+        with self._lock:
+            self._db.execute("DELETE FROM pending_auth WHERE phone = ?", (phone,))
+
+    def expire_pending_auth(self, before: float) -> List[str]:
+        """Delete logins created before `before`; returns their phones"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                phones = [row[0] for row in self._db.execute(
+                    "SELECT phone FROM pending_auth WHERE created_at < ?", (before,)
+                )]
+                self._db.execute("DELETE FROM pending_auth WHERE created_at < ?", (before,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return phones
@@ -0,0 +1,52 @@
+import time
+from collections import OrderedDict
+from typing import Callable
+
+
+class ReplyCooldown:
+    """Senders a bot has auto-replied to recently (LRU with a TTL).
+
+    Entries are kept in reply order, so expired ones are always at the front
+    and each check drops them in amortized O(1). At most `capacity` senders
+    are remembered; past that the oldest reply is forgotten first, which at
+    worst lets that sender get another reply early.
+    """
+
+    __slots__ = ("capacity", "clock", "_replied", "suppressed", "evicted")
+
+    def __init__(self, capacity: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.clock = clock
+        # sender_id -> time of the last reply, oldest first
+        self._replied: "OrderedDict[int, float]" = OrderedDict()
+        self.suppressed = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._replied)
+
+    def try_acquire(self, sender_id: int, cooldown: float) -> bool:
+        """True if the sender should get a reply now (and start its cooldown)"""
+        if cooldown <= 0:
+            return True
+        now = self.clock()
+        replied = self._replied
+        # Expire from the front; stops at the first entry still cooling down
+        while replied:
+            oldest_id, oldest_at = next(iter(replied.items()))
+            if now - oldest_at < cooldown:
+                break
+            del replied[oldest_id]
+
+        if sender_id in replied:
+            self.suppressed += 1
+            return False
+        replied[sender_id] = now
+        if len(replied) > self.capacity:
+            replied.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    def release(self, sender_id: int):
+        """Forget a sender whose reply failed, so the next message is answered"""
+        self._replied.pop(sender_id, None)
@@ -0,0 +1,398 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from telethon import errors
+
+# Errors after which no send to the group can succeed until something changes
+# on Telegram's side: the account was banned, kicked or muted there, or the
+# chat went private or away. Any other failure is treated as transient.
+PERMANENT_ERRORS = (
+    errors.ChatWriteForbiddenError,
+    errors.ChannelPrivateError,
+    errors.UserBannedInChannelError,
+    errors.ChatAdminRequiredError,
+    errors.ChatRestrictedError,
+    errors.ChatGuestSendForbiddenError,
+    errors.ChannelPublicGroupNaError,
+    errors.ChatIdInvalidError,
+)
+
+
+class StopSending(Exception):
+    """Raised by the send callback when the bot must not send anymore (e.g.
+    its lease may have passed to another worker): the engine stops, and the
+    group is neither counted as failed nor moved on in the cycle"""
+
+
+def pacing_interval(config) -> float:
+    """Seconds between two consecutive send starts on one account"""
+    messages_per_minute = getattr(config, "messages_per_minute", None)
+    if messages_per_minute:
+        return 60.0 / messages_per_minute
+    return random.uniform(config.min_delay, config.max_delay)
+
+
+class AccountPacer:
+    """Spacing between send starts plus account-wide pauses (FloodWait)"""
+
+    __slots__ = ("next_slot", "paused_until", "last_start", "previous")
+
+    def __init__(self):
+        self.next_slot = 0.0
+        self.paused_until = 0.0
+        self.last_start: Optional[float] = None
+        # (next_slot, last_start) before the last take, for `refund`
+        self.previous: Optional[Tuple[float, Optional[float]]] = None
+
+    def ready_at(self) -> float:
+        return max(self.next_slot, self.paused_until)
+
+    def take(self, now: float, spacing: float):
+        self.previous = (self.next_slot, self.last_start)
+        self.last_start = now
+        self.next_slot = now + spacing
+
+    def refund(self, started: float) -> bool:
+        """Give back the slot of the send started at `started` (it failed, so
+        nothing was posted), unless another send has started since"""
+        if self.previous is None or self.last_start != started:
+            return False
+        self.next_slot, self.last_start = self.previous
+        self.previous = None
+        return True
+
+    def respace(self, spacing: float):
+        """Re-time the next slot from the last start (pacing settings changed)"""
+        if self.last_start is not None:
+            self.next_slot = self.last_start + spacing
+
+    def pause(self, until: float):
+        self.paused_until = max(self.paused_until, until)
+
+
+class GroupHealth:
+    """Failures of one group since its last successful send"""
+
+    __slots__ = ("failures", "error", "detail", "since", "retry_at", "quarantined")
+
+    def __init__(self):
+        self.failures = 0
+        self.error = ""
+        self.detail = ""
+        # Wall-clock time of the first failure in a row
+        self.since = time.time()
+        # Loop time of the next attempt
+        self.retry_at = 0.0
+        self.quarantined = False
+
+
+class SendEngine:
+    """Per-bot send scheduler.
+
+    Keeps a heap of next-due times per group and starts sends for due groups
+    as soon as the account pacer allows, without waiting for earlier sends to
+    finish (up to `max_concurrent_sends` in flight). A full cycle therefore
+    takes about len(groups) * pacing interval, independent of how slow or
+    failing individual groups are.
+
+    `send(group_id)` performs one send and raises on failure, or raises
+    StopSending to stop the engine. `get_config()` returns the current
+    StartBot config, or None once the bot is stopped; it is re-read at every
+    scheduling point.
+
+    `positions` (group_id -> wall-clock time of the last send, as saved by
+    the registry) resumes an earlier cycle: unsent groups go first, then the
+    least recently sent ones.
+
+    `observe_drift(seconds)` is called with how late each send starts after
+    it was due and allowed by the pacer.
+
+    Failed sends give their pacing slot back. A group failing with one of
+    `PERMANENT_ERRORS` is quarantined: it is only tried again after
+    `quarantine_time` (0 disables quarantine). Other failures back off from
+    `retry_delay`, doubling per failure in a row up to `max_retry_delay`.
+    A successful send clears the group's health, and `observe_quarantine(
+    group_id, error)` is called when a group enters quarantine.
+    """
+
+    def __init__(
+        self,
+        bot_id: str,
+        send: Callable[[int], Awaitable[None]],
+        get_config: Callable[[], Optional[object]],
+        idle_interval: float = 60.0,
+        positions: Optional[Dict[int, float]] = None,
+        observe_drift: Optional[Callable[[float], None]] = None,
+        retry_delay: float = 60.0,
+        max_retry_delay: float = 3600.0,
+        quarantine_time: float = 86400.0,
+        observe_quarantine: Optional[Callable[[int, Exception], None]] = None,
+    ):
+        self.bot_id = bot_id
+        self.send = send
+        self.get_config = get_config
+        self.idle_interval = idle_interval
+        self.observe_drift = observe_drift
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.quarantine_time = quarantine_time
+        self.observe_quarantine = observe_quarantine
+
+        self.pacer = AccountPacer()
+        self._heap: List[Tuple[float, int, int]] = []
+        self._seq = itertools.count()
+        # group_id -> due time; heap entries that don't match are stale
+        self.due: Dict[int, float] = {}
+        self.in_flight: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._group_ids: Tuple[int, ...] = ()
+        self._group_set: Set[int] = set()
+        # Cycle position: group_id -> wall-clock time of the last send attempt
+        self.last_sent: Dict[int, float] = dict(positions or {})
+        self._dirty_positions: Set[int] = set()
+        # Group of the most recently started send
+        self.current_group: Optional[int] = None
+        # group_id -> failures since its last successful send
+        self.health: Dict[int, GroupHealth] = {}
+        # Set once a send raised StopSending
+        self.stopped = False
+
+        self.flood_waits = 0
+        self.quarantines = 0
+        self.refunds = 0
+        self.cancelled_sends = 0
+
+    # -- scheduling --------------------------------------------------------
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _schedule(self, group_id: int, due: float):
+        self.due[group_id] = due
+        heapq.heappush(self._heap, (due, next(self._seq), group_id))
+
+    def _sync_groups(self, config, now: float):
+        """Add new groups (due now, in cycle order) and forget removed ones"""
+        group_ids = config.group_ids
+        if tuple(group_ids) == self._group_ids:
+            return
+        wanted = set(group_ids)
+        for group_id in list(self.due):
+            if group_id not in wanted:
+                del self.due[group_id]
+                self.health.pop(group_id, None)
+
+        new = [g for g in group_ids if g not in self.due and g not in self.in_flight]
+        # Never-sent groups first, then least recently sent (stable sort, and
+        # heap ties break on insertion order)
+        new.sort(key=lambda g: self.last_sent.get(g, 0.0))
+        wall = time.time()
+        interval = getattr(config, "min_group_interval", 0)
+        for group_id in new:
+            due = now
+            sent_at = self.last_sent.get(group_id)
+            if sent_at is not None and interval:
+                due += max(0.0, sent_at + interval - wall)
+            self._schedule(group_id, due)
+        self._group_ids = tuple(group_ids)
+        self._group_set = wanted
+
+    def _peek(self) -> Optional[Tuple[float, int]]:
+        """Earliest (due, group_id), dropping stale heap entries"""
+        while self._heap:
+            due, _, group_id = self._heap[0]
+            if self.due.get(group_id) == due and group_id not in self.in_flight:
+                return due, group_id
+            heapq.heappop(self._heap)
+        return None
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next send may start (None if nothing is scheduled)"""
+        head = self._peek()
+        if head is None:
+            return None
+        return max(0.0, max(head[0], self.pacer.ready_at()) - self._now())
+
+    def next_due_at(self) -> Optional[float]:
+        """Wall-clock time the next send may start (None if nothing is scheduled)"""
+        delay = self.next_due_in()
+        return None if delay is None else time.time() + delay
+
+    def group_health(self) -> Dict[str, List[dict]]:
+        """Quarantined groups and groups backing off after failures"""
+        now = self._now()
+        result: Dict[str, List[dict]] = {"quarantined": [], "retrying": []}
+        for group_id, health in self.health.items():
+            result["quarantined" if health.quarantined else "retrying"].append({
+                "group_id": group_id,
+                "error": health.error,
+                "detail": health.detail,
+                "failures": health.failures,
+                "since": health.since,
+                "retry_in": round(max(0.0, health.retry_at - now), 3),
+            })
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.in_flight),
+            "flood_waits": self.flood_waits,
+            "quarantines": self.quarantines,
+            "refunds": self.refunds,
+            "cancelled_sends": self.cancelled_sends,
+        }
+
+    def take_dirty_positions(self) -> Dict[int, float]:
+        """Positions changed since the last call (for registry checkpoints)"""
+        dirty, self._dirty_positions = self._dirty_positions, set()
+        return {g: self.last_sent[g] for g in dirty if g in self.last_sent}
+
+    def wake(self):
+        self._wakeup.set()
+
+    def reconfigure(self, respace: bool = False):
+        """Apply a swapped config now instead of at the next wakeup.
+
+        Groups are synced on the next pass (new ones due now, removed ones
+        dropped, positions kept). With `respace` the slot already taken under
+        the old pacing is re-timed with the new one.
+        """
+        config = self.get_config()
+        if respace and config is not None:
+            self.pacer.respace(pacing_interval(config))
+        self.wake()
+
+    async def _wait(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    # -- main loop ---------------------------------------------------------
+
+    async def run(self):
+        try:
+            while True:
+                config = self.get_config()
+                if config is None or self.stopped:
+                    break
+                now = self._now()
+                self._sync_groups(config, now)
+
+                head = self._peek()
+                if head is None:
+                    await self._wait(self.idle_interval)
+                    continue
+
+                due, group_id = head
+                start_at = max(due, self.pacer.ready_at())
+                if start_at > now:
+                    await self._wait(start_at - now)
+                    continue
+
+                if len(self.in_flight) >= max(1, getattr(config, "max_concurrent_sends", 1)):
+                    # Woken when a send completes
+                    await self._wait(None)
+                    continue
+
+                heapq.heappop(self._heap)
+                if self.observe_drift is not None:
+                    self.observe_drift(now - start_at)
+                self.pacer.take(now, pacing_interval(config))
+                self.in_flight.add(group_id)
+                self.current_group = group_id
+                task = asyncio.create_task(self._send_one(group_id, now))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _send_one(self, group_id: int, started: float):
+        retry_at = None
+        keep_place = False
+        try:
+            await self.send(group_id)
+        except asyncio.CancelledError:
+            # Cut off by `drain`; it may not have been posted, so the group
+            # keeps its place in the cycle
+            keep_place = True
+            raise
+        except StopSending:
+            keep_place = True
+            self.stopped = True
+            self._refund(started)
+        except errors.FloodWaitError as e:
+            # Account-wide limit: pause every send, and this peer
+            self.flood_waits += 1
+            retry_at = self._now() + e.seconds
+            self.pacer.pause(retry_at)
+        except errors.SlowModeWaitError as e:
+            # Slow mode only concerns this chat
+            retry_at = self._now() + e.seconds
+            self._refund(started)
+        except Exception as e:
+            # The send callback already counted and logged the failure
+            retry_at = self._failed(group_id, e)
+            self._refund(started)
+        else:
+            self.health.pop(group_id, None)
+        finally:
+            self.in_flight.discard(group_id)
+            if not keep_place:
+                self.last_sent[group_id] = time.time()
+                self._dirty_positions.add(group_id)
+            config = self.get_config()
+            if config is not None and group_id in self._group_set:
+                due = max(self._now(), started + getattr(config, "min_group_interval", 0))
+                if retry_at is not None:
+                    due = max(due, retry_at)
+                self._schedule(group_id, due)
+            self.wake()
+
+    async def drain(self, timeout: float) -> int:
+        """Wait up to `timeout` seconds for the sends in flight, then cancel
+        the rest; returns how many were cancelled. Call it once `get_config`
+        returns None, so no new sends start meanwhile."""
+        tasks = list(self._tasks)
+        if not tasks:
+            return 0
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.cancelled_sends += len(pending)
+        return len(pending)
+
+    def _refund(self, started: float):
+        if self.pacer.refund(started):
+            self.refunds += 1
+
+    def _failed(self, group_id: int, error: Exception) -> float:
+        """Update the group's health after a failed send; returns when to retry it"""
+        health = self.health.get(group_id)
+        if health is None:
+            health = self.health[group_id] = GroupHealth()
+        health.failures += 1
+        health.error = type(error).__name__
+        health.detail = str(error)[:200]
+        if self.quarantine_time and isinstance(error, PERMANENT_ERRORS):
+            delay = self.quarantine_time
+            if not health.quarantined:
+                health.quarantined = True
+                self.quarantines += 1
+                if self.observe_quarantine is not None:
+                    self.observe_quarantine(group_id, error)
+        else:
+            # A quarantined group failing differently on its retry backs off
+            # like any other (and is quarantined again on a permanent error)
+            health.quarantined = False
+            delay = min(self.retry_delay * 2 ** min(health.failures - 1, 30), self.max_retry_delay)
+        health.retry_at = self._now() + delay
+        return health.retry_at
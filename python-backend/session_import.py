@@ -0,0 +1,304 @@
+import asyncio
+import base64
+import binascii
+import json
+import os
+import re
+import shutil
+import uuid
+import zipfile
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from bot_logging import get_logger
+
+log = get_logger("import")
+
+CHUNK_SIZE = 1024 * 1024
+SESSION_SUFFIX = ".session"
+# Telethon session files are a few MB at most; anything larger is not one
+MAX_SESSION_BYTES = 64 * 1024 * 1024
+
+_PHONE = re.compile(r"^\+?[\w-]{1,64}$")
+
+
+class InvalidUpload(Exception):
+    """The upload is not a zip of .session files or NDJSON of sessions"""
+
+
+def valid_phone(phone) -> bool:
+    """Phones end up in file names, so only plain ones are accepted"""
+    return isinstance(phone, str) and bool(_PHONE.match(phone))
+
+
+def session_file(sessions_dir: str, phone: str) -> str:
+    """Where an imported .session file of `phone` is kept"""
+    return os.path.join(sessions_dir, f"session_{phone}{SESSION_SUFFIX}")
+
+
+def remove_file(path: str):
+    for name in (path, path + "-journal"):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.warning("Could not remove %s: %s", name, e)
+
+
+def _part_path(path: str) -> str:
+    return f"{path}.{uuid.uuid4().hex}.part"
+
+
+def write_file(path: str, data: bytes):
+    """Write `data` to a temp file and rename it over `path`"""
+    part = _part_path(path)
+    try:
+        with open(part, "wb") as f:
+            f.write(data)
+        os.replace(part, path)
+    except BaseException:
+        remove_file(part)
+        raise
+
+
+def extract_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, path: str):
+    """Copy one archive member to `path` in chunks, renamed into place when complete"""
+    part = _part_path(path)
+    try:
+        with archive.open(info) as src, open(part, "wb") as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.replace(part, path)
+    except BaseException:
+        remove_file(part)
+        raise
+
+
+async def save_upload(upload, path: str, max_bytes: Optional[int] = None) -> int:
+    """Stream an UploadFile to `path` chunk by chunk, off the event loop.
+
+    The data goes to a temp file that is renamed over `path` once complete,
+    so a failed or cut-off upload never leaves a partial file behind.
+    Returns the number of bytes written.
+    """
+    part = _part_path(path)
+    f = await asyncio.to_thread(open, part, "wb")
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise InvalidUpload(f"File larger than {max_bytes} bytes")
+            await asyncio.to_thread(f.write, chunk)
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, part, path)
+    except BaseException:
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(remove_file, part)
+        raise
+    return size
+
+
+class ImportItem:
+    """One session of a bulk import: a file on disk, a string, or why it was rejected"""
+
+    __slots__ = ("index", "phone", "path", "session_string", "error")
+
+    def __init__(self, index: int, phone: Optional[str] = None, path: Optional[str] = None,
+                 session_string: Optional[str] = None, error: Optional[str] = None):
+        self.index = index
+        self.phone = phone
+        self.path = path
+        self.session_string = session_string
+        self.error = error
+
+
+async def open_upload(upload, sessions_dir: str, max_sessions: int) -> AsyncIterator[ImportItem]:
+    """Sessions of a bulk upload, read lazily as they are validated.
+
+    The upload is copied to `sessions_dir` first (the request's own file is
+    closed once the endpoint returns) and checked here, so a broken archive
+    fails the request before anything is streamed back. A zip holds
+    `session_<phone>.session` or `<phone>.session` members, extracted one at
+    a time as they are consumed. Anything else is read as NDJSON, one object
+    per line with `session_string`, or a base64 `session_file` and `phone`.
+    """
+    upload_path = os.path.join(sessions_dir, f".import-{uuid.uuid4().hex}")
+    await save_upload(upload, upload_path)
+    try:
+        if not await asyncio.to_thread(zipfile.is_zipfile, upload_path):
+            if (upload.filename or "").lower().endswith(".zip"):
+                raise InvalidUpload("Not a valid zip file")
+            return _ndjson_items(upload_path, sessions_dir, max_sessions)
+        try:
+            archive = await asyncio.to_thread(zipfile.ZipFile, upload_path)
+        except (zipfile.BadZipFile, OSError):
+            raise InvalidUpload("Not a valid zip file")
+        members = [info for info in archive.infolist() if _is_session_member(info)]
+        if len(members) > max_sessions:
+            archive.close()
+            raise InvalidUpload(f"Too many sessions ({len(members)}, max {max_sessions})")
+        return _zip_items(archive, upload_path, members, sessions_dir)
+    except BaseException:
+        await asyncio.to_thread(remove_file, upload_path)
+        raise
+
+
+def _is_session_member(info: zipfile.ZipInfo) -> bool:
+    name = os.path.basename(info.filename.replace("\\", "/"))
+    # Skips directories and macOS "._" resource forks
+    return not info.is_dir() and name.endswith(SESSION_SUFFIX) and not name.startswith(".")
+
+
+def _member_phone(info: zipfile.ZipInfo) -> str:
+    name = os.path.basename(info.filename.replace("\\", "/"))[:-len(SESSION_SUFFIX)]
+    return name[len("session_"):] if name.startswith("session_") else name
+
+
+async def _zip_items(archive, upload_path, members, sessions_dir) -> AsyncIterator[ImportItem]:
+    seen = set()
+    try:
+        for index, info in enumerate(members):
+            phone = _member_phone(info)
+            if not valid_phone(phone):
+                yield ImportItem(index, phone, error="Invalid phone in file name")
+            elif phone in seen:
+                yield ImportItem(index, phone, error="Duplicate phone")
+            elif info.file_size > MAX_SESSION_BYTES:
+                yield ImportItem(index, phone, error="File too large")
+            else:
+                seen.add(phone)
+                path = session_file(sessions_dir, phone)
+                try:
+                    await asyncio.to_thread(extract_entry, archive, info, path)
+                except Exception as e:
+                    yield ImportItem(index, phone, error=f"Could not extract: {e}")
+                    continue
+                yield ImportItem(index, phone, path=path)
+    finally:
+        archive.close()
+        await asyncio.to_thread(remove_file, upload_path)
+
+
+async def _file_lines(path) -> AsyncIterator[bytes]:
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        pending = b""
+        while True:
+            chunk = await asyncio.to_thread(f.read, CHUNK_SIZE)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            if len(pending) > MAX_SESSION_BYTES * 2:
+                raise InvalidUpload("Line too long")
+            for line in lines:
+                yield line
+        yield pending
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+async def _ndjson_items(upload_path, sessions_dir, max_sessions) -> AsyncIterator[ImportItem]:
+    seen = set()
+    index = 0
+    lines = _file_lines(upload_path)
+    try:
+        async for line in lines:
+            if not line.strip():
+                continue
+            if index >= max_sessions:
+                raise InvalidUpload(f"Too many sessions (max {max_sessions})")
+            item = await _ndjson_item(index, line, sessions_dir, seen)
+            index += 1
+            yield item
+    finally:
+        await lines.aclose()
+        await asyncio.to_thread(remove_file, upload_path)
+
+
+async def _ndjson_item(index, line, sessions_dir, seen) -> ImportItem:
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return ImportItem(index, error="Invalid JSON")
+    if not isinstance(entry, dict):
+        return ImportItem(index, error="Expected a JSON object")
+    phone = entry.get("phone")
+    if isinstance(entry.get("session_string"), str):
+        return ImportItem(index, phone, session_string=entry["session_string"])
+    if not isinstance(entry.get("session_file"), str):
+        return ImportItem(index, phone, error="Missing session_string or session_file")
+    if not valid_phone(phone):
+        return ImportItem(index, phone, error="session_file needs a valid phone")
+    if phone in seen:
+        return ImportItem(index, phone, error="Duplicate phone")
+    try:
+        data = base64.b64decode(entry["session_file"], validate=True)
+    except (binascii.Error, ValueError):
+        return ImportItem(index, phone, error="session_file is not base64")
+    seen.add(phone)
+    path = session_file(sessions_dir, phone)
+    await asyncio.to_thread(write_file, path, data)
+    return ImportItem(index, phone, path=path)
+
+
+async def run_bounded(
+    items: AsyncIterator[ImportItem],
+    handle: Callable[[ImportItem], Awaitable[dict]],
+    concurrency: int,
+) -> AsyncIterator[dict]:
+    """Run `handle` on every item, at most `concurrency` at a time.
+
+    Results are yielded as they finish, not in input order. Items are only
+    pulled while a slot is free, so files are extracted no faster than they
+    are validated. An error reading the upload is raised
+    after the sessions already started have reported.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results = asyncio.Queue()
+    tasks = set()
+    done = object()
+
+    async def run(item):
+        try:
+            result = await handle(item)
+        except Exception as e:
+            result = e
+        finally:
+            semaphore.release()
+        results.put_nowait(result)
+
+    async def feed():
+        error = None
+        try:
+            async for item in items:
+                await semaphore.acquire()
+                task = asyncio.create_task(run(item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except Exception as e:
+            error = e
+        # Every slot back means every started session has reported
+        for _ in range(concurrency):
+            await semaphore.acquire()
+        results.put_nowait(error if error is not None else done)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            result = await results.get()
+            if result is done:
+                break
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        # Client went away or an error: stop validating and clean up the upload
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
+        await asyncio.gather(feeder, *tasks, return_exceptions=True)
+        await items.aclose()
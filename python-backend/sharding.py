@@ -0,0 +1,497 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import importlib
+import os
+import secrets
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+from bot_logging import get_logger
+
+log = get_logger("shard")
+
+# Set on requests one worker passes to another, which must handle them
+# locally: "<worker id>:<HMAC of the worker id with the shared secret>"
+FORWARDED_HEADER = "X-Shard-Forwarded"
+
+
+class LeaseExpired(Exception):
+    """This worker can no longer be sure it still holds its bots' leases"""
+
+
+def load_secret(path: str) -> bytes:
+    """The key workers sign forwarded requests with, created at `path` by
+    whichever worker on the node gets there first"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(secrets.token_bytes(32))
+    try:
+        # Fails if another worker linked its key first; theirs wins
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash placement of bot ids on workers.
+
+    Each worker owns `vnodes` points on the ring, so adding or removing one
+    worker only moves about 1/N of the bots.
+    """
+
+    def __init__(self, workers: Iterable[str], vnodes: int = 64):
+        self.workers = frozenset(workers)
+        points = sorted((_hash(f"{worker}#{i}"), worker) for worker in self.workers for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [worker for _, worker in points]
+
+    def owner(self, bot_id: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(bot_id)) % len(self._keys)
+        return self._owners[i]
+
+
+class LeaseTable:
+    """Worker heartbeats and per-bot leases in SQLite.
+
+    A bot may only run on the worker holding its unexpired lease. Workers on
+    one node share the file (WAL mode, `BEGIN IMMEDIATE` for acquisition).
+    Calls are blocking; run them with `asyncio.to_thread` from the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                heartbeat_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                bot_id TEXT PRIMARY KEY,
+                worker_id TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # -- workers -----------------------------------------------------------
+
+    def heartbeat(self, worker_id: str, url: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO workers (worker_id, url, heartbeat_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET url = excluded.url, heartbeat_at = excluded.heartbeat_at",
+                (worker_id, url, time.time()),
+            )
+
+    def remove_worker(self, worker_id: str):
+        """Leave the cluster and give up every lease at once"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+            self._db.execute("DELETE FROM leases WHERE worker_id = ?", (worker_id,))
+            self._db.execute("COMMIT")
+
+    def workers(self, ttl: float) -> Dict[str, str]:
+        """worker_id -> url of workers that sent a heartbeat within `ttl` seconds"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT worker_id, url FROM workers WHERE heartbeat_at >= ?", (time.time() - ttl,)
+            ).fetchall()
+        return dict(rows)
+
+    # -- leases ------------------------------------------------------------
+
+    def _acquire(self, bot_id: str, worker_id: str, now: float, ttl: float) -> bool:
+        row = self._db.execute("SELECT worker_id, expires_at FROM leases WHERE bot_id = ?", (bot_id,)).fetchone()
+        if row is not None and row[0] != worker_id and row[1] > now:
+            return False
+        self._db.execute(
+            "INSERT OR REPLACE INTO leases (bot_id, worker_id, expires_at) VALUES (?, ?, ?)",
+            (bot_id, worker_id, now + ttl),
+        )
+        return True
+
+    def acquire(self, bot_id: str, worker_id: str, ttl: float) -> bool:
+        """Take or extend the bot's lease unless another worker holds a live one"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                return self._acquire(bot_id, worker_id, time.time(), ttl)
+            finally:
+                self._db.execute("COMMIT")
+
+    def renew(self, worker_id: str, bot_ids: Iterable[str], ttl: float) -> List[str]:
+        """Extend the worker's leases; returns the bots another worker has taken meanwhile"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            try:
+                return [bot_id for bot_id in bot_ids if not self._acquire(bot_id, worker_id, now, ttl)]
+            finally:
+                self._db.execute("COMMIT")
+
+    def release(self, bot_id: str, worker_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE bot_id = ? AND worker_id = ?", (bot_id, worker_id))
+
+    def owner(self, bot_id: str) -> Optional[Tuple[str, str]]:
+        """(worker_id, url) holding a live lease on the bot"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT l.worker_id, w.url FROM leases l JOIN workers w ON w.worker_id = l.worker_id "
+                "WHERE l.bot_id = ? AND l.expires_at > ?",
+                (bot_id, time.time()),
+            ).fetchone()
+        return tuple(row) if row else None
+
+
+class ShardCoordinator:
+    """Keeps each bot on exactly one worker.
+
+    Every `heartbeat_interval` the worker refreshes its heartbeat, rebuilds
+    the hash ring from live workers and reconciles: bots it runs that now
+    hash elsewhere are stopped (`stop_local`) and their leases released;
+    registered bots that hash here are leased and started (`start_local`).
+    A bot whose worker died is taken over once its lease expires.
+
+    `route(bot_id)` tells endpoints which worker should answer for a bot;
+    `forward()` / `forward_stream()` pass the request on to it, signed with
+    `secret` so `is_forwarded()` on the peer can tell it from a client
+    setting FORWARDED_HEADER itself.
+    """
+
+    def __init__(
+        self,
+        leases: LeaseTable,
+        worker_id: str,
+        url: str,
+        running: Callable[[], Set[str]],
+        registered: Callable[[], Awaitable[List[str]]],
+        start_local: Callable[[str], Awaitable[None]],
+        stop_local: Callable[[str], Awaitable[None]],
+        secret: bytes,
+        heartbeat_interval: float = 2.0,
+        worker_ttl: float = 10.0,
+        lease_ttl: float = 30.0,
+        concurrency: int = 10,
+    ):
+        self.leases = leases
+        self.worker_id = worker_id
+        self.url = url.rstrip("/")
+        self.running = running
+        self.registered = registered
+        self.start_local = start_local
+        self.stop_local = stop_local
+        self.secret = secret
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_ttl = worker_ttl
+        self.lease_ttl = lease_ttl
+        self.concurrency = concurrency
+
+        self.ring = HashRing([worker_id])
+        self.peers: Dict[str, str] = {worker_id: self.url}
+        self.http: Optional[httpx.AsyncClient] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+        # Until this time (wall clock) every lease of this worker is valid
+        self.lease_deadline = time.time() + lease_ttl
+        # Bots being stopped because another worker took their lease
+        self.lost: Set[str] = set()
+
+        self.rebalances = 0
+        self.handed_off = 0
+        self.taken_over = 0
+        self.leases_lost = 0
+        self.forwarded = 0
+        self.forged = 0
+
+    async def start(self):
+        self.lease_deadline = time.time() + self.lease_ttl
+        if self.http is None:
+            self.http = httpx.AsyncClient(timeout=30.0)
+        if self._loop_task is None:
+            await self.refresh_ring()
+            self._loop_task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        """Leave the cluster; peers take over this worker's bots right away"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        await asyncio.to_thread(self.leases.remove_worker, self.worker_id)
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    # -- placement -----------------------------------------------------------
+
+    async def refresh_ring(self):
+        await asyncio.to_thread(self.leases.heartbeat, self.worker_id, self.url)
+        peers = await asyncio.to_thread(self.leases.workers, self.worker_ttl)
+        peers[self.worker_id] = self.url
+        self.peers = peers
+        if set(peers) != self.ring.workers:
+            if len(self.ring.workers) > 1 or len(peers) > 1:
+                log.info("Workers changed: %s", ", ".join(sorted(peers)))
+            self.ring = HashRing(peers)
+            self.rebalances += 1
+
+    def placement(self, bot_id: str) -> str:
+        return self.ring.owner(bot_id) or self.worker_id
+
+    async def acquire(self, bot_id: str) -> bool:
+        return await asyncio.to_thread(self.leases.acquire, bot_id, self.worker_id, self.lease_ttl)
+
+    async def release(self, bot_id: str):
+        await asyncio.to_thread(self.leases.release, bot_id, self.worker_id)
+
+    async def route(self, bot_id: str, placing: bool = False) -> Optional[str]:
+        """URL of the worker that should handle a request for the bot, or None for this one.
+
+        Requests go to the lease holder. Without a lease (the bot isn't
+        running anywhere) `placing` requests (start) go to the bot's place on
+        the ring and everything else is answered here.
+        """
+        owner = await asyncio.to_thread(self.leases.owner, bot_id)
+        if owner is not None:
+            worker_id, url = owner
+        elif placing:
+            worker_id = self.placement(bot_id)
+            url = self.peers.get(worker_id)
+        else:
+            return None
+        if worker_id == self.worker_id or not url:
+            return None
+        return url
+
+    # -- forwarding ----------------------------------------------------------
+
+    def _sign(self, worker_id: str) -> str:
+        return hmac.new(self.secret, worker_id.encode(), hashlib.sha256).hexdigest()
+
+    def is_forwarded(self, value: Optional[str]) -> bool:
+        """Whether a FORWARDED_HEADER value was set by a worker sharing the secret"""
+        if value is None:
+            return False
+        worker_id, _, signature = value.rpartition(":")
+        if worker_id and hmac.compare_digest(signature, self._sign(worker_id)):
+            return True
+        self.forged += 1
+        return False
+
+    def _headers(self, kwargs: dict) -> dict:
+        return {**kwargs.pop("headers", {}), FORWARDED_HEADER: f"{self.worker_id}:{self._sign(self.worker_id)}"}
+
+    async def forward(self, url: str, method: str, path: str, **kwargs) -> httpx.Response:
+        self.forwarded += 1
+        headers = self._headers(kwargs)
+        return await self.http.request(method, f"{url}{path}", headers=headers, **kwargs)
+
+    async def forward_stream(self, url: str, path: str, **kwargs) -> AsyncIterator[bytes]:
+        self.forwarded += 1
+        headers = self._headers(kwargs)
+        async with self.http.stream("GET", f"{url}{path}", headers=headers, timeout=None, **kwargs) as response:
+            async for chunk in response.aiter_raw():
+                yield chunk
+
+    # -- reconciliation ------------------------------------------------------
+
+    async def _reconcile_loop(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                log.error("Reconcile error: %s", e)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def check_lease(self):
+        """Raise LeaseExpired if this worker's leases may have lapsed.
+
+        Called before every send. The deadline is computed from when the last
+        renewal started, so it passes before the lease in the table does and
+        a stalled worker stops sending before anyone can take its bots over.
+        """
+        if time.time() > self.lease_deadline:
+            raise LeaseExpired()
+
+    def holds_lease(self, bot_id: str) -> bool:
+        """Whether the bot's saved state is still this worker's to write: its
+        lease wasn't taken over and hasn't possibly lapsed"""
+        return bot_id not in self.lost and time.time() <= self.lease_deadline
+
+    async def reconcile(self):
+        await self.refresh_ring()
+        running = set(self.running())
+
+        # Renew first: handing bots off and starting others takes a while
+        renewing_at = time.time()
+        lost = await asyncio.to_thread(self.leases.renew, self.worker_id, running, self.lease_ttl)
+        self.lease_deadline = renewing_at + self.lease_ttl
+
+        async def hand_off(bot_id: str):
+            try:
+                await self.stop_local(bot_id)
+                self.handed_off += 1
+            finally:
+                await self.release(bot_id)
+
+        async def give_up(bot_id: str):
+            try:
+                await self.stop_local(bot_id)
+            finally:
+                self.lost.discard(bot_id)
+
+        # A lease that expired while this worker was stalled may have been
+        # taken over; stop those bots so they don't run twice (and without
+        # saving their state over the new owner's)
+        for bot_id in lost:
+            running.discard(bot_id)
+            self.lost.add(bot_id)
+            self.leases_lost += 1
+        if lost:
+            log.warning("Lost the leases of %d bots to other workers", len(lost))
+        moved = [bot_id for bot_id in running if self.placement(bot_id) != self.worker_id]
+        if moved:
+            log.info("Handing off %d bots", len(moved))
+        await asyncio.gather(
+            *(give_up(bot_id) for bot_id in lost),
+            *(hand_off(bot_id) for bot_id in moved),
+        )
+
+        registered = await self.registered()
+        wanted = [
+            bot_id for bot_id in registered
+            if bot_id not in running and self.placement(bot_id) == self.worker_id
+        ]
+        if not wanted:
+            return
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def take_over(bot_id: str):
+            async with semaphore:
+                if bot_id in self.running() or not await self.acquire(bot_id):
+                    return
+                try:
+                    await self.start_local(bot_id)
+                    self.taken_over += 1
+                except Exception as e:
+                    await self.release(bot_id)
+                    log.warning("Could not start %s: %s", bot_id, e)
+
+        await asyncio.gather(*(take_over(bot_id) for bot_id in wanted))
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "workers": sorted(self.peers),
+            "running": len(self.running()),
+            "rebalances": self.rebalances,
+            "handed_off": self.handed_off,
+            "taken_over": self.taken_over,
+            "leases_lost": self.leases_lost,
+            "forwarded": self.forwarded,
+            "forged": self.forged,
+        }
+
+
+# -- multi-process launcher ---------------------------------------------------
+
+def _bind(host: str, port: int, reuse_port: bool = False) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def serve_worker(app, host: str, port: int, private_port: int, log_level: str = "info"):
+    """Run one worker: the shared public port (SO_REUSEPORT, the kernel spreads
+    connections) plus a private port peers forward requests to"""
+    import uvicorn
+
+    sockets = [_bind(host, port, reuse_port=True), _bind("127.0.0.1", private_port)]
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=sockets)
+
+
+def run_workers(app_path: str, host: str, port: int, workers: int, private_base: Optional[int] = None):
+    """Start `workers` processes serving `app_path` ("module:attr") and wait for them"""
+    private_base = private_base or port + 1
+    processes = []
+    for i in range(workers):
+        env = {
+            **os.environ,
+            "SHARD_WORKER_ID": f"{socket.gethostname()}-{i}",
+            "SHARD_WORKER_URL": f"http://127.0.0.1:{private_base + i}",
+        }
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "sharding", app_path, "--host", host, "--port", str(port),
+             "--private-port", str(private_base + i)],
+            env=env,
+        ))
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one backend worker")
+    parser.add_argument("app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--private-port", type=int, required=True)
+    args = parser.parse_args()
+    module, _, attr = args.app.partition(":")
+    serve_worker(getattr(importlib.import_module(module), attr), args.host, args.port, args.private_port)
@@ -0,0 +1,347 @@
+import asyncio
+import fcntl
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from bot_logging import get_logger
+
+log = get_logger("spool")
+
+SEGMENT_SUFFIX = ".seg"
+CURSOR = "cursor.json"
+
+
+class Spool:
+    """Append-only on-disk queue of rows, read back in the order they came.
+
+    `append` only encodes the row into a memory buffer (no I/O on the event
+    loop); `sync` writes the buffer with one write and one fsync, into
+    segment files of about `segment_bytes` named by their first sequence
+    number. `read` hands out the rows after the last ones read, and `ack`
+    records in `cursor.json` how far rows were shipped and deletes fully
+    shipped segments. After a restart reading resumes at the cursor, so
+    rows that were shipped but not acked come again; give them ids that make
+    a second insert harmless. Past `max_bytes` of unshipped rows `append`
+    drops rows instead of filling the disk.
+
+    Processes sharing `directory` each lock a slot of their own (`0`, `1`,
+    ...), so a restarted process takes over a free slot and the rows left
+    in it. Rows in the other free slots (left by workers that are gone, as
+    when fewer workers run than before) are moved into its own slot.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 8 << 20, max_bytes: int = 512 << 20,
+                 clock=time.time):
+        self.base = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.directory: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self._lock_file = None
+        # First sequence number of each segment on disk, ascending
+        self._segments: List[int] = []
+        self._writer = None
+        self._tail_size = 0
+        # (segment, offset) of the next row to read, and of the first unshipped one
+        self._read_at: Optional[Tuple[int, int]] = None
+        self._cursor: Optional[Tuple[int, int]] = None
+
+        self._buffer: List[bytes] = []
+        self._buffer_bytes = 0
+        self._writing_bytes = 0
+        self.disk_bytes = 0
+        self.next_seq = 1
+        self.acked_seq = 0
+        # Append time of the oldest unshipped row, when known
+        self._oldest: Optional[float] = None
+
+        self.appended = 0
+        self.dropped = 0
+        self.fsyncs = 0
+
+    # -- opening -----------------------------------------------------------
+
+    def open(self):
+        """Lock a free slot, recover its rows and adopt those of the other
+        free slots (blocking; run it in a thread)"""
+        os.makedirs(self.base, exist_ok=True)
+        slot = 0
+        while True:
+            directory = os.path.join(self.base, str(slot))
+            os.makedirs(directory, exist_ok=True)
+            lock_file = open(os.path.join(directory, "lock"), "w")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                lock_file.close()
+                slot += 1
+        self._lock_file = lock_file
+        self.directory = directory
+        with self._lock:
+            self._recover()
+        for name in sorted(os.listdir(self.base)):
+            if name.isdigit() and name != str(slot):
+                self._adopt(os.path.join(self.base, name))
+        if self.depth:
+            log.info("Spool %s has %d rows to replay", directory, self.depth)
+
+    def _adopt(self, directory: str, chunk: int = 10000):
+        """Move the unshipped rows of a free slot into this one"""
+        try:
+            lock_file = open(os.path.join(directory, "lock"), "w")
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return
+        orphan = Spool(self.base, self.segment_bytes, self.max_bytes, self.clock)
+        orphan.directory = directory
+        orphan._lock_file = lock_file
+        try:
+            orphan._recover()
+            adopted = 0
+            while True:
+                records, position = orphan._read(chunk)
+                if position is None:
+                    break
+                if not records:
+                    continue
+                first_seq = self.next_seq
+                data = b"".join(
+                    (json.dumps([first_seq + i, *record[1:]], separators=(",", ":")) + "\n").encode()
+                    for i, record in enumerate(records)
+                )
+                self._write(data, first_seq)
+                self.next_seq += len(records)
+                self.disk_bytes += len(data)
+                adopted += len(records)
+            # Only once the rows are safe here; a crash before this ships them twice
+            for name in os.listdir(directory):
+                if name.endswith(SEGMENT_SUFFIX) or name == CURSOR:
+                    os.remove(os.path.join(directory, name))
+            if adopted:
+                log.info("Moved %d unshipped rows from spool %s to %s", adopted, directory, self.directory)
+        finally:
+            orphan.close()
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:020d}{SEGMENT_SUFFIX}")
+
+    def _recover(self):
+        segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX)
+        )
+        cursor = None
+        try:
+            with open(os.path.join(self.directory, CURSOR)) as f:
+                saved = json.load(f)
+            cursor = (saved["segment"], saved["offset"], saved["seq"])
+        except FileNotFoundError:
+            pass
+        if cursor is not None and cursor[0] in segments:
+            # Segments before the cursor's were shipped; deleting them was cut short
+            for segment in [s for s in segments if s < cursor[0]]:
+                os.remove(self._path(segment))
+            segments = [s for s in segments if s >= cursor[0]]
+            self._cursor = cursor[:2]
+            self.acked_seq = cursor[2]
+        elif segments:
+            self._cursor = (segments[0], 0)
+            self.acked_seq = segments[0] - 1
+        elif cursor is not None:
+            self.acked_seq = cursor[2]
+
+        self.next_seq = self.acked_seq + 1
+        if segments:
+            # A crash mid-write can leave a torn row at the end
+            last = self._path(segments[-1])
+            with open(last, "rb+") as f:
+                data = f.read()
+                end = data.rfind(b"\n") + 1
+                if end < len(data):
+                    log.warning("Dropping a torn row at the end of %s", last)
+                    f.truncate(end)
+            if end:
+                start = data.rfind(b"\n", 0, end - 1) + 1
+                self.next_seq = max(self.next_seq, json.loads(data[start:end])[0] + 1)
+            else:
+                self.next_seq = max(self.next_seq, segments[-1])
+            self._tail_size = end
+            self._writer = open(last, "ab")
+        self._segments = segments
+        self._read_at = self._cursor
+        self.disk_bytes = sum(os.path.getsize(self._path(s)) for s in segments) - (self._cursor or (0, 0))[1]
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # -- writing -----------------------------------------------------------
+
+    @property
+    def depth(self) -> int:
+        """Rows appended and not shipped yet"""
+        return self.next_seq - 1 - self.acked_seq
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def append(self, table: str, row: dict) -> bool:
+        """Buffer a row; False if it was dropped (spool full)"""
+        if self.disk_bytes + self._buffer_bytes + self._writing_bytes >= self.max_bytes:
+            self.dropped += 1
+            return False
+        now = self.clock()
+        line = (json.dumps([self.next_seq, round(now, 3), table, row], separators=(",", ":")) + "\n").encode()
+        if not self.depth:
+            self._oldest = now
+        self.next_seq += 1
+        self._buffer.append(line)
+        self._buffer_bytes += len(line)
+        self.appended += 1
+        return True
+
+    async def sync(self):
+        """Write and fsync the buffered rows"""
+        async with self._sync_lock:
+            if not self._buffer:
+                return
+            lines, self._buffer = self._buffer, []
+            nbytes, self._buffer_bytes = self._buffer_bytes, 0
+            self._writing_bytes = nbytes
+            try:
+                await asyncio.to_thread(self._write, b"".join(lines), self.next_seq - len(lines))
+            except Exception:
+                # Kept in memory, ahead of anything buffered meanwhile
+                self._buffer[:0] = lines
+                self._buffer_bytes += nbytes
+                raise
+            finally:
+                self._writing_bytes = 0
+            self.disk_bytes += nbytes
+            self.fsyncs += 1
+
+    def _write(self, data: bytes, first_seq: int):
+        with self._lock:
+            if self._writer is None or self._tail_size >= self.segment_bytes:
+                self._rotate(first_seq)
+            self._writer.write(data)
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._tail_size += len(data)
+
+    def _rotate(self, first_seq: int):
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = open(self._path(first_seq), "ab")
+        self._tail_size = 0
+        self._segments.append(first_seq)
+        if self._read_at is None:
+            self._read_at = self._cursor = (first_seq, 0)
+        # The new file's directory entry must survive a crash too
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # -- reading -----------------------------------------------------------
+
+    async def read(self, limit: int) -> Tuple[list, Optional[tuple]]:
+        """Up to `limit` synced rows as [seq, time, table, row], and the
+        position to `ack` once they are shipped"""
+        from_cursor = self._read_at == self._cursor
+        records, position = await asyncio.to_thread(self._read, limit)
+        if records and from_cursor:
+            self._oldest = records[0][1]
+        return records, position
+
+    def _read(self, limit: int) -> Tuple[list, Optional[tuple]]:
+        with self._lock:
+            if self._read_at is None:
+                return [], None
+            segment, offset = self._read_at
+            records = []
+            nbytes = 0
+            while True:
+                path = self._path(segment)
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    while len(records) < limit:
+                        line = f.readline()
+                        if not line:
+                            break
+                        offset += len(line)
+                        nbytes += len(line)
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            log.warning("Skipping a corrupt row in %s", path)
+                if len(records) >= limit:
+                    break
+                index = self._segments.index(segment) + 1
+                if index >= len(self._segments):
+                    break
+                segment, offset = self._segments[index], 0
+            self._read_at = (segment, offset)
+            if not nbytes:
+                return [], None
+            return records, (segment, offset, records[-1][0] if records else self.acked_seq, nbytes)
+
+    async def ack(self, position: tuple):
+        """Mark everything up to `position` (from `read`) as shipped"""
+        segment, offset, seq, nbytes = position
+        await asyncio.to_thread(self._ack, segment, offset, seq)
+        self._cursor = (segment, offset)
+        self.acked_seq = max(self.acked_seq, seq)
+        self.disk_bytes -= nbytes
+        if not self.depth:
+            self._oldest = None
+
+    def _ack(self, segment: int, offset: int, seq: int):
+        with self._lock:
+            path = os.path.join(self.directory, CURSOR)
+            with open(path + ".tmp", "w") as f:
+                json.dump({"segment": segment, "offset": offset, "seq": seq}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            for shipped in [s for s in self._segments if s < segment]:
+                os.remove(self._path(shipped))
+                self._segments.remove(shipped)
+
+    # -- stats -------------------------------------------------------------
+
+    @property
+    def lag(self) -> float:
+        """Seconds the oldest unshipped row has been waiting"""
+        if not self.depth or self._oldest is None:
+            return 0.0
+        return max(0.0, self.clock() - self._oldest)
+
+    def stats(self) -> dict:
+        return {
+            "slot": os.path.basename(self.directory) if self.directory else None,
+            "rows": self.depth,
+            "bytes": self.disk_bytes + self._buffer_bytes + self._writing_bytes,
+            "segments": len(self._segments),
+            "lag_seconds": round(self.lag, 3),
+            "appended": self.appended,
+            "dropped": self.dropped,
+            "fsyncs": self.fsyncs,
+        }
@@ -0,0 +1,130 @@
+import asyncio
+from typing import Callable, Dict, Iterable, Optional, Set
+
+
+class StatsSubscription:
+    """One viewer's set of bots and the changes not yet sent to it.
+
+    Deltas for the same bot are merged until the viewer reads them, so a slow
+    viewer holds at most one pending entry per subscribed bot.
+    """
+
+    __slots__ = ("bot_ids", "pending", "_ready")
+
+    def __init__(self, bot_ids: Iterable[str]):
+        self.bot_ids: Set[str] = set(bot_ids)
+        self.pending: Dict[str, dict] = {}
+        self._ready = asyncio.Event()
+
+    def push(self, bot_id: str, delta: dict):
+        entry = self.pending.get(bot_id)
+        if entry is None:
+            self.pending[bot_id] = dict(delta)
+        else:
+            entry.update(delta)
+        self._ready.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Dict[str, dict]:
+        """Wait for changes and take them all; empty on timeout"""
+        if not self.pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._ready.clear()
+        pending, self.pending = self.pending, {}
+        return pending
+
+
+class StatsHub:
+    """Pushes coalesced per-bot stats changes to subscribed viewers.
+
+    The send path and handlers call `touch(bot_id)` (a set insert, and only
+    for bots someone watches). Every `interval` seconds the hub snapshots
+    the touched bots once, diffs each snapshot against the last published
+    one and hands the changed fields to every subscription of that bot.
+    Fields that disappear are published as None.
+    """
+
+    def __init__(self, snapshot: Callable[[str], dict], interval: float = 1.0):
+        self.snapshot = snapshot
+        self.interval = interval
+        self._subscribers: Dict[str, Set[StatsSubscription]] = {}
+        self._last: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+        self._ticker: Optional[asyncio.Task] = None
+
+        self.ticks = 0
+        self.deltas = 0
+
+    async def start(self):
+        if self._ticker is None:
+            self._ticker = asyncio.create_task(self._tick_loop())
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+
+    def touch(self, bot_id: str):
+        if bot_id in self._subscribers:
+            self._dirty.add(bot_id)
+
+    def subscribe(self, bot_ids: Iterable[str]) -> StatsSubscription:
+        """Register a viewer; its first message holds full snapshots"""
+        subscription = StatsSubscription(bot_ids)
+        for bot_id in subscription.bot_ids:
+            # Bring existing viewers up to date first so everyone diffs
+            # against the same snapshot
+            self._publish(bot_id)
+            self._subscribers.setdefault(bot_id, set()).add(subscription)
+            subscription.push(bot_id, self._last[bot_id])
+        return subscription
+
+    def unsubscribe(self, subscription: StatsSubscription):
+        for bot_id in subscription.bot_ids:
+            subscribers = self._subscribers.get(bot_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[bot_id]
+                self._last.pop(bot_id, None)
+                self._dirty.discard(bot_id)
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        self.ticks += 1
+        dirty, self._dirty = self._dirty, set()
+        for bot_id in dirty:
+            self._publish(bot_id)
+
+    def _publish(self, bot_id: str):
+        snapshot = self.snapshot(bot_id)
+        previous = self._last.get(bot_id)
+        self._last[bot_id] = snapshot
+        if previous is None:
+            return
+        delta = {k: v for k, v in snapshot.items() if k not in previous or previous[k] != v}
+        delta.update({k: None for k in previous if k not in snapshot})
+        if not delta:
+            return
+        self.deltas += 1
+        for subscription in self._subscribers.get(bot_id, ()):
+            subscription.push(bot_id, delta)
+
+    def stats(self) -> dict:
+        return {
+            "viewers": len({s for subs in self._subscribers.values() for s in subs}),
+            "watched_bots": len(self._subscribers),
+            "ticks": self.ticks,
+            "deltas": self.deltas,
+        }
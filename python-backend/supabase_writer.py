@@ -0,0 +1,531 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from bot_logging import get_logger
+from metrics import REGISTRY
+from spool import Spool
+
+log = get_logger("supabase")
+
+# Labelled by PostgREST path (a table or rpc/<function>) and status code
+REQUEST_SECONDS = REGISTRY.histogram(
+    "supabase_request_seconds", "Latency of Supabase (PostgREST) requests", ["path"]
+)
+RESPONSES = REGISTRY.counter(
+    "supabase_responses", "Supabase responses by status code ('error' if the request failed)", ["path", "code"]
+)
+
+
+def observe_request(path: str, started: float, code):
+    REQUEST_SECONDS.labels(path).observe(time.perf_counter() - started)
+    RESPONSES.labels(path, code).inc()
+
+
+# SQLSTATE classes of errors caused by the rows themselves: data exceptions
+# (e.g. an invalid uuid) and integrity constraint violations
+ROW_ERROR_CLASSES = ("22", "23")
+
+
+def rejects_rows(response: httpx.Response) -> bool:
+    """Whether Postgres refused the rows sent, so sending them again can't
+    succeed. Other 4xx (a bad key, a missing table or function) concern any
+    rows and are retried like a 5xx."""
+    if response.status_code not in (400, 409, 422):
+        return False
+    try:
+        body = response.json()
+    except ValueError:
+        return False
+    code = body.get("code") if isinstance(body, dict) else None
+    return isinstance(code, str) and code[:2] in ROW_ERROR_CLASSES
+
+
+class SupabaseWriter:
+    """Batched, non-blocking writer for Supabase (PostgREST) inserts.
+
+    Rows are queued in memory and a background task ships them as multi-row
+    inserts (one JSON array per table) over a single pooled HTTP client.
+
+    With a `spool` the queue is on disk instead: rows are appended to it,
+    and the background task ships them in order and only then marks them
+    shipped, retrying with backoff (up to `max_retry_delay`) for as long as
+    Supabase is failing, and across restarts. Spooled rows get a uuid `id`
+    and are inserted with `resolution=ignore-duplicates`, so rows replayed
+    after a crash between insert and ack are not inserted twice.
+
+    A batch Postgres rejects for its contents (`rejects_rows`) is split
+    until the rows at fault are found; those are logged and dropped, the
+    rest inserted. Any other failure, including 401/403/404, keeps the rows
+    for a retry.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str],
+        key: Optional[str],
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        timeout: float = 10.0,
+        spool: Optional[Spool] = None,
+        max_retry_delay: float = 30.0,
+    ):
+        self.url = url.rstrip("/") if url else url
+        self.key = key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.spool = spool
+        self.max_retry_delay = max_retry_delay
+
+        self.http: Optional[httpx.AsyncClient] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._spool_opened = False
+
+        # Counters (exposed via /health)
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.requests = 0
+        self.request_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url and self.key)
+
+    def headers(self, content_type: bool = True) -> Dict[str, str]:
+        headers = {
+            "apikey": self.key,
+            "Authorization": f"Bearer {self.key}",
+        }
+        if content_type:
+            headers["Content-Type"] = "application/json"
+        return headers
+
+    async def start(self):
+        """Open the pooled HTTP client and start the background flusher"""
+        if self.http is None:
+            self.http = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if self.spool is not None and self.enabled and not self._spool_opened:
+            await asyncio.to_thread(self.spool.open)
+            self._spool_opened = True
+        if self._flusher is None and self.enabled:
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            loop = self._replay_loop() if self.spool is not None else self._flush_loop()
+            self._flusher = asyncio.create_task(loop)
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Flush everything still queued and close the HTTP client.
+
+        With a `timeout`, shipping stops after that many seconds: spooled
+        rows stay on disk for the next start, queued ones are dropped.
+        """
+        if self._flusher is not None:
+            self._closing = True
+            self._wakeup.set()
+            try:
+                # Wake the flusher if it is idle waiting for rows
+                self._queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+            done, _ = await asyncio.wait([self._flusher], timeout=timeout)
+            if not done:
+                self._flusher.cancel()
+                await asyncio.gather(self._flusher, return_exceptions=True)
+                if self.spool is not None:
+                    log.warning("Supabase flush cut off after %.1fs; %d rows left in the spool", timeout, self.pending)
+                else:
+                    left = len(self._take(self._queue.qsize()))
+                    self.rows_dropped += left
+                    log.warning("Supabase flush cut off after %.1fs; %d queued rows dropped", timeout, left)
+            self._flusher = None
+        if self._spool_opened:
+            # Whatever wasn't shipped stays on disk for the next start
+            await self.spool.sync()
+            await asyncio.to_thread(self.spool.close)
+            self._spool_opened = False
+        if self.http is not None:
+            await self.http.aclose()
+            self.http = None
+
+    def enqueue(self, table: str, row: dict) -> bool:
+        """Queue a row for insertion; never blocks. Returns False if dropped."""
+        if not self.enabled:
+            return False
+        if self.spool is not None:
+            if "id" not in row:
+                row = {**row, "id": str(uuid.uuid4())}
+            if not self.spool.append(table, row):
+                self.rows_dropped += 1
+                return False
+            buffered = self.spool.buffered
+            if buffered == 1 or buffered >= self.batch_size:
+                self._wakeup.set()
+            return True
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        try:
+            self._queue.put_nowait((table, row))
+            return True
+        except asyncio.QueueFull:
+            self.rows_dropped += 1
+            return False
+
+    @property
+    def pending(self) -> int:
+        if self.spool is not None:
+            return self.spool.depth
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _flush_loop(self):
+        while not self._closing:
+            batch = await self._collect()
+            if batch:
+                await self._write_batch(batch)
+        # Shutdown: ship whatever is left without long retry chains
+        while not self._queue.empty():
+            batch = self._take(self.batch_size)
+            if batch:
+                await self._write_batch(batch, final=True)
+
+    async def _replay_loop(self):
+        """Ship spooled rows in order, each batch until it is in (or rejected)"""
+        spool = self.spool
+        batch, position, failures = None, None, 0
+        while True:
+            await self._sync()
+            if batch is None:
+                records, position = await spool.read(self.batch_size)
+                if not records:
+                    if position is not None:
+                        # Only corrupt rows, skipped
+                        await spool.ack(position)
+                        continue
+                    if self._closing:
+                        break
+                    await self._wait(None)
+                    if spool.buffered < self.batch_size:
+                        # Let a batch fill up, like the in-memory queue does
+                        await self._wait(self.flush_interval)
+                    continue
+                batch = self._group(records)
+            if await self._ship(batch):
+                await spool.ack(position)
+                batch, failures = None, 0
+                continue
+            if self._closing:
+                # Left in the spool for the next start
+                break
+            failures += 1
+            delay = min(self.retry_backoff * 2 ** min(failures - 1, 16), self.max_retry_delay)
+            await self._backoff(delay + random.uniform(0, delay / 2))
+
+    async def _sync(self):
+        try:
+            await self.spool.sync()
+        except Exception as e:
+            log.error("Spool write failed: %s", e)
+
+    async def _wait(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _backoff(self, delay: float):
+        """Sleep before a retry, still syncing new rows to disk meanwhile"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        while not self._closing:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await self._wait(min(remaining, self.flush_interval))
+            await self._sync()
+
+    @staticmethod
+    def _group(records: list) -> List[list]:
+        """[table, rows, shipped] per table and column set, in spool order"""
+        groups: Dict[Tuple[str, Tuple[str, ...]], list] = {}
+        for _, _, table, row in records:
+            key = (table, tuple(sorted(row)))
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [table, [], False]
+            group[1].append(row)
+        return list(groups.values())
+
+    async def _ship(self, batch: List[list]) -> bool:
+        """Insert the groups of a batch not shipped yet; False to retry later"""
+        for group in batch:
+            table, rows, shipped = group
+            if shipped:
+                continue
+            left = await self._insert(table, rows, "return=minimal,resolution=ignore-duplicates")
+            if left:
+                # Only the rows that weren't inserted (or rejected) are retried
+                group[1] = left
+                return False
+            group[2] = True
+        return True
+
+    async def _collect(self) -> List[Tuple[str, dict]]:
+        """Wait for the first row, then collect until the batch is full or the interval elapses"""
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size and not self._closing:
+            remaining = deadline - loop.time()
+            if batch and remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), max(remaining, 0) if batch else None)
+            except asyncio.TimeoutError:
+                break
+            if item is not None:
+                batch.append(item)
+            # Take whatever is already queued without awaiting each row
+            batch.extend(self._take(self.batch_size - len(batch)))
+        return batch
+
+    def _take(self, n: int) -> List[Tuple[str, dict]]:
+        items = []
+        while len(items) < n and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                items.append(item)
+        return items
+
+    async def _write_batch(self, batch: List[Tuple[str, dict]], final: bool = False):
+        # PostgREST bulk inserts need the same keys in every object, so group
+        # by table and column set.
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[dict]] = {}
+        for table, row in batch:
+            groups.setdefault((table, tuple(sorted(row))), []).append(row)
+
+        for (table, _), rows in groups.items():
+            await self.insert_rows(table, rows, retries=min(1, self.max_retries) if final else self.max_retries)
+
+    async def insert_rows(self, table: str, rows: List[dict], retries: Optional[int] = None) -> bool:
+        """POST rows as one multi-row insert, retrying with backoff"""
+        if retries is None:
+            retries = self.max_retries
+
+        for attempt in range(retries + 1):
+            rows = await self._insert(table, rows, "return=minimal")
+            if not rows:
+                return True
+
+            if attempt < retries:
+                delay = self.retry_backoff * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+        self.rows_dropped += len(rows)
+        return False
+
+    async def _insert(self, table: str, rows: List[dict], prefer: str) -> List[dict]:
+        """Insert rows; returns those to retry (the request failed).
+
+        A batch Postgres rejects for its rows is split in half and each half
+        tried again, so only the rows it refuses are dropped, not the valid
+        ones sharing their batch.
+        """
+        response = await self._post(table, rows, prefer)
+        if response is not None and response.status_code in (200, 201, 204):
+            self.rows_written += len(rows)
+            return []
+        if response is None or not rejects_rows(response):
+            return rows
+        if len(rows) == 1:
+            # Won't succeed on retry either
+            self.rows_dropped += 1
+            log.warning("Dropped a row rejected by %s (%s): %s", table, response.status_code,
+                        json.dumps(rows[0], default=str)[:300])
+            return []
+        middle = len(rows) // 2
+        return await self._insert(table, rows[:middle], prefer) + await self._insert(table, rows[middle:], prefer)
+
+    async def _post(self, table: str, rows: List[dict], prefer: str) -> Optional[httpx.Response]:
+        """One insert request; its response, or None if it failed to complete"""
+        if self.http is None:
+            await self.start()
+        started = time.perf_counter()
+        self.requests += 1
+        try:
+            response = await self.http.post(
+                f"{self.url}/rest/v1/{table}",
+                json=rows,
+                headers={**self.headers(), "Prefer": prefer},
+            )
+        except Exception as e:
+            observe_request(table, started, "error")
+            self.request_errors += 1
+            log.warning("Insert into %s error: %s", table, e)
+            return None
+        observe_request(table, started, response.status_code)
+        if response.status_code not in (200, 201, 204):
+            self.request_errors += 1
+            log.warning("Insert into %s failed: %s - %s", table, response.status_code, response.text[:200])
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "written": self.rows_written,
+            "dropped": self.rows_dropped,
+            "requests": self.requests,
+            "request_errors": self.request_errors,
+            "spool": self.spool.stats() if self.spool is not None else None,
+        }
+
+
+class GroupStatsCounter:
+    """Collects per-(bot_id, group_id) message deltas and flushes them periodically.
+
+    Each flush is a single call to the `increment_group_stats` RPC
+    (scripts/013_add_group_stats_rpc.sql), which applies every delta as an
+    atomic `messages_sent = messages_sent + delta` update on the server.
+
+    Deltas of a flush cut off or failing with a network error, 429 or 5xx
+    are merged back and sent with the next one. Counting is at least once: a
+    flush that times out after the server applied it is sent again, counting
+    those messages twice. A call Postgres rejects for its rows (say a bot_id
+    the RPC can't cast to uuid) is split until the deltas at fault are found;
+    those, and the whole call on any other 4xx, are logged and dropped.
+    """
+
+    RPC = "increment_group_stats"
+
+    def __init__(self, writer: SupabaseWriter, flush_interval: float = 5.0):
+        self.writer = writer
+        self.flush_interval = flush_interval
+        # (bot_id, group_id) -> [delta, last_message_at]
+        self._deltas: Dict[Tuple[str, int], list] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+        self.flushes = 0
+        self.flush_errors = 0
+        self.dropped = 0
+
+    def add(self, bot_id: str, group_id: int, count: int = 1):
+        entry = self._deltas.get((bot_id, group_id))
+        now = datetime.utcnow().isoformat()
+        if entry is None:
+            self._deltas[(bot_id, group_id)] = [count, now]
+        else:
+            entry[0] += count
+            entry[1] = now
+
+    @property
+    def pending(self) -> int:
+        return len(self._deltas)
+
+    async def start(self):
+        if self._flusher is None and self.writer.enabled:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the periodic flushes (one in flight completes) and flush the rest"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Cancelling the loop (stop) must not abort a call the server may
+            # already be applying; stop's own flush waits for it on the lock
+            await asyncio.shield(self.flush())
+
+    async def flush(self) -> bool:
+        """Send all pending deltas in one RPC call; returns whether none are left to retry"""
+        async with self._lock:
+            if not self._deltas or not self.writer.enabled:
+                return True
+            deltas, self._deltas = self._deltas, {}
+
+            if self.writer.http is None:
+                await self.writer.start()
+            self.flushes += 1
+            retry = deltas
+            try:
+                retry = await self._send(deltas)
+            finally:
+                if retry:
+                    # Merge back so the next flush retries them (also when cancelled)
+                    self.flush_errors += 1
+                    for key, (delta, last_at) in retry.items():
+                        entry = self._deltas.get(key)
+                        if entry is None:
+                            self._deltas[key] = [delta, last_at]
+                        else:
+                            entry[0] += delta
+            return not retry
+
+    async def _send(self, deltas: Dict[Tuple[str, int], list]) -> Dict[Tuple[str, int], list]:
+        """One RPC call with the deltas; returns those to retry"""
+        rows = [
+            {"bot_id": bot_id, "group_id": group_id, "delta": delta, "last_message_at": last_at}
+            for (bot_id, group_id), (delta, last_at) in deltas.items()
+        ]
+        started = time.perf_counter()
+        try:
+            response = await self.writer.http.post(
+                f"{self.writer.url}/rest/v1/rpc/{self.RPC}",
+                json={"p_rows": rows},
+                headers=self.writer.headers(),
+            )
+        except Exception as e:
+            observe_request(f"rpc/{self.RPC}", started, "error")
+            log.warning("Group stats flush error: %s", e)
+            return deltas
+        observe_request(f"rpc/{self.RPC}", started, response.status_code)
+        code = response.status_code
+        if code in (200, 204):
+            return {}
+        log.warning("Group stats flush failed: %s - %s", code, response.text[:200])
+        if code == 429 or not 400 <= code < 500:
+            return deltas
+        if rejects_rows(response) and len(deltas) > 1:
+            items = list(deltas.items())
+            middle = len(items) // 2
+            return {**await self._send(dict(items[:middle])), **await self._send(dict(items[middle:]))}
+        # Won't succeed on retry either
+        self.dropped += sum(delta for delta, _ in deltas.values())
+        log.warning("Dropped group stats rejected by %s (%s): %s", self.RPC, code, json.dumps(rows, default=str)[:300])
+        return {}
+
+    def stats(self) -> dict:
+        return {
+            "pending_keys": self.pending,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "dropped": self.dropped,
+        }
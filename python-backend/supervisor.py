@@ -0,0 +1,227 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bot_logging import get_logger
+
+log = get_logger("supervisor")
+
+# Task states
+RUNNING = "running"
+BACKOFF = "backoff"  # failed, waiting to be restarted
+DONE = "done"
+FAILED = "failed"  # failed and not restarted
+CANCELLED = "cancelled"
+STATES = (RUNNING, BACKOFF, DONE, FAILED, CANCELLED)
+
+
+class _Timed:
+    """Awaitable that drives a coroutine and charges each step's time to `entry`.
+
+    asyncio has no per-task accounting; a step is what runs between two
+    suspensions, so timing `send()` / `throw()` gives how long the task held
+    the event loop: its CPU time plus any blocking call (but not that of
+    tasks it spawns). perf_counter is used because the thread CPU clock is
+    a syscall, several times the cost of an await.
+    """
+
+    __slots__ = ("coro", "entry")
+
+    def __init__(self, coro, entry: "SupervisedTask"):
+        self.coro = coro
+        self.entry = entry
+
+    def __await__(self):
+        coro, entry = self.coro, self.entry
+        value, error = None, None
+        while True:
+            started = time.perf_counter()
+            try:
+                if error is not None:
+                    yielded = coro.throw(error)
+                else:
+                    yielded = coro.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                entry.last_step_at = now = time.perf_counter()
+                entry.busy_time += now - started
+                entry.steps += 1
+            try:
+                value, error = (yield yielded), None
+            except BaseException as e:
+                value, error = None, e
+
+
+class SupervisedTask:
+    __slots__ = (
+        "owner", "name", "factory", "restart", "task", "state", "restarts",
+        "last_error", "last_error_at", "started_at", "run_started", "wall_time",
+        "busy_time", "steps", "last_step_at",
+    )
+
+    def __init__(self, owner: Optional[str], name: str, factory: Callable[[], Awaitable], restart: bool):
+        self.owner = owner
+        self.name = name
+        self.factory = factory
+        self.restart = restart
+        self.task: Optional[asyncio.Task] = None
+        self.state = RUNNING
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.last_error_at: Optional[float] = None
+        # Wall clock of the first start; monotonic start of the current run
+        self.started_at = time.time()
+        self.run_started: Optional[float] = None
+        self.wall_time = 0.0
+        self.busy_time = 0.0
+        self.steps = 0
+        self.last_step_at = time.perf_counter()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        wall = self.wall_time + (now - self.run_started if self.run_started is not None else 0.0)
+        return {
+            "owner": self.owner,
+            "name": self.name,
+            "state": self.state,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "started_at": self.started_at,
+            "wall_time": round(wall, 3),
+            "busy_time": round(self.busy_time, 6),
+            "steps": self.steps,
+            # Seconds since the task last ran; a loop that should tick but
+            # keeps growing this is stuck on an await
+            "idle_for": round(time.perf_counter() - self.last_step_at, 3),
+        }
+
+
+class TaskSupervisor:
+    """Owns the background tasks of each bot (and of the app).
+
+    Every task is referenced here until it is cancelled, so none is garbage
+    collected mid-run and no exception goes unnoticed. Tasks spawned with
+    `restart=True` are started again after an exception, waiting
+    `restart_delay` seconds, doubled after every failure up to
+    `max_restart_delay` and reset once a run lasted `healthy_after` seconds.
+    A task that returns is done; loops return once their bot stops.
+    One-off tasks spawned with `transient=True` are forgotten once they end.
+
+    `observe_failure(name)` is called with the task name on every exception.
+    """
+
+    def __init__(
+        self,
+        restart_delay: float = 5.0,
+        max_restart_delay: float = 300.0,
+        healthy_after: float = 60.0,
+        observe_failure: Optional[Callable[[str], None]] = None,
+    ):
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.healthy_after = healthy_after
+        self.observe_failure = observe_failure
+        # owner -> name -> task
+        self._tasks: Dict[Optional[str], Dict[str, SupervisedTask]] = {}
+
+        self.spawned = 0
+        self.failures = 0
+
+    def spawn(self, owner: Optional[str], name: str, factory: Callable[[], Awaitable],
+              restart: bool = False, transient: bool = False) -> SupervisedTask:
+        """Run `factory()` as `owner`'s task `name`, replacing a finished one of that name"""
+        tasks = self._tasks.setdefault(owner, {})
+        previous = tasks.get(name)
+        if previous is not None and previous.task is not None and not previous.task.done():
+            raise RuntimeError(f"Task {name} of {owner} is already running")
+        entry = SupervisedTask(owner, name, factory, restart)
+        entry.task = asyncio.create_task(self._run(entry), name=f"{owner}:{name}")
+        tasks[name] = entry
+        if transient:
+            entry.task.add_done_callback(lambda _: self._forget(entry))
+        self.spawned += 1
+        return entry
+
+    def _forget(self, entry: SupervisedTask):
+        tasks = self._tasks.get(entry.owner)
+        if tasks is not None and tasks.get(entry.name) is entry:
+            del tasks[entry.name]
+            if not tasks:
+                del self._tasks[entry.owner]
+
+    async def _run(self, entry: SupervisedTask):
+        extra = {"bot_id": entry.owner} if entry.owner else {}
+        delay = self.restart_delay
+        while True:
+            entry.state = RUNNING
+            entry.run_started = time.monotonic()
+            try:
+                await _Timed(entry.factory(), entry)
+                entry.state = DONE
+                return
+            except asyncio.CancelledError:
+                entry.state = CANCELLED
+                raise
+            except Exception as e:
+                self.failures += 1
+                if self.observe_failure is not None:
+                    self.observe_failure(entry.name)
+                entry.last_error = f"{type(e).__name__}: {e}"
+                entry.last_error_at = time.time()
+                if not entry.restart:
+                    entry.state = FAILED
+                    log.error("Task %s failed: %s", entry.name, entry.last_error, extra=extra)
+                    return
+                if time.monotonic() - entry.run_started >= self.healthy_after:
+                    delay = self.restart_delay
+                entry.state = BACKOFF
+                log.error("Task %s failed: %s; restarting in %.0fs", entry.name, entry.last_error, delay, extra=extra)
+            finally:
+                entry.wall_time += time.monotonic() - entry.run_started
+                entry.run_started = None
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                entry.state = CANCELLED
+                raise
+            delay = min(delay * 2, self.max_restart_delay)
+            entry.restarts += 1
+
+    async def cancel(self, owner: Optional[str]):
+        """Cancel and await every task of `owner`, and forget them"""
+        tasks = self._tasks.pop(owner, {})
+        await self._cancel([entry.task for entry in tasks.values()])
+
+    async def stop(self):
+        """Cancel and await every task (app shutdown)"""
+        tasks = [entry.task for owned in self._tasks.values() for entry in owned.values()]
+        self._tasks.clear()
+        await self._cancel(tasks)
+
+    async def _cancel(self, tasks: List[asyncio.Task]):
+        current = asyncio.current_task()
+        tasks = [task for task in tasks if task is not None and task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def tasks(self, owner: Optional[str] = None) -> List[dict]:
+        if owner is not None:
+            return [entry.snapshot() for entry in self._tasks.get(owner, {}).values()]
+        return [entry.snapshot() for owned in self._tasks.values() for entry in owned.values()]
+
+    def state(self, owner: Optional[str], name: str) -> Optional[str]:
+        entry = self._tasks.get(owner, {}).get(name)
+        return entry.state if entry is not None else None
+
+    def stats(self) -> dict:
+        states = Counter(entry.state for owned in self._tasks.values() for entry in owned.values())
+        return {
+            "tasks": sum(states.values()),
+            "states": {state: states[state] for state in STATES},
+            "spawned": self.spawned,
+            "failures": self.failures,
+        }
@@ -0,0 +1,465 @@
+import array
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bot_logging import get_logger
+
+log = get_logger("timeseries")
+
+# Counters kept per bot, and per group of a bot
+BOT_FIELDS = ("messages_sent", "messages_failed", "auto_replies", "auto_replies_suppressed")
+GROUP_FIELDS = ("messages_sent", "messages_failed")
+
+# Resolutions: name -> (level stored on disk, bucket width in seconds)
+MINUTE, HOUR, DAY = "minute", "hour", "day"
+RESOLUTIONS = {MINUTE: (0, 60), HOUR: (1, 3600), DAY: (2, 86400)}
+
+# group_id of a bot's own series
+BOT = 0
+
+# Most buckets one query returns; wider ranges use a coarser resolution
+MAX_POINTS = 2000
+PRUNE_INTERVAL = 3600.0
+
+
+class Layout:
+    """Counters and the resolutions (with how many buckets each keeps) of one kind of series"""
+
+    __slots__ = ("fields", "index", "levels", "by_name", "by_level")
+
+    def __init__(self, fields: Tuple[str, ...], sizes: Dict[str, int]):
+        self.fields = fields
+        self.index = {field: i for i, field in enumerate(fields)}
+        # (resolution, level, step, size), finest first
+        self.levels = tuple(
+            (name, level, step, sizes[name])
+            for name, (level, step) in RESOLUTIONS.items()
+            if sizes.get(name, 0) > 0
+        )
+        self.by_name = {entry[0]: entry for entry in self.levels}
+        self.by_level = {entry[1]: position for position, entry in enumerate(self.levels)}
+
+
+class Series:
+    """One bot's or group's counters: a ring of buckets per resolution.
+
+    Each ring is a flat uint32 array of `size * len(fields)` counters;
+    bucket `b` (unix time // step) lives in slot `b % size`. `last` is the
+    newest bucket written, so the ring holds buckets `last - size + 1` up
+    to `last`, and moving to a newer bucket zeroes the slots it skips.
+    `dirty` is the oldest bucket changed since the last flush.
+    """
+
+    __slots__ = ("layout", "last", "counts", "dirty")
+
+    def __init__(self, layout: Layout):
+        width = len(layout.fields)
+        self.layout = layout
+        self.last = [0] * len(layout.levels)
+        self.counts = [array.array("I", bytes(4 * size * width)) for _, _, _, size in layout.levels]
+        self.dirty: List[Optional[int]] = [None] * len(layout.levels)
+
+    def _advance(self, position: int, bucket: int):
+        _, _, _, size = self.layout.levels[position]
+        width = len(self.layout.fields)
+        counts = self.counts[position]
+        last = self.last[position]
+        if bucket - last >= size:
+            counts[:] = array.array("I", bytes(4 * len(counts)))
+        else:
+            zero = array.array("I", bytes(4 * width))
+            for skipped in range(last + 1, bucket + 1):
+                slot = (skipped % size) * width
+                counts[slot:slot + width] = zero
+        self.last[position] = bucket
+
+    def add(self, field: int, now: float, count: int = 1):
+        width = len(self.layout.fields)
+        last, dirty = self.last, self.dirty
+        position = 0
+        for _, _, step, size in self.layout.levels:
+            bucket = int(now // step)
+            if bucket > last[position]:
+                self._advance(position, bucket)
+            elif bucket <= last[position] - size:
+                position += 1
+                continue
+            self.counts[position][(bucket % size) * width + field] += count
+            if dirty[position] is None or bucket < dirty[position]:
+                dirty[position] = bucket
+            position += 1
+
+    def merge(self, position: int, bucket: int, values: array.array):
+        """Add a stored bucket's counters"""
+        _, _, _, size = self.layout.levels[position]
+        if bucket > self.last[position]:
+            self._advance(position, bucket)
+        elif bucket <= self.last[position] - size:
+            return
+        width = len(values)
+        slot = (bucket % size) * width
+        counts = self.counts[position]
+        if any(counts[slot:slot + width]):
+            for i, value in enumerate(values):
+                counts[slot + i] += value
+        else:
+            counts[slot:slot + width] = values
+
+    def absorb(self, other: "Series"):
+        """Add every bucket `other` holds (stored history into a series counted before its load)"""
+        width = len(self.layout.fields)
+        for position, (_, _, _, size) in enumerate(self.layout.levels):
+            counts = other.counts[position]
+            newest = other.last[position]
+            for bucket in range(max(0, newest - size + 1), newest + 1):
+                slot = (bucket % size) * width
+                values = counts[slot:slot + width]
+                if any(values):
+                    self.merge(position, bucket, values)
+
+    def take_dirty(self) -> List[Tuple[int, int, bytes]]:
+        """(level, bucket, counters) of every bucket changed since the last call"""
+        width = len(self.layout.fields)
+        rows = []
+        for position, (_, level, _, size) in enumerate(self.layout.levels):
+            dirty = self.dirty[position]
+            if dirty is None:
+                continue
+            self.dirty[position] = None
+            last = self.last[position]
+            counts = self.counts[position]
+            for bucket in range(max(dirty, last - size + 1), last + 1):
+                slot = (bucket % size) * width
+                values = counts[slot:slot + width]
+                # A zero bucket has nothing stored either (memory holds stored + new counts)
+                if any(values):
+                    rows.append((level, bucket, values.tobytes()))
+        return rows
+
+    def mark(self, level: int, bucket: int):
+        position = self.layout.by_level.get(level)
+        if position is not None and (self.dirty[position] is None or bucket < self.dirty[position]):
+            self.dirty[position] = bucket
+
+    def read(self, position: int, first: int, last: int) -> List[List[int]]:
+        """Counters of buckets `first..last`, one list per field"""
+        width = len(self.layout.fields)
+        _, _, _, size = self.layout.levels[position]
+        counts = self.counts[position]
+        newest = self.last[position]
+        columns = [[0] * (last - first + 1) for _ in range(width)]
+        for bucket in range(max(first, newest - size + 1), min(last, newest) + 1):
+            slot = (bucket % size) * width
+            for field in range(width):
+                columns[field][bucket - first] = counts[slot + field]
+        return columns
+
+    @property
+    def nbytes(self) -> int:
+        return sum(counts.buffer_info()[1] * counts.itemsize for counts in self.counts)
+
+
+class TimeSeriesStore:
+    """Per-bot and per-group counters in time buckets, kept locally.
+
+    Every counted event goes to each resolution at once: minute buckets for
+    the last `minutes`, hour buckets for `hours`, day buckets (UTC days) for
+    `days`; groups keep hours and days only. Series of running bots live in
+    memory (`Series`, fixed-size arrays), changed buckets are written to
+    SQLite by `flush()` and a bot's series are read back by `load()` when
+    it starts. `query()` serves running bots from memory and stopped ones
+    from disk, so history survives stops and restarts. Buckets older than
+    their resolution keeps are pruned from disk (per bot, at most hourly,
+    when its buckets are flushed).
+
+    `add()` runs on the event loop; `load()`, `flush()` and `query()` do
+    their SQLite work in a thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        minutes: int = 1440,
+        hours: int = 720,
+        days: int = 365,
+        group_hours: int = 168,
+        group_days: int = 90,
+        clock=time.time,
+    ):
+        self.path = path
+        self.clock = clock
+        self.bot_layout = Layout(BOT_FIELDS, {MINUTE: minutes, HOUR: hours, DAY: days})
+        self.group_layout = Layout(GROUP_FIELDS, {HOUR: group_hours, DAY: group_days})
+        if not self.bot_layout.levels:
+            raise ValueError("At least one resolution must be kept")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                bot_id TEXT NOT NULL,
+                group_id INTEGER NOT NULL,
+                level INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                counts BLOB NOT NULL,
+                PRIMARY KEY (bot_id, group_id, level, bucket)
+            ) WITHOUT ROWID
+        """)
+
+        # bot_id -> group_id (BOT for the bot itself) -> series
+        self._series: Dict[str, Dict[int, Series]] = {}
+        # Bots whose stored buckets are merged into memory; only those are flushed as-is
+        self._loaded = set()
+        self._dirty = set()
+        # Serializes flushes, so a bucket's rows are written in order
+        self._io = asyncio.Lock()
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Flushed with evict=True, dropped from memory once written
+        self._evicting = set()
+        # bot_id -> when its expired buckets were last deleted
+        self._pruned: Dict[str, float] = {}
+
+        self.flushes = 0
+        self.flush_errors = 0
+        self.rows_written = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _layout(self, group_id: int) -> Layout:
+        return self.bot_layout if group_id == BOT else self.group_layout
+
+    def _get(self, bot_id: str, group_id: int) -> Series:
+        series = self._series.get(bot_id)
+        if series is None:
+            series = self._series[bot_id] = {}
+        entry = series.get(group_id)
+        if entry is None:
+            entry = series[group_id] = Series(self._layout(group_id))
+        return entry
+
+    def add(self, bot_id: str, field: str, group_id: Optional[int] = None, count: int = 1):
+        """Count `count` events of `field` for the bot (and for the group, if given)"""
+        now = self.clock()
+        self._get(bot_id, BOT).add(self.bot_layout.index[field], now, count)
+        if group_id is not None:
+            index = self.group_layout.index.get(field)
+            if index is not None and self.group_layout.levels:
+                self._get(bot_id, group_id).add(index, now, count)
+        self._dirty.add(bot_id)
+
+    # -- loading and flushing ----------------------------------------------
+
+    async def load(self, bot_id: str):
+        """Merge the bot's stored buckets into memory (before it starts counting)"""
+        # Started again before its eviction was written: memory is still current
+        self._evicting.discard(bot_id)
+        if bot_id in self._loaded:
+            return
+        pending = self._loading.get(bot_id)
+        if pending is None:
+            pending = self._loading[bot_id] = asyncio.ensure_future(self._load(bot_id))
+            pending.add_done_callback(lambda _: self._loading.pop(bot_id, None))
+        await asyncio.shield(pending)
+
+    async def _load(self, bot_id: str):
+        stored = await asyncio.to_thread(self._read_bot, bot_id)
+        series = self._series.setdefault(bot_id, {})
+        for group_id, entry in stored.items():
+            counted = series.get(group_id)
+            if counted is None:
+                series[group_id] = entry
+            else:
+                counted.absorb(entry)
+        self._loaded.add(bot_id)
+
+    def _read_bot(self, bot_id: str) -> Dict[int, Series]:
+        """The bot's stored series, rebuilt off the event loop"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT group_id, level, bucket, counts FROM buckets WHERE bot_id = ? "
+                "ORDER BY group_id, level, bucket",
+                (bot_id,),
+            ).fetchall()
+        stored: Dict[int, Series] = {}
+        for group_id, level, bucket, blob in rows:
+            entry = stored.get(group_id)
+            if entry is None:
+                entry = stored[group_id] = Series(self._layout(group_id))
+            position = entry.layout.by_level.get(level)
+            values = array.array("I", blob)
+            if position is not None and len(values) == len(entry.layout.fields):
+                entry.merge(position, bucket, values)
+        return stored
+
+    async def flush(self, bot_id: Optional[str] = None, evict: bool = False):
+        """Write changed buckets (of one bot, or all); `evict` then drops the bot from memory"""
+        async with self._io:
+            bot_ids = [bot_id] if bot_id is not None else list(self._dirty)
+            for dirty_bot in bot_ids:
+                # Counted before its load: merge the stored buckets first, or they would be overwritten
+                if dirty_bot in self._series and dirty_bot not in self._loaded:
+                    await self.load(dirty_bot)
+
+            now = self.clock()
+            rows = []
+            prune = []
+            for dirty_bot in bot_ids:
+                self._dirty.discard(dirty_bot)
+                for group_id, series in self._series.get(dirty_bot, {}).items():
+                    rows.extend(
+                        (dirty_bot, group_id, level, bucket, blob) for level, bucket, blob in series.take_dirty()
+                    )
+                if now - self._pruned.get(dirty_bot, 0.0) >= PRUNE_INTERVAL:
+                    self._pruned[dirty_bot] = now
+                    prune.append(dirty_bot)
+                if evict:
+                    self._evicting.add(dirty_bot)
+
+            if rows or prune:
+                self.flushes += 1
+                try:
+                    await asyncio.to_thread(self._write, rows, prune, self._prune_floors(now))
+                    self.rows_written += len(rows)
+                except Exception as e:
+                    self.flush_errors += 1
+                    log.error("Flush of %d buckets failed: %s", len(rows), e)
+                    # Kept in memory (and not evicted) for the next flush to retry
+                    for dirty_bot, group_id, level, bucket, _ in rows:
+                        series = self._series.get(dirty_bot, {}).get(group_id)
+                        if series is not None:
+                            series.mark(level, bucket)
+                            self._dirty.add(dirty_bot)
+
+            # Dropped only once written, so a load never reads older buckets than memory has;
+            # not if counted again meanwhile (the next flush writes it)
+            for dirty_bot in bot_ids:
+                if dirty_bot in self._evicting and dirty_bot not in self._dirty:
+                    self._evicting.discard(dirty_bot)
+                    self._series.pop(dirty_bot, None)
+                    self._loaded.discard(dirty_bot)
+                    self._pruned.pop(dirty_bot, None)
+
+    def _prune_floors(self, now: float) -> List[Tuple[bool, int, int]]:
+        """(bot series, level, first bucket kept) per resolution"""
+        return [
+            (layout is self.bot_layout, level, int(now // step) - size + 1)
+            for layout in (self.bot_layout, self.group_layout)
+            for _, level, step, size in layout.levels
+        ]
+
+    def _write(self, rows: list, prune: List[str], floors: List[Tuple[bool, int, int]]):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO buckets (bot_id, group_id, level, bucket, counts) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                # Per bot, so the deletes are primary key ranges rather than table scans
+                for bot_id in prune:
+                    for bot_series, level, floor in floors:
+                        self._db.execute(
+                            f"DELETE FROM buckets WHERE bot_id = ? AND group_id {'=' if bot_series else '!='} ? "
+                            "AND level = ? AND bucket < ?",
+                            (bot_id, BOT, level, floor),
+                        )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    # -- queries -----------------------------------------------------------
+
+    def _resolution(self, layout: Layout, start: float, end: float, resolution: Optional[str], now: float):
+        if resolution is not None:
+            if resolution not in RESOLUTIONS:
+                raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+            entry = layout.by_name.get(resolution)
+            if entry is None:
+                raise ValueError(f"No {resolution} buckets are kept for this series")
+            step = entry[2]
+            if int(end // step) - int(start // step) + 1 > MAX_POINTS:
+                raise ValueError(f"Range too long for {resolution} buckets (max {MAX_POINTS})")
+            return entry
+        # The finest resolution that holds `start` (give or take the bucket
+        # that just rolled out, so "the last 24h" is in minutes) and fits in MAX_POINTS
+        for entry in layout.levels:
+            _, _, step, size = entry
+            if (int(start // step) >= int(now // step) - size
+                    and int(end // step) - int(start // step) + 1 <= MAX_POINTS):
+                return entry
+        return layout.levels[-1]
+
+    async def query(self, bot_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                    resolution: Optional[str] = None, group_id: Optional[int] = None) -> dict:
+        """Counters per bucket between `start` and `end` (unix seconds, default the last day).
+
+        Buckets with no events are included as zeros, so every field is a
+        list aligned with `timestamps` (bucket starts). Raises ValueError
+        for a bad range or resolution.
+        """
+        now = self.clock()
+        end = now if end is None else min(end, now)
+        start = end - 86400 if start is None else start
+        if start > end:
+            raise ValueError("start must be before end")
+        key = BOT if group_id is None else group_id
+        layout = self._layout(key)
+        if not layout.levels:
+            raise ValueError("No buckets are kept for groups")
+        name, level, step, size = self._resolution(layout, start, end, resolution, now)
+
+        first = max(int(start // step), int(now // step) - size + 1)
+        last = int(end // step)
+        if bot_id in self._loaded:
+            series = self._series[bot_id].get(key)
+            if series is None:
+                columns = [[0] * max(0, last - first + 1) for _ in layout.fields]
+            else:
+                columns = series.read(layout.by_level[level], first, last)
+        else:
+            rows = await asyncio.to_thread(self._read_range, bot_id, key, level, first, last)
+            columns = [[0] * max(0, last - first + 1) for _ in layout.fields]
+            for bucket, blob in rows:
+                for field, value in enumerate(array.array("I", blob)[:len(layout.fields)]):
+                    columns[field][bucket - first] = value
+
+        return {
+            "bot_id": bot_id,
+            "group_id": group_id,
+            "resolution": name,
+            "step": step,
+            "timestamps": [bucket * step for bucket in range(first, last + 1)],
+            "series": dict(zip(layout.fields, columns)),
+            "totals": {field: sum(column) for field, column in zip(layout.fields, columns)},
+        }
+
+    def _read_range(self, bot_id: str, group_id: int, level: int, first: int, last: int) -> list:
+        with self._lock:
+            return self._db.execute(
+                "SELECT bucket, counts FROM buckets WHERE bot_id = ? AND group_id = ? AND level = ? "
+                "AND bucket BETWEEN ? AND ?",
+                (bot_id, group_id, level, first, last),
+            ).fetchall()
+
+    def stats(self) -> dict:
+        return {
+            "bots": len(self._series),
+            "series": sum(len(series) for series in self._series.values()),
+            "bytes": sum(entry.nbytes for series in self._series.values() for entry in series.values()),
+            "pending_bots": len(self._dirty),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "rows_written": self.rows_written,
+        }
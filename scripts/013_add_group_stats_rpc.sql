@@ -0,0 +1,17 @@
+-- Atomic per-group message counters
+-- The backend batches per-(bot_id, group_id) deltas and applies them in one call,
+-- instead of reading messages_sent and writing back messages_sent + 1.
+
+CREATE OR REPLACE FUNCTION increment_group_stats(p_rows JSONB)
+RETURNS VOID AS $$
+BEGIN
+  UPDATE bot_groups AS g
+  SET
+    messages_sent = COALESCE(g.messages_sent, 0) + r.delta,
+    last_message_at = GREATEST(COALESCE(g.last_message_at, r.last_message_at), r.last_message_at)
+  FROM jsonb_to_recordset(p_rows) AS r(bot_id UUID, group_id BIGINT, delta INTEGER, last_message_at TIMESTAMPTZ)
+  WHERE g.bot_id = r.bot_id AND g.group_id = r.group_id;
+END;
+$$ LANGUAGE plpgsql;
+
+GRANT EXECUTE ON FUNCTION increment_group_stats(JSONB) TO anon, authenticated;